@@ -11,11 +11,27 @@ from typing import Dict, List, Any, Tuple
 import warnings
 warnings.filterwarnings('ignore')
 
+from rebalancing import RebalancingPlanner
+from distances import DistanceCache
+from forecasting import AvailabilityForecaster
+from history import StationHistory, collect_history
+from snapshot import StationSnapshot, SnapshotCache
+from flows import TripFlows, infer_trip_flows
+from clustering import CLUSTER_LABELS, REBALANCING_HINTS, StationClusterer
+from chunked_analytics import ChunkedAnalytics, TemporalReport, registry_capacities
+from profiling import profile_stage, run_cli
+from timestamps import MISSING_EPOCH, day_of_week, decode_timestamps, hour_of_day, to_datetime64
+
 class AdvancedAnalytics:
     """Analyses avancées des données Vélomagg"""
     
     def __init__(self, analyzer):
         self.analyzer = analyzer
+        self.distances = DistanceCache()
+        self.rebalancing = RebalancingPlanner(distances=self.distances)
+        self.forecaster = AvailabilityForecaster()
+        self.clusterer = StationClusterer()
+        self._snapshots = SnapshotCache()
     
     def predict_peak_hours(self, station_id: str, days: int = 30) -> Dict[str, Any]:
         """Prédit les heures de pointe basées sur l'historique"""
@@ -28,13 +44,19 @@ class AdvancedAnalytics:
         if not data or 'values' not in data:
             return {}
         
+        # Mesures non datées écartées
+        epochs = decode_timestamps(data['index'])
+        valid = epochs != MISSING_EPOCH
+        if not valid.any():
+            return {}
+        epochs = epochs[valid]
         df = pd.DataFrame({
-            'timestamp': pd.to_datetime(data['index']),
-            'available_bikes': data['values']
+            'timestamp': to_datetime64(epochs),
+            'available_bikes': np.asarray(data['values'])[valid]
         })
         
-        df['hour'] = df['timestamp'].dt.hour
-        df['day_of_week'] = df['timestamp'].dt.dayofweek
+        df['hour'] = hour_of_day(epochs)
+        df['day_of_week'] = day_of_week(epochs)
         df['is_weekend'] = df['day_of_week'].isin([5, 6])
         
         # Calcul de l'occupation inverse (plus de vélos pris = heure de pointe)
@@ -61,87 +83,74 @@ class AdvancedAnalytics:
             }
         }
     
+    def forecast_availability(self, df: pd.DataFrame, history: StationHistory = None,
+                              days: int = 14) -> pd.DataFrame:
+        """Prévoit les vélos disponibles de toutes les stations à 15/30/60 minutes"""
+        if self.forecaster.needs_refit():
+            if history is None:
+                history = collect_history(self.analyzer, df, days=days)
+            self.forecaster.fit(history)
+        
+        return self.forecaster.forecast_frame(df)
+    
+    def cluster_stations(self, df: pd.DataFrame, history: StationHistory = None,
+                         days: int = 14) -> pd.DataFrame:
+        """Type d'usage de chaque station (résidentielle, bureaux, pôle d'échange, loisirs)"""
+        if history is None:
+            history = collect_history(self.analyzer, df, days=days)
+        self.clusterer.fit(history)
+        return self.clusterer.label_frame(df)
+    
+    def analyze_history_file(self, path: str, workers: int = None, by: str = 'time') -> TemporalReport:
+        """Motifs horaires, heures de pointe et efficacité sur un historique sur disque (pool de processus)"""
+        # Capacités du registre de l'historique : ses clés indexent les colonnes du fichier
+        return ChunkedAnalytics(path, registry_capacities(path), by=by, workers=workers).run()
+    
+    def infer_trip_flows(self, history: StationHistory, rebalancing_threshold: int = 5) -> TripFlows:
+        """Départs/arrivées par station et rééquilibrages détectés sur l'historique"""
+        return infer_trip_flows(history, rebalancing_threshold)
+    
+    def snapshot(self, df: pd.DataFrame) -> StationSnapshot:
+        """Retourne le snapshot (métriques dérivées mémoïsées) associé à ce DataFrame"""
+        return self._snapshots.get(df)
+    
     def calculate_station_efficiency(self, df: pd.DataFrame) -> pd.DataFrame:
         """Calcule l'efficacité des stations"""
-        df_copy = df.copy()
-        
-        # Taux d'utilisation (vélos + places occupées / capacité totale)
-        df_copy['utilization_rate'] = (df_copy['total_slots'] - df_copy['free_slots']) / df_copy['total_slots']
-        
-        # Score d'équilibre (proche de 50% = optimal)
-        df_copy['balance_score'] = 1 - abs(df_copy['occupancy_rate'] - 0.5) * 2
-        
-        # Score de disponibilité (évite les stations vides/pleines)
-        df_copy['availability_score'] = np.where(
-            (df_copy['available_bikes'] == 0) | (df_copy['free_slots'] == 0), 0, 1
-        )
-        
-        # Score d'efficacité global
-        df_copy['efficiency_score'] = (
-            df_copy['balance_score'] * 0.4 + 
-            df_copy['availability_score'] * 0.3 +
-            df_copy['utilization_rate'] * 0.3
-        )
-        
-        return df_copy
+        # Calcul unique par snapshot : utilization_rate, balance_score,
+        # availability_score et efficiency_score sont mémoïsés ; l'appelant reçoit une copie
+        # pour ne pas altérer le cache partagé avec les autres analyses
+        return self.snapshot(df).efficiency_frame.copy()
     
     def identify_problem_stations(self, df: pd.DataFrame) -> Dict[str, List[Dict]]:
         """Identifie les stations problématiques"""
-        df_eff = self.calculate_station_efficiency(df)
-        
-        problems = {
-            'always_empty': df_eff[df_eff['available_bikes'] == 0].to_dict('records'),
-            'always_full': df_eff[df_eff['free_slots'] == 0].to_dict('records'),
-            'low_efficiency': df_eff[df_eff['efficiency_score'] < 0.3].to_dict('records'),
-            'inactive': df_eff[df_eff['status'] != 'working'].to_dict('records'),
-            'oversized': df_eff[df_eff['utilization_rate'] < 0.1].to_dict('records'),
-            'undersized': df_eff[df_eff['utilization_rate'] > 0.9].to_dict('records')
-        }
+        snapshot = self.snapshot(df)
         
-        return problems
+        return {name: snapshot.problem_records(name) for name in snapshot.problem_masks}
     
     def calculate_coverage_analysis(self, df: pd.DataFrame, radius_km: float = 0.5) -> Dict[str, Any]:
         """Analyse de couverture géographique"""
-        from math import radians, cos, sin, asin, sqrt
+        # Distances entre stations : matrice condensée en cache (recalculée si le réseau change)
+        matrix = self.distances.get(df)
+        distances = matrix.for_frame(df)
+        off_diagonal = ~np.eye(len(df), dtype=bool)
+        nearby = ((distances <= radius_km) & off_diagonal).sum(axis=1)
+        nearest = np.where(off_diagonal, distances, np.inf).min(axis=1, initial=np.inf)
+        pairs = distances[off_diagonal]
         
-        def haversine(lon1, lat1, lon2, lat2):
-            """Calcule la distance entre deux points GPS"""
-            lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-            dlon = lon2 - lon1
-            dlat = lat2 - lat1
-            a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-            c = 2 * asin(sqrt(a))
-            r = 6371  # Rayon terrestre en km
-            return c * r
-        
-        # Calcul des distances entre stations
-        distances = []
-        coverage_zones = []
-        
-        for i, station1 in df.iterrows():
-            nearby_stations = 0
-            for j, station2 in df.iterrows():
-                if i != j:
-                    dist = haversine(
-                        station1['longitude'], station1['latitude'],
-                        station2['longitude'], station2['latitude']
-                    )
-                    if dist <= radius_km:
-                        nearby_stations += 1
-                    distances.append(dist)
-            
-            coverage_zones.append({
-                'station_id': station1['id'],
-                'address': station1['address'],
-                'nearby_stations': nearby_stations,
-                'coverage_density': nearby_stations / (np.pi * radius_km**2)
-            })
+        coverage_zones = {
+            'station_id': df['id'].to_numpy(),
+            'address': df['address'].to_numpy(),
+            'nearby_stations': nearby,
+            'nearest_km': np.round(nearest, 3),
+            'coverage_density': nearby / (np.pi * radius_km**2)
+        }
         
         coverage_df = pd.DataFrame(coverage_zones)
         
         return {
-            'average_distance': np.mean(distances),
-            'min_distance': np.min(distances),
+            'average_distance': float(pairs.mean()) if len(pairs) else np.nan,
+            'min_distance': float(pairs.min()) if len(pairs) else np.nan,
+            'average_travel_minutes': float(matrix.travel_minutes(pairs).mean()) if len(pairs) else np.nan,
             'isolated_stations': coverage_df[coverage_df['nearby_stations'] == 0].to_dict('records'),
             'dense_areas': coverage_df[coverage_df['nearby_stations'] > 5].to_dict('records'),
             'coverage_stats': {
@@ -150,10 +159,14 @@ class AdvancedAnalytics:
             }
         }
     
+    def plan_rebalancing(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Propose des déplacements de vélos pour ramener les stations vers 50% d'occupation"""
+        return self.rebalancing.plan_moves(df)
+    
     def generate_optimization_recommendations(self, df: pd.DataFrame) -> Dict[str, List[str]]:
         """Génère des recommandations d'optimisation"""
-        problems = self.identify_problem_stations(df)
-        df_eff = self.calculate_station_efficiency(df)
+        snapshot = self.snapshot(df)
+        counts = snapshot.problem_counts
         
         recommendations = {
             'urgent': [],
@@ -163,46 +176,71 @@ class AdvancedAnalytics:
         }
         
         # Recommandations urgentes
-        if len(problems['inactive']) > 0:
+        if counts['inactive'] > 0:
             recommendations['urgent'].append(
-                f"🚨 {len(problems['inactive'])} stations hors service nécessitent une intervention immédiate"
+                f"🚨 {counts['inactive']} stations hors service nécessitent une intervention immédiate"
             )
         
-        if len(problems['always_empty']) > 0:
+        if counts['always_empty'] > 0:
             recommendations['urgent'].append(
-                f"⚠️ {len(problems['always_empty'])} stations complètement vides (redistribution urgente)"
+                f"⚠️ {counts['always_empty']} stations complètement vides (redistribution urgente)"
             )
         
-        if len(problems['always_full']) > 0:
+        if counts['always_full'] > 0:
             recommendations['urgent'].append(
-                f"⚠️ {len(problems['always_full'])} stations complètement pleines (retrait urgent)"
+                f"⚠️ {counts['always_full']} stations complètement pleines (retrait urgent)"
             )
         
         # Recommandations de maintenance
-        low_eff_count = len(problems['low_efficiency'])
+        low_eff_count = counts['low_efficiency']
         if low_eff_count > len(df) * 0.1:
             recommendations['maintenance'].append(
                 f"🔧 {low_eff_count} stations ont une faible efficacité (>10% du réseau)"
             )
         
         # Recommandations de capacité
-        if len(problems['oversized']) > 0:
+        if counts['oversized'] > 0:
             recommendations['capacity'].append(
-                f"📉 {len(problems['oversized'])} stations sous-utilisées (réduction possible)"
+                f"📉 {counts['oversized']} stations sous-utilisées (réduction possible)"
             )
         
-        if len(problems['undersized']) > 0:
+        if counts['undersized'] > 0:
             recommendations['capacity'].append(
-                f"📈 {len(problems['undersized'])} stations sur-utilisées (extension recommandée)"
+                f"📈 {counts['undersized']} stations sur-utilisées (extension recommandée)"
             )
         
         # Recommandations de déploiement
-        avg_efficiency = df_eff['efficiency_score'].mean()
+        avg_efficiency = snapshot.efficiency_score.mean()
         if avg_efficiency < 0.6:
             recommendations['deployment'].append(
                 f"🎯 Efficacité réseau globale faible ({avg_efficiency:.1%}) - rééquilibrage nécessaire"
             )
         
+        # Recommandations par type de station (si la typologie a été calculée)
+        if self.clusterer.result is not None:
+            typed = self.clusterer.label_frame(df)
+            empty = (typed['available_bikes'] == 0).to_numpy()
+            full = (typed['free_slots'] == 0).to_numpy()
+            for cluster, name in enumerate(self.clusterer.result['names']):
+                members = (typed['cluster'] == cluster).to_numpy()
+                n_empty, n_full = int((members & empty).sum()), int((members & full).sum())
+                if n_empty or n_full:
+                    recommendations['deployment'].append(
+                        f"{CLUSTER_LABELS[name]}: {n_empty} vide(s), {n_full} pleine(s) sur "
+                        f"{int(members.sum())} stations - {REBALANCING_HINTS[name]}"
+                    )
+        
+        moves = self.plan_rebalancing(df)
+        if moves:
+            plan = self.rebalancing.summarize(moves)
+            recommendations['deployment'].append(
+                f"🚚 {plan['moves']} déplacements proposés ({plan['bikes_moved']} vélos, {plan['bike_km']:.1f} vélo-km)"
+            )
+            for move in moves[:3]:
+                recommendations['deployment'].append(
+                    f"↪️ {move['bikes']} vélos: {move['from_address'][:30]} → {move['to_address'][:30]} ({move['distance_km']:.1f} km)"
+                )
+        
         return recommendations
 
 class ReportGenerator:
@@ -215,7 +253,7 @@ class ReportGenerator:
     def generate_executive_summary(self, df: pd.DataFrame) -> str:
         """Génère un résumé exécutif"""
         stats = self.analyzer.generate_statistics_report(df)
-        problems = self.advanced.identify_problem_stations(df)
+        counts = self.advanced.snapshot(df).problem_counts
         recommendations = self.advanced.generate_optimization_recommendations(df)
         
         summary = f"""
@@ -228,11 +266,11 @@ class ReportGenerator:
 • Taux d'occupation: {stats['general']['average_occupancy']:.1%} (cible: 40-60%)
 • Performance réseau: {'🟢 BONNE' if stats['general']['average_occupancy'] > 0.4 and stats['general']['average_occupancy'] < 0.6 else '🟡 À SURVEILLER' if stats['general']['average_occupancy'] > 0.2 else '🔴 CRITIQUE'}
 
-⚠️ ALERTES ({len(problems['inactive']) + len(problems['always_empty']) + len(problems['always_full'])} urgentes)
-• Stations hors service: {len(problems['inactive'])}
-• Stations vides: {len(problems['always_empty'])}
-• Stations pleines: {len(problems['always_full'])}
-• Efficacité faible: {len(problems['low_efficiency'])}
+⚠️ ALERTES ({counts['inactive'] + counts['always_empty'] + counts['always_full']} urgentes)
+• Stations hors service: {counts['inactive']}
+• Stations vides: {counts['always_empty']}
+• Stations pleines: {counts['always_full']}
+• Efficacité faible: {counts['low_efficiency']}
 
 🏆 PERFORMANCES
 • Meilleure station: {stats['extremes']['most_occupied']['address'][:40]}... ({stats['extremes']['most_occupied']['occupancy_rate']:.1%})
@@ -274,6 +312,15 @@ class ReportGenerator:
             bottom_stations = df_eff.nsmallest(10, 'efficiency_score')
             for i, station in bottom_stations.iterrows():
                 f.write(f"{station['address'][:50]:<50} {station['efficiency_score']:.1%}\n")
+            
+            # Typologie des stations (si calculée)
+            if self.advanced.clusterer.result is not None:
+                f.write(f"\n\n🧭 TYPOLOGIE DES STATIONS\n")
+                typed = self.advanced.clusterer.label_frame(df)
+                for label, group in typed.groupby('cluster_label', sort=True):
+                    f.write(f"{label} ({len(group)} stations, occupation actuelle {group['occupancy_rate'].mean():.1%})\n")
+                    for address in group['address'].head(5):
+                        f.write(f"  • {address[:60]}\n")
         
         print(f"✅ Rapport détaillé sauvegardé: {output_file}")
 
@@ -293,35 +340,66 @@ def main_advanced():
     
     # Analyses avancées
     print("\n🧠 Calcul de l'efficacité des stations...")
-    df_efficiency = advanced.calculate_station_efficiency(df)
+    with profile_stage('efficiency'):
+        df_efficiency = advanced.calculate_station_efficiency(df)
     
     print("🔍 Identification des problèmes...")
-    problems = advanced.identify_problem_stations(df)
+    with profile_stage('problem_stations'):
+        problems = advanced.identify_problem_stations(df)
     
     print("📍 Analyse de couverture géographique...")
-    coverage = advanced.calculate_coverage_analysis(df)
+    with profile_stage('coverage_analysis'):
+        coverage = advanced.calculate_coverage_analysis(df)
+    
+    # Historique commun à la typologie et à la prévision (une seule collecte)
+    print("🗃️ Collecte de l'historique (14 jours)...")
+    with profile_stage('history'):
+        history = collect_history(analyzer, df, days=14)
+    
+    print("🧭 Typologie des stations par profil d'usage...")
+    with profile_stage('clustering'):
+        typed = advanced.cluster_stations(df, history)
+    for label, count in typed['cluster_label'].value_counts().items():
+        print(f"   {label}: {count} stations")
     
     print("💡 Génération des recommandations...")
-    recommendations = advanced.generate_optimization_recommendations(df)
+    with profile_stage('recommendations'):
+        recommendations = advanced.generate_optimization_recommendations(df)
+    
+    print("🚚 Planification du rééquilibrage...")
+    with profile_stage('rebalancing'):
+        moves = advanced.plan_rebalancing(df)
+    for move in moves[:5]:
+        print(f"   {move['bikes']} vélos: {move['from_address'][:30]} → {move['to_address'][:30]} ({move['distance_km']:.1f} km)")
     
     # Rapport exécutif
     print("\n📊 Génération du rapport exécutif...")
-    exec_summary = reporter.generate_executive_summary(df)
+    with profile_stage('reports'):
+        exec_summary = reporter.generate_executive_summary(df)
     print(exec_summary)
     
     # Rapport détaillé
     print("\n📄 Génération du rapport détaillé...")
-    reporter.generate_detailed_report(df)
+    with profile_stage('reports'):
+        reporter.generate_detailed_report(df)
+    
+    # Prévision à court terme pour tout le réseau
+    print("\n🔮 Prévision de disponibilité (15/30/60 min)...")
+    with profile_stage('forecast'):
+        forecast = advanced.forecast_availability(df, history)
+    at_risk = forecast[forecast['forecast_60min'] < 1]
+    print(f"   {len(at_risk)} stations risquent d'être vides dans l'heure")
     
     # Analyse temporelle sur quelques stations
     print("\n⏰ Analyse des patterns temporels...")
     sample_stations = df.head(3)['id'].tolist()
     for station_id in sample_stations:
-        peaks = advanced.predict_peak_hours(station_id, days=7)
+        with profile_stage('peak_hours'):
+            peaks = advanced.predict_peak_hours(station_id, days=7)
         if peaks:
             print(f"Station {station_id}: Pic semaine {peaks['weekday_peaks']['morning_peak']}h-{peaks['weekday_peaks']['evening_peak']}h")
     
     print("\n✅ Analyses avancées terminées!")
 
 if __name__ == "__main__":
-    main_advanced()
+    run_cli(main_advanced)
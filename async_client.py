@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Client asynchrone (asyncio) pour les APIs Vélomagg
+Concurrence bornée, limitation de débit et annulation des requêtes en attente
+"""
+
+import asyncio
+import aiohttp
+import time
+import urllib.parse
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+
+from main import VelomaggAnalyzer
+
+# Codes HTTP signalant une limitation de débit côté serveur
+RATE_LIMIT_STATUSES = (429, 503)
+# Attente maximale (secondes) imposée par un en-tête X-RateLimit-Reset
+MAX_RATE_LIMIT_PAUSE = 60.0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Convertit un en-tête Retry-After (secondes ou date HTTP) en délai en secondes"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_rate_limit_reset(value: Optional[str], max_pause: float = MAX_RATE_LIMIT_PAUSE) -> Optional[float]:
+    """Convertit un en-tête X-RateLimit-Reset (délai ou epoch absolu) en pause bornée, en secondes"""
+    if not value:
+        return None
+    try:
+        reset = float(value)
+    except ValueError:
+        return None
+    now = time.time()
+    # Une valeur postérieure à l'instant présent est un horodatage epoch, pas un délai
+    if reset > now:
+        reset -= now
+    return min(max(0.0, reset), max_pause)
+
+
+class TokenBucket:
+    """Limiteur de débit à seau de jetons"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def pause(self, seconds: float):
+        """Suspend l'émission de requêtes (limite signalée par le serveur)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    async def acquire(self):
+        """Attend qu'un jeton soit disponible"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncVelomaggClient:
+    """Équivalent asynchrone des méthodes de récupération de VelomaggAnalyzer"""
+
+    BASE_URL = VelomaggAnalyzer.BASE_URL
+    STATIONS_ENDPOINT = VelomaggAnalyzer.STATIONS_ENDPOINT
+    TIMESERIES_ENDPOINT = VelomaggAnalyzer.TIMESERIES_ENDPOINT
+
+    def __init__(self, max_concurrency: int = 20, rate: float = 10.0, burst: Optional[float] = None,
+                 timeout: float = 30, max_retries: int = 3):
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = TokenBucket(rate, burst)
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_retries = max_retries
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.timeseries_cache = {}
+        self.requests_sent = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending = set()
+
+    async def __aenter__(self) -> 'AsyncVelomaggClient':
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def open(self):
+        """Ouvre le pool de connexions partagé"""
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self):
+        """Annule les requêtes en attente et ferme le pool de connexions"""
+        self.cancel_pending()
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def submit(self, coroutine) -> asyncio.Task:
+        """Planifie une requête et la suit pour pouvoir l'annuler"""
+        task = asyncio.ensure_future(coroutine)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    def cancel_pending(self) -> int:
+        """Annule toutes les requêtes planifiées non terminées"""
+        cancelled = 0
+        for task in list(self._pending):
+            if not task.done():
+                task.cancel()
+                cancelled += 1
+        return cancelled
+
+    async def _get_json(self, url: str, params: Optional[Dict[str, str]] = None) -> Any:
+        """GET avec limitation de débit, concurrence bornée et reprise sur 429/503"""
+        await self.open()
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire()
+            async with self._semaphore:
+                self.requests_sent += 1
+                async with self.session.get(url, params=params) as response:
+                    if response.status in RATE_LIMIT_STATUSES and attempt < self.max_retries:
+                        delay = parse_retry_after(response.headers.get('Retry-After'))
+                        self.rate_limiter.pause(delay if delay is not None else 2 ** attempt)
+                        continue
+
+                    # Quota épuisé annoncé par le serveur : on attend la réinitialisation
+                    if response.headers.get('X-RateLimit-Remaining') == '0':
+                        reset = parse_rate_limit_reset(response.headers.get('X-RateLimit-Reset'))
+                        if reset:
+                            self.rate_limiter.pause(reset)
+
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+
+    async def get_all_stations(self) -> List[Dict[str, Any]]:
+        """Récupère la liste de toutes les stations"""
+        try:
+            stations = await self._get_json(f"{self.BASE_URL}{self.STATIONS_ENDPOINT}")
+            print(f"✅ Récupération de {len(stations)} stations")
+            return stations
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"❌ Erreur lors de la récupération des stations: {e}")
+            return []
+
+    async def get_station_timeseries(self, station_id: str, attr_name: str = "availableBikeNumber",
+                                     from_date: str = "2024-01-01T00:00:00",
+                                     to_date: str = "2025-01-01T00:00:00") -> Dict[str, Any]:
+        """Récupère les données temporelles d'une station"""
+        encoded_station_id = urllib.parse.quote(station_id, safe='')
+        url = f"{self.BASE_URL}{self.TIMESERIES_ENDPOINT}/{encoded_station_id}/attrs/{attr_name}"
+        params = {
+            'fromDate': from_date,
+            'toDate': to_date
+        }
+
+        try:
+            data = await self._get_json(url, params)
+            cache_key = f"{station_id}_{attr_name}_{from_date}_{to_date}"
+            self.timeseries_cache[cache_key] = data
+            return data
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"❌ Erreur pour la station {station_id}: {e}")
+            return {}
+
+    async def get_many_timeseries(self, queries: Iterable[Tuple[str, str, str, str]]) -> List[Dict[str, Any]]:
+        """Récupère en parallèle plusieurs séries (station, attribut, début, fin)"""
+        queries = list(queries)
+        tasks = [self.submit(self.get_station_timeseries(*query)) for query in queries]
+        # Une requête annulée (cancel_pending) ou en erreur ne fait pas perdre les autres résultats
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for index, (query, result) in enumerate(zip(queries, results)):
+            if isinstance(result, BaseException):
+                if not isinstance(result, asyncio.CancelledError):
+                    print(f"❌ Erreur pour la station {query[0]}: {result}")
+                results[index] = {}
+        return results
+
+
+async def fetch_network_history(station_ids: List[str], from_date: str, to_date: str,
+                                attr_name: str = "availableBikeNumber",
+                                max_concurrency: int = 20, rate: float = 10.0) -> Dict[str, Dict[str, Any]]:
+    """Récupère l'historique de toutes les stations sur un même event loop"""
+    async with AsyncVelomaggClient(max_concurrency=max_concurrency, rate=rate) as client:
+        queries = [(station_id, attr_name, from_date, to_date) for station_id in station_ids]
+        results = await client.get_many_timeseries(queries)
+    return dict(zip(station_ids, results))
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Rattrapage de l'historique des stations sur une période arbitraire (reprise sur interruption)
+Travail découpé par station × attribut × fenêtre, suivi dans un fichier de checkpoint
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import struct
+import time
+import numpy as np
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+
+from async_client import AsyncVelomaggClient
+from codec import MISSING, decode_series, encode_timeseries
+from history import StationHistory
+from profiling import run_cli
+from timeline import to_epoch
+
+BACKFILL_DIR = "backfill"
+CHECKPOINT_FILE = "checkpoint.json"
+CHECKPOINT_VERSION = 1
+ATTRIBUTES = ('availableBikeNumber', 'freeSlotNumber')
+WINDOW_DAYS = 7
+# Une fenêtre en échec est retentée aux exécutions suivantes, puis abandonnée
+MAX_ATTEMPTS = 3
+# Sauvegarde du checkpoint : toutes les N fenêtres terminées ou toutes les N secondes
+CHECKPOINT_EVERY = 50
+CHECKPOINT_SECONDS = 10.0
+PROGRESS_SECONDS = 5.0
+# longueur de l'identifiant, début et fin de fenêtre (epoch), longueur du flux codec
+SEGMENT_HEADER = struct.Struct('<HqqI')
+
+
+def api_date(epoch: int) -> str:
+    """Epoch -> date au format attendu par fromDate/toDate"""
+    return str(np.datetime64(int(epoch), 's'))
+
+
+def split_windows(start_epoch: int, end_epoch: int, window_days: int = WINDOW_DAYS) -> List[Tuple[int, int]]:
+    """Découpe [start, end[ en fenêtres consécutives (la dernière peut être plus courte)"""
+    window = window_days * 86400
+    return [(begin, min(begin + window, end_epoch)) for begin in range(start_epoch, end_epoch, window)]
+
+
+def unit_key(station_id: str, attr_name: str, window_start: int) -> str:
+    return f"{station_id}|{attr_name}|{window_start}"
+
+
+def segments_path(output_dir: str, attr_name: str) -> str:
+    return os.path.join(output_dir, f"{attr_name}.segments")
+
+
+def read_segments(path: str, verify: bool = True) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """Relit un fichier de segments : identifiant de station -> (epochs, valeurs) triés, sans doublons"""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    parts: Dict[str, List[Tuple[np.ndarray, np.ndarray]]] = {}
+    offset = 0
+    while offset + SEGMENT_HEADER.size <= len(data):
+        id_length, _, _, length = SEGMENT_HEADER.unpack_from(data, offset)
+        offset += SEGMENT_HEADER.size
+        station_id = data[offset:offset + id_length].decode('utf-8')
+        offset += id_length
+        parts.setdefault(station_id, []).append(decode_series(data[offset:offset + length], verify))
+        offset += length
+
+    series = {}
+    for station_id, chunks in parts.items():
+        timestamps = np.concatenate([timestamps for timestamps, _ in chunks])
+        values = np.concatenate([values for _, values in chunks])
+        # Les bornes de fenêtres peuvent se recouvrir : la dernière mesure reçue l'emporte
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, values = timestamps[order], values[order]
+        last = np.append(timestamps[1:] != timestamps[:-1], True)
+        series[station_id] = (timestamps[last], values[last])
+    return series
+
+
+def backfill_history(output_dir: str, registry, attr_name: str = 'availableBikeNumber',
+                     step_minutes: int = 15) -> StationHistory:
+    """Matrice station × temps à partir des segments rattrapés (clés du registre)"""
+    series = {}
+    for station_id, (timestamps, values) in read_segments(segments_path(output_dir, attr_name)).items():
+        values = np.where(values == MISSING, np.nan, values).astype(np.float32)
+        series[registry.intern(station_id)] = (timestamps, values)
+    return StationHistory.from_arrays(series, step_minutes)
+
+
+class BackfillCheckpoint:
+    """État persistant du rattrapage : fenêtres terminées, échecs, taille valide des segments"""
+
+    def __init__(self, path: str, params: Dict[str, Any]):
+        self.path = path
+        self.params = params
+        self.done: Dict[str, int] = {}
+        self.failures: Dict[str, int] = {}
+        self.segment_bytes: Dict[str, int] = {}
+        self.requests = 0
+
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('version') != CHECKPOINT_VERSION or state.get('params') != params:
+                raise ValueError(f"Checkpoint incompatible avec les paramètres demandés: {path} "
+                                 f"(période, fenêtre ou attributs différents)")
+            self.done = state['done']
+            self.failures = state['failures']
+            self.segment_bytes = state['segment_bytes']
+            self.requests = state['requests']
+
+    @staticmethod
+    def stored_params(path: str) -> Optional[Dict[str, Any]]:
+        """Paramètres d'un checkpoint existant (None s'il n'y en a pas)"""
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('params')
+
+    def is_pending(self, key: str) -> bool:
+        return key not in self.done and self.failures.get(key, 0) < MAX_ATTEMPTS
+
+    def save(self):
+        """Écriture atomique (fichier temporaire puis remplacement)"""
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'params': self.params,
+            'done': self.done,
+            'failures': self.failures,
+            'segment_bytes': self.segment_bytes,
+            'requests': self.requests
+        }
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(state, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+
+
+class BackfillJob:
+    """Rattrapage concurrent de toutes les stations sur [start, end[, reprenable après interruption"""
+
+    def __init__(self, start, end, output_dir: str = BACKFILL_DIR, attributes=ATTRIBUTES,
+                 window_days: int = WINDOW_DAYS, max_concurrency: int = 8, rate: float = 5.0,
+                 max_requests: Optional[int] = None):
+        self.start_epoch = to_epoch(start)
+        self.end_epoch = to_epoch(end)
+        if self.end_epoch <= self.start_epoch:
+            raise ValueError("La fin de la période doit suivre son début")
+        self.output_dir = output_dir
+        self.attributes = tuple(attributes)
+        self.windows = split_windows(self.start_epoch, self.end_epoch, window_days)
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.max_requests = max_requests
+
+        os.makedirs(output_dir, exist_ok=True)
+        self.checkpoint = BackfillCheckpoint(
+            os.path.join(output_dir, CHECKPOINT_FILE),
+            {'start': self.start_epoch, 'end': self.end_epoch, 'window_days': window_days,
+             'attributes': list(self.attributes)}
+        )
+        self.station_ids: List[str] = []
+        self.points = 0
+        self.completed = 0
+        self.failed = 0
+        self._saved_requests = 0
+
+    def units(self, station_ids: List[str]) -> List[Tuple[str, str, int, int]]:
+        """Fenêtres restant à traiter (station, attribut, début, fin)"""
+        return [(station_id, attr_name, begin, end)
+                for attr_name in self.attributes
+                for station_id in station_ids
+                for begin, end in self.windows
+                if self.checkpoint.is_pending(unit_key(station_id, attr_name, begin))]
+
+    def _open_segments(self) -> Dict[str, Any]:
+        """Ouvre les fichiers de segments en ajout, tronqués à la dernière taille sauvegardée"""
+        files = {}
+        for attr_name in self.attributes:
+            path = segments_path(self.output_dir, attr_name)
+            valid = self.checkpoint.segment_bytes.get(attr_name, 0)
+            f = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+            # Segments écrits après le dernier checkpoint : leurs fenêtres seront refaites
+            f.truncate(valid)
+            f.seek(valid)
+            files[attr_name] = f
+        return files
+
+    def _save(self, files: Dict[str, Any], requests_sent: int):
+        self.checkpoint.requests += requests_sent - self._saved_requests
+        self._saved_requests = requests_sent
+        for attr_name, f in files.items():
+            f.flush()
+            os.fsync(f.fileno())
+            self.checkpoint.segment_bytes[attr_name] = f.tell()
+        self.checkpoint.save()
+
+    def _record(self, files: Dict[str, Any], station_id: str, attr_name: str,
+                begin: int, end: int, data: Dict[str, Any]):
+        key = unit_key(station_id, attr_name, begin)
+        if not data or 'index' not in data:
+            self.checkpoint.failures[key] = self.checkpoint.failures.get(key, 0) + 1
+            self.failed += 1
+            return
+        stream = encode_timeseries(data)
+        encoded_id = station_id.encode('utf-8')
+        f = files[attr_name]
+        f.write(SEGMENT_HEADER.pack(len(encoded_id), begin, end, len(stream)))
+        f.write(encoded_id)
+        f.write(stream)
+        self.checkpoint.done[key] = len(data['index'])
+        self.checkpoint.failures.pop(key, None)
+        self.points += len(data['index'])
+        self.completed += 1
+
+    def _progress(self, total: int, started: float, requests: int):
+        elapsed = max(time.monotonic() - started, 1e-9)
+        processed = self.completed + self.failed
+        rate = processed / elapsed
+        eta = timedelta(seconds=int((total - processed) / rate)) if rate > 0 else "?"
+        print(f"   ⏳ {processed}/{total} fenêtres ({processed / total:.0%}) - "
+              f"{requests / elapsed:.1f} req/s, {self.points / elapsed:,.0f} points/s - ETA {eta}")
+
+    async def run(self, client: Optional[AsyncVelomaggClient] = None) -> Dict[str, Any]:
+        """Traite les fenêtres en attente dans la limite de concurrence et du budget de requêtes"""
+        owns_client = client is None
+        client = client or AsyncVelomaggClient(max_concurrency=self.max_concurrency, rate=self.rate)
+        await client.open()
+        self._saved_requests = client.requests_sent
+        files = self._open_segments()
+        try:
+            stations = await client.get_all_stations()
+            self.station_ids = [station['id'] for station in stations]
+            pending = self.units(self.station_ids)
+            total = len(pending)
+            print(f"🗂️ Rattrapage de {len(self.station_ids)} stations × {len(self.attributes)} attribut(s) × "
+                  f"{len(self.windows)} fenêtre(s) : {total} à traiter")
+            if not pending:
+                return self.summary(client.requests_sent)
+
+            queue = iter(pending)
+            started = time.monotonic()
+            last_save = last_progress = started
+            since_save = 0
+
+            async def worker():
+                nonlocal last_save, last_progress, since_save
+                for station_id, attr_name, begin, end in queue:
+                    if self.max_requests is not None and client.requests_sent >= self.max_requests:
+                        return
+                    data = await client.get_station_timeseries(station_id, attr_name,
+                                                               api_date(begin), api_date(end))
+                    # Les réponses ne sont pas gardées en mémoire : elles sont dans les segments
+                    client.timeseries_cache.clear()
+                    self._record(files, station_id, attr_name, begin, end, data)
+                    since_save += 1
+
+                    now = time.monotonic()
+                    if since_save >= CHECKPOINT_EVERY or now - last_save >= CHECKPOINT_SECONDS:
+                        self._save(files, client.requests_sent)
+                        since_save, last_save = 0, now
+                    if now - last_progress >= PROGRESS_SECONDS:
+                        self._progress(total, started, client.requests_sent)
+                        last_progress = now
+
+            await asyncio.gather(*(worker() for _ in range(self.max_concurrency)))
+            self._progress(total, started, client.requests_sent)
+            return self.summary(client.requests_sent)
+        finally:
+            # Y compris sur Ctrl+C : tout ce qui est écrit est conservé pour la reprise
+            self._save(files, client.requests_sent)
+            for f in files.values():
+                f.close()
+            if owns_client:
+                await client.close()
+
+    def summary(self, requests: int) -> Dict[str, Any]:
+        """Bilan de l'exécution et de l'ensemble du rattrapage"""
+        return {
+            'completed': self.completed,
+            'failed': self.failed,
+            'points': self.points,
+            'requests': requests,
+            'done_total': len(self.checkpoint.done),
+            'abandoned': sum(1 for count in self.checkpoint.failures.values() if count >= MAX_ATTEMPTS),
+            'remaining': len(self.units(self.station_ids))
+        }
+
+
+def main_backfill():
+    """Fonction principale du rattrapage d'historique"""
+    parser = argparse.ArgumentParser(description="Rattrapage reprenable de l'historique des stations")
+    parser.add_argument('--from', dest='from_date', required=True, help="Début (ex. 2024-01-01)")
+    parser.add_argument('--to', dest='to_date',
+                        help="Fin exclue (défaut: celle du checkpoint existant, sinon maintenant)")
+    parser.add_argument('--output', default=BACKFILL_DIR, help="Dossier des segments et du checkpoint")
+    parser.add_argument('--attributes', nargs='+', default=list(ATTRIBUTES), choices=ATTRIBUTES)
+    parser.add_argument('--window-days', type=int, default=WINDOW_DAYS, help="Taille d'une fenêtre de requête")
+    parser.add_argument('--concurrency', type=int, default=8, help="Requêtes simultanées")
+    parser.add_argument('--rate', type=float, default=5.0, help="Requêtes par seconde")
+    parser.add_argument('--max-requests', type=int, help="Budget de requêtes pour cette exécution")
+    args = parser.parse_args()
+
+    # Reprise sans --to : la fin enregistrée dans le checkpoint, pas un nouvel « maintenant »
+    to_date = args.to_date
+    if to_date is None:
+        params = BackfillCheckpoint.stored_params(os.path.join(args.output, CHECKPOINT_FILE))
+        to_date = np.datetime64(params['end'], 's') if params else datetime.now()
+
+    job = BackfillJob(args.from_date, to_date, args.output, args.attributes, args.window_days,
+                      args.concurrency, args.rate, args.max_requests)
+    summary = asyncio.run(job.run())
+    print(f"✅ {summary['completed']} fenêtre(s) rattrapée(s), {summary['points']:,} points, "
+          f"{summary['requests']} requête(s) - {summary['remaining']} restante(s)")
+    if summary['failed']:
+        print(f"⚠️ {summary['failed']} fenêtre(s) en échec (retentées à la prochaine exécution, "
+              f"abandonnées après {MAX_ATTEMPTS} essais)")
+    print(f"💾 Checkpoint: {os.path.join(args.output, CHECKPOINT_FILE)} - relancer la même commande pour reprendre")
+
+
+if __name__ == "__main__":
+    run_cli(main_backfill)
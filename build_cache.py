@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Construction incrémentale des artefacts du site (docs/)
+Empreintes de contenu des entrées pour ne régénérer que ce qui a changé
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import pandas as pd
+from typing import Dict, Any, Iterable, Optional
+
+SITE_DIR = "docs"
+MANIFEST_FILE = "build_manifest.json"
+# À incrémenter quand la façon de produire les artefacts change
+BUILD_VERSION = "1"
+
+
+def hash_frame(df: pd.DataFrame, columns: Optional[Iterable[str]] = None) -> str:
+    """Empreinte du contenu d'un DataFrame (colonnes choisies)"""
+    frame = df if columns is None else df[list(columns)]
+    digest = hashlib.sha256(",".join(map(str, frame.columns)).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def hash_inputs(*parts: Any) -> str:
+    """Empreinte combinée d'entrées hétérogènes (DataFrame, octets, texte, objets JSON)"""
+    digest = hashlib.sha256(BUILD_VERSION.encode('utf-8'))
+    for part in parts:
+        if isinstance(part, pd.DataFrame):
+            part = hash_frame(part)
+        elif not isinstance(part, (bytes, str)):
+            part = json.dumps(part, sort_keys=True, default=str)
+        digest.update(part if isinstance(part, bytes) else part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def hash_file(path: str) -> Optional[str]:
+    """Empreinte du contenu d'un fichier (None s'il n'existe pas)"""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_if_changed(path: str, data: bytes) -> bool:
+    """Écrit le fichier uniquement si son contenu change"""
+    if hash_file(path) == hashlib.sha256(data).hexdigest():
+        return False
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return True
+
+
+class BuildManifest:
+    """Manifeste des artefacts publiés : empreinte des entrées et du contenu produit"""
+
+    def __init__(self, site_dir: str = SITE_DIR, filename: str = MANIFEST_FILE):
+        self.site_dir = site_dir
+        self.path = os.path.join(site_dir, filename)
+        self.entries: Dict[str, Dict[str, str]] = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get('artifacts', {})
+        self.rebuilt = []
+        self.skipped = []
+
+    def site_path(self, artifact: str) -> str:
+        return os.path.join(self.site_dir, artifact)
+
+    def is_fresh(self, artifact: str, input_hash: str) -> bool:
+        """L'artefact publié correspond-il déjà à ces entrées ?"""
+        entry = self.entries.get(artifact)
+        if not entry or entry.get('inputs') != input_hash:
+            return False
+        return hash_file(self.site_path(artifact)) == entry.get('output')
+
+    def should_build(self, artifact: str, input_hash: str) -> bool:
+        """Indique s'il faut (re)générer l'artefact, et comptabilise les artefacts ignorés"""
+        if self.is_fresh(artifact, input_hash):
+            self.skipped.append(artifact)
+            return False
+        return True
+
+    def record(self, artifact: str, source: str, input_hash: str):
+        """Enregistre un artefact fraîchement généré (fichier local à publier)"""
+        self.entries[artifact] = {
+            'source': source,
+            'inputs': input_hash,
+            'output': hash_file(source)
+        }
+        self.rebuilt.append(artifact)
+
+    def save(self) -> bool:
+        """Sauvegarde le manifeste (seulement si son contenu change)"""
+        data = json.dumps({'version': BUILD_VERSION, 'artifacts': self.entries},
+                          indent=2, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        return write_if_changed(self.path, data)
+
+    def publish(self, artifact: str) -> bool:
+        """Copie la source enregistrée vers le site si elle correspond au dernier build"""
+        entry = self.entries.get(artifact)
+        if not entry:
+            return False
+        source, target = entry['source'], self.site_path(artifact)
+        source_hash = hash_file(source)
+        # Source absente ou périmée (build ignoré) : la copie publiée fait foi
+        if source_hash is None or source_hash != entry['output']:
+            return False
+        if hash_file(target) == source_hash:
+            return False
+        os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+        shutil.copyfile(source, target)
+        return True
+
+    def summary(self) -> str:
+        return f"{len(self.rebuilt)} artefacts régénérés, {len(self.skipped)} inchangés"
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Analyses temporelles de l'historique sur disque en map-reduce, sur un pool de processus
+Chaque tâche lit sa tranche (temps ou stations) du fichier memory-mappé et renvoie des agrégats entiers fusionnables
+"""
+
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Any, Optional, Tuple
+
+from history_store import HistoryFile
+from profiling import profile_stage, run_cli
+from registry import StationRegistry
+from schema import json_default
+from snapshot import LOW_EFFICIENCY_THRESHOLD
+from timestamps import SECONDS_PER_DAY, day_of_week, hour_of_day
+
+# Taille des tâches : jours consécutifs (découpage temporel) ou colonnes (découpage par station)
+CHUNK_DAYS = 30
+CHUNK_STATIONS = 256
+# Ticks lus à la fois par une tâche (borne la mémoire de chaque processus)
+BLOCK_TICKS = 4096
+NO_VALUE = np.iinfo(np.int64).max
+# Pondérations de StationSnapshot.efficiency_score
+BALANCE_WEIGHT, AVAILABILITY_WEIGHT, UTILIZATION_WEIGHT = 0.4, 0.3, 0.3
+
+# Tâche : (premier tick, tick de fin, première station, station de fin), stations = positions dans station_keys
+Chunk = Tuple[int, int, int, int]
+
+
+class TemporalAggregates:
+    """Agrégats partiels d'une tranche stations × jours
+
+    Uniquement des sommes, comptes, minima et maxima entiers : la fusion est exacte et
+    indépendante de l'ordre, le résultat ne dépend ni du découpage ni du nombre de processus.
+    """
+
+    def __init__(self, row_start: int, n_stations: int, first_day: int, n_days: int):
+        self.row_start = row_start
+        self.first_day = first_day
+        # Par station et heure de la journée
+        self.hour_count = np.zeros((n_stations, 24), dtype=np.int64)
+        self.hour_sum = np.zeros((n_stations, 24), dtype=np.int64)
+        self.hour_squares = np.zeros((n_stations, 24), dtype=np.int64)
+        self.hour_min = np.full((n_stations, 24), NO_VALUE, dtype=np.int64)
+        self.hour_max = np.full((n_stations, 24), -1, dtype=np.int64)
+        # Par station, type de jour (0 = semaine, 1 = week-end) et heure : heures de pointe
+        self.day_type_count = np.zeros((n_stations, 2 * 24), dtype=np.int64)
+        self.day_type_sum = np.zeros((n_stations, 2 * 24), dtype=np.int64)
+        # Par station et jour : termes entiers du score d'efficacité
+        self.day_count = np.zeros((n_stations, n_days), dtype=np.int64)
+        self.day_bikes = np.zeros((n_stations, n_days), dtype=np.int64)
+        # Σ |2 × vélos - capacité| : écart à l'équilibre (balance_score)
+        self.day_imbalance = np.zeros((n_stations, n_days), dtype=np.int64)
+        # Mesures ni vides ni pleines (availability_score)
+        self.day_available = np.zeros((n_stations, n_days), dtype=np.int64)
+
+    @property
+    def n_stations(self) -> int:
+        return len(self.hour_count)
+
+    @property
+    def n_days(self) -> int:
+        return self.day_count.shape[1]
+
+    def add_block(self, epochs: np.ndarray, values: np.ndarray, capacities: np.ndarray):
+        """Ajoute un bloc de ticks consécutifs (ticks × stations, int16, -1 = manquant)"""
+        valid = values >= 0
+        bikes = np.where(valid, values, 0).astype(np.int64)
+        # Ticks groupés par heure absolue : une réduction par heure, puis ventilation par heure/jour
+        absolute_hours = epochs // 3600
+        starts = np.flatnonzero(np.r_[True, np.diff(absolute_hours) != 0])
+        run_epochs = absolute_hours[starts] * 3600
+        hours = hour_of_day(run_epochs)
+        days = run_epochs // SECONDS_PER_DAY - self.first_day
+        day_types = (day_of_week(run_epochs) >= 5) * 24 + hours
+
+        count = np.add.reduceat(valid.astype(np.int64), starts, axis=0)
+        total = np.add.reduceat(bikes, starts, axis=0)
+        np.add.at(self.hour_count.T, hours, count)
+        np.add.at(self.hour_sum.T, hours, total)
+        np.add.at(self.hour_squares.T, hours, np.add.reduceat(bikes * bikes, starts, axis=0))
+        np.minimum.at(self.hour_min.T, hours, np.minimum.reduceat(np.where(valid, bikes, NO_VALUE), starts, axis=0))
+        np.maximum.at(self.hour_max.T, hours, np.maximum.reduceat(np.where(valid, bikes, -1), starts, axis=0))
+        np.add.at(self.day_type_count.T, day_types, count)
+        np.add.at(self.day_type_sum.T, day_types, total)
+
+        np.add.at(self.day_count.T, days, count)
+        np.add.at(self.day_bikes.T, days, total)
+        imbalance = np.where(valid, np.abs(2 * bikes - capacities), 0)
+        np.add.at(self.day_imbalance.T, days, np.add.reduceat(imbalance, starts, axis=0))
+        available = valid & (bikes > 0) & (bikes < capacities)
+        np.add.at(self.day_available.T, days, np.add.reduceat(available.astype(np.int64), starts, axis=0))
+
+    def merge(self, partial: 'TemporalAggregates'):
+        """Fusionne un agrégat partiel (sous-ensemble de stations et de jours) dans celui-ci"""
+        rows = slice(partial.row_start - self.row_start, partial.row_start - self.row_start + partial.n_stations)
+        self.hour_count[rows] += partial.hour_count
+        self.hour_sum[rows] += partial.hour_sum
+        self.hour_squares[rows] += partial.hour_squares
+        np.minimum(self.hour_min[rows], partial.hour_min, out=self.hour_min[rows])
+        np.maximum(self.hour_max[rows], partial.hour_max, out=self.hour_max[rows])
+        self.day_type_count[rows] += partial.day_type_count
+        self.day_type_sum[rows] += partial.day_type_sum
+
+        days = slice(partial.first_day - self.first_day, partial.first_day - self.first_day + partial.n_days)
+        self.day_count[rows, days] += partial.day_count
+        self.day_bikes[rows, days] += partial.day_bikes
+        self.day_imbalance[rows, days] += partial.day_imbalance
+        self.day_available[rows, days] += partial.day_available
+
+
+def aggregate_chunk(path: str, chunk: Chunk, columns: np.ndarray, capacities: np.ndarray,
+                    block_ticks: int = BLOCK_TICKS) -> TemporalAggregates:
+    """Tâche d'un processus : agrège une tranche du fichier d'historique (ouvert ici, en lecture seule)"""
+    tick_start, tick_end, row_start, row_end = chunk
+    history = HistoryFile(path)
+    first_day = int(history.timestamps(tick_start, tick_start + 1)[0]) // SECONDS_PER_DAY
+    last_day = int(history.timestamps(tick_end - 1, tick_end)[0]) // SECONDS_PER_DAY
+    partial = TemporalAggregates(row_start, row_end - row_start, first_day, last_day - first_day + 1)
+
+    data = history.matrix()
+    capacities = capacities.astype(np.int64)
+    for start in range(tick_start, tick_end, block_ticks):
+        stop = min(start + block_ticks, tick_end)
+        partial.add_block(history.timestamps(start, stop), np.asarray(data[start:stop][:, columns]), capacities)
+    history.close()
+    return partial
+
+
+def station_maxima(path: str, chunk: Chunk, columns: np.ndarray,
+                   block_ticks: int = BLOCK_TICKS) -> Tuple[int, np.ndarray]:
+    """Tâche d'un processus : maximum observé par station de la tranche (capacité de repli)"""
+    tick_start, tick_end, row_start, _ = chunk
+    history = HistoryFile(path)
+    data = history.matrix()
+    maxima = np.full(len(columns), -1, dtype=np.int64)
+    for start in range(tick_start, tick_end, block_ticks):
+        stop = min(start + block_ticks, tick_end)
+        np.maximum(maxima, np.asarray(data[start:stop][:, columns]).max(axis=0), out=maxima)
+    history.close()
+    return row_start, maxima
+
+
+class ChunkedAnalytics:
+    """Motifs horaires, heures de pointe et efficacité dans le temps d'un fichier d'historique (HistoryFile)"""
+
+    def __init__(self, path: str, capacities: Optional[Dict[int, int]] = None, by: str = 'time',
+                 chunk_days: int = CHUNK_DAYS, chunk_stations: int = CHUNK_STATIONS,
+                 workers: Optional[int] = None):
+        if by not in ('time', 'station'):
+            raise ValueError(f"Découpage inconnu: {by} (time ou station)")
+        self.path = path
+        self.by = by
+        self.chunk_days = chunk_days
+        self.chunk_stations = chunk_stations
+        # workers=1 : même découpage, exécuté dans le processus courant
+        self.workers = workers or os.cpu_count() or 1
+        history = HistoryFile(path)
+        self.station_keys = history.station_keys.copy()
+        self.columns = history.columns_for(self.station_keys)
+        self.n_ticks = history.n_ticks
+        self.start_epoch = history.start_epoch
+        self.step_seconds = history.step_seconds
+        history.close()
+        # Capacité inconnue (0) : remplacée par le maximum observé
+        capacities = capacities or {}
+        self.capacities = np.array([capacities.get(int(key), 0) for key in self.station_keys], dtype=np.int64)
+
+    def plan(self) -> List[Chunk]:
+        """Découpage en tâches : jours consécutifs pour toutes les stations, ou groupes de stations sur toute la durée"""
+        n_stations = len(self.station_keys)
+        if self.n_ticks == 0 or n_stations == 0:
+            return []
+        if self.by == 'station':
+            return [(0, self.n_ticks, start, min(start + self.chunk_stations, n_stations))
+                    for start in range(0, n_stations, self.chunk_stations)]
+
+        # Frontières alignées sur les jours : chaque jour n'est lu que par une tâche
+        epochs = self.start_epoch + np.arange(self.n_ticks, dtype=np.int64) * self.step_seconds
+        days = epochs // SECONDS_PER_DAY
+        boundaries = np.flatnonzero(np.diff((days - days[0]) // self.chunk_days)) + 1
+        edges = [0, *boundaries.tolist(), self.n_ticks]
+        return [(start, stop, 0, n_stations) for start, stop in zip(edges[:-1], edges[1:])]
+
+    def _map(self, function, tasks: List[Tuple]):
+        """Résultats des tâches, dans l'ordre d'achèvement (la réduction ne dépend pas de l'ordre)"""
+        if self.workers == 1 or len(tasks) == 1:
+            for task in tasks:
+                yield function(*task)
+            return
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as pool:
+            futures = [pool.submit(function, *task) for task in tasks]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def _fill_capacities(self, chunks: List[Chunk]):
+        unknown = self.capacities <= 0
+        if not unknown.any():
+            return
+        # Passe préalable sur le même découpage : maximum par station, fusionné par maximum
+        maxima = np.full(len(self.station_keys), -1, dtype=np.int64)
+        tasks = [(self.path, chunk, self.columns[chunk[2]:chunk[3]]) for chunk in chunks]
+        for row_start, partial in self._map(station_maxima, tasks):
+            rows = slice(row_start, row_start + len(partial))
+            np.maximum(maxima[rows], partial, out=maxima[rows])
+        self.capacities[unknown] = np.maximum(maxima[unknown], 0)
+
+    def run(self) -> 'TemporalReport':
+        """Map (une tâche par tranche) puis réduction des agrégats partiels"""
+        chunks = self.plan()
+        if not chunks:
+            raise ValueError(f"Historique vide: {self.path}")
+        self._fill_capacities(chunks)
+
+        first_day = self.start_epoch // SECONDS_PER_DAY
+        last_day = (self.start_epoch + (self.n_ticks - 1) * self.step_seconds) // SECONDS_PER_DAY
+        total = TemporalAggregates(0, len(self.station_keys), first_day, last_day - first_day + 1)
+        tasks = [(self.path, chunk, self.columns[chunk[2]:chunk[3]], self.capacities[chunk[2]:chunk[3]])
+                 for chunk in chunks]
+        started = time.perf_counter()
+        for partial in self._map(aggregate_chunk, tasks):
+            total.merge(partial)
+        elapsed = time.perf_counter() - started
+        cells = self.n_ticks * len(self.station_keys)
+        print(f"⚙️ {len(chunks)} tâches sur {min(self.workers, len(chunks))} processus: {cells:,} mesures "
+              f"en {elapsed:.1f}s ({cells / max(elapsed, 1e-9) / 1e6:.1f} M/s)")
+        return TemporalReport(self.station_keys, self.capacities, total)
+
+
+class TemporalReport:
+    """Résultats finaux calculés à partir des agrégats fusionnés"""
+
+    def __init__(self, station_keys: np.ndarray, capacities: np.ndarray, aggregates: TemporalAggregates):
+        self.station_keys = station_keys
+        self.capacities = capacities
+        self.aggregates = aggregates
+
+    def hourly_patterns(self) -> pd.DataFrame:
+        """Vélos disponibles par heure sur tout le réseau (mean, std, min, max, comme analyze_temporal_patterns)"""
+        agg = self.aggregates
+        count = agg.hour_count.sum(axis=0)
+        total = agg.hour_sum.sum(axis=0).astype(np.float64)
+        squares = agg.hour_squares.sum(axis=0).astype(np.float64)
+        observed = count > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = total / count
+            # Écart-type corrigé (ddof=1), comme pandas
+            std = np.sqrt(np.maximum(squares - total * mean, 0) / (count - 1))
+        return pd.DataFrame({
+            'mean': np.where(observed, mean, np.nan),
+            'std': np.where(count > 1, std, np.nan),
+            'min': np.where(observed, agg.hour_min.min(axis=0), np.nan),
+            'max': np.where(observed, agg.hour_max.max(axis=0), np.nan),
+            'observations': count
+        }, index=pd.RangeIndex(24, name='hour'))
+
+    def station_hourly_means(self) -> np.ndarray:
+        """Vélos disponibles moyens par station et par heure (stations × 24, NaN si jamais observé)"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.aggregates.hour_sum / self.aggregates.hour_count
+
+    def peak_hours(self) -> pd.DataFrame:
+        """Heures de pointe par station (intensité d'usage = maximum observé - vélos moyens, comme predict_peak_hours)"""
+        agg = self.aggregates
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = agg.day_type_sum / agg.day_type_count
+        intensity = agg.hour_max.max(axis=1)[:, None] - means
+        weekday, weekend = intensity[:, :24], intensity[:, 24:]
+
+        def peak(pattern: np.ndarray, first_hour: int = 0) -> np.ndarray:
+            observed = ~np.isnan(pattern).all(axis=1)
+            hours = np.nan_to_num(pattern, nan=-np.inf).argmax(axis=1) + first_hour
+            return np.where(observed, hours, -1)
+
+        return pd.DataFrame({
+            'station_key': self.station_keys,
+            'morning_peak': peak(weekday),
+            'evening_peak': peak(weekday[:, 13:], 13),
+            'weekend_peak': peak(weekend)
+        })
+
+    def _efficiency_terms(self) -> Dict[str, np.ndarray]:
+        """Sommes des composantes du score d'efficacité par station et par jour (float64)"""
+        agg = self.aggregates
+        capacities = self.capacities[:, None].astype(np.float64)
+        has_slots = np.broadcast_to(capacities > 0, agg.day_count.shape)
+        zeros = np.zeros(agg.day_count.shape)
+        # Capacité nulle : taux à 0 (comme build_status_frame), donc équilibre nul
+        utilization = np.divide(agg.day_bikes, capacities, out=zeros.copy(), where=has_slots)
+        balance = np.where(has_slots, agg.day_count - np.divide(agg.day_imbalance, capacities, out=zeros.copy(),
+                                                                  where=has_slots), 0)
+        availability = agg.day_available.astype(np.float64)
+        return {
+            'count': agg.day_count,
+            'balance_score': balance,
+            'availability_score': availability,
+            'utilization_rate': utilization,
+            'efficiency_score': (BALANCE_WEIGHT * balance + AVAILABILITY_WEIGHT * availability
+                                 + UTILIZATION_WEIGHT * utilization)
+        }
+
+    def efficiency_over_time(self) -> pd.DataFrame:
+        """Scores moyens du réseau par jour (mêmes formules que StationSnapshot, sur toutes les mesures du jour)"""
+        terms = self._efficiency_terms()
+        count = terms.pop('count').sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frame = pd.DataFrame({name: values.sum(axis=0) / count for name, values in terms.items()})
+        frame.insert(0, 'observations', count)
+        frame.insert(0, 'date', (self.aggregates.first_day + np.arange(len(count))).astype('datetime64[D]'))
+        return frame[frame['observations'] > 0].reset_index(drop=True)
+
+    def station_efficiency(self) -> pd.DataFrame:
+        """Score d'efficacité moyen de chaque station sur toute la période"""
+        terms = self._efficiency_terms()
+        count = terms.pop('count').sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frame = pd.DataFrame({name: values.sum(axis=1) / count for name, values in terms.items()})
+        frame.insert(0, 'observations', count)
+        frame.insert(0, 'station_key', self.station_keys)
+        return frame
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'hourly_patterns': self.hourly_patterns().reset_index().to_dict('records'),
+            'peak_hours': self.peak_hours().to_dict('records'),
+            'efficiency_over_time': self.efficiency_over_time().to_dict('records'),
+            'station_efficiency': self.station_efficiency().to_dict('records')
+        }
+
+
+def registry_capacities(history_path: str) -> Dict[int, int]:
+    """Capacités du registre enregistré à côté de l'historique (<historique>_registry.json), s'il existe"""
+    registry_path = f"{os.path.splitext(history_path)[0]}_registry.json"
+    if not os.path.exists(registry_path):
+        return {}
+    registry = StationRegistry.load(registry_path)
+    return dict(enumerate(registry.capacities[:len(registry)].tolist()))
+
+
+def main_chunked():
+    """Fonction principale des analyses temporelles multi-processus"""
+    parser = argparse.ArgumentParser(description="Analyses temporelles d'un historique sur disque (map-reduce)")
+    parser.add_argument('history', help="Fichier d'historique (HistoryFile)")
+    parser.add_argument('--workers', type=int, help="Nombre de processus (défaut: nombre de cœurs)")
+    parser.add_argument('--by', choices=['time', 'station'], default='time', help="Découpage des tâches")
+    parser.add_argument('--chunk-days', type=int, default=CHUNK_DAYS, help="Jours par tâche (découpage temporel)")
+    parser.add_argument('--chunk-stations', type=int, default=CHUNK_STATIONS,
+                        help="Stations par tâche (découpage par station)")
+    parser.add_argument('--output', default="chunked_analytics.json", help="Export JSON des résultats")
+    args = parser.parse_args()
+
+    analytics = ChunkedAnalytics(args.history, registry_capacities(args.history), by=args.by,
+                                 chunk_days=args.chunk_days, chunk_stations=args.chunk_stations,
+                                 workers=args.workers)
+    print(f"🗃️ {analytics.n_ticks} ticks × {len(analytics.station_keys)} stations, "
+          f"{len(analytics.plan())} tâches ({args.by})")
+    with profile_stage('chunked_analytics'):
+        report = analytics.run()
+
+    hourly = report.hourly_patterns()
+    print(f"🕐 Heure la plus chargée du réseau: {hourly['mean'].idxmin()}h, la plus calme: {hourly['mean'].idxmax()}h")
+    peaks = report.peak_hours()
+    observed = peaks[peaks['morning_peak'] >= 0]
+    if len(observed):
+        print(f"📈 Pic de semaine le plus fréquent: {observed['morning_peak'].mode().iloc[0]}h "
+              f"(soir: {observed['evening_peak'].mode().iloc[0]}h)")
+    efficiency = report.efficiency_over_time()
+    if len(efficiency):
+        print(f"📊 Efficacité moyenne: {efficiency['efficiency_score'].iloc[0]:.1%} "
+              f"({efficiency['date'].iloc[0]:%Y-%m-%d}) → {efficiency['efficiency_score'].iloc[-1]:.1%} "
+              f"({efficiency['date'].iloc[-1]:%Y-%m-%d})")
+    stations = report.station_efficiency()
+    print(f"⚠️ {int((stations['efficiency_score'] < LOW_EFFICIENCY_THRESHOLD).sum())} station(s) "
+          f"d'efficacité moyenne faible")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report.to_dict(), f, ensure_ascii=False, default=json_default)
+    print(f"✅ Résultats exportés: {args.output}")
+
+
+if __name__ == "__main__":
+    run_cli(main_chunked)
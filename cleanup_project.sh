@@ -48,6 +48,7 @@ echo ""
 echo "📊 Nettoyage des données dupliquées..."
 safe_remove "velomagg_analysis.csv"
 safe_remove "velomagg_analysis_stats.json"
+safe_remove "summary"
 safe_remove "rapport_detaille.txt"
 
 # Supprimer les visualizations dupliquées (gardées dans docs/visualizations/ seulement)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Typologie des stations par profil d'usage hebdomadaire
+K-means vectorisé sur la matrice station × 168 heures de la semaine (occupation normalisée)
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Any, Optional
+
+from history import StationHistory
+from timestamps import day_of_week, hour_of_day
+
+HOURS_PER_WEEK = 168
+N_CLUSTERS = 4
+SEED = 42
+N_INIT = 4
+MAX_ITER = 100
+# Écart moyen d'occupation (par heure) en deçà duquel le modèle en cache est conservé
+PROFILE_TOLERANCE = 0.02
+
+CLUSTER_LABELS = {
+    'residential': "🏘️ Résidentielle",
+    'workplace': "🏢 Bureaux",
+    'transit': "🚉 Pôle d'échange",
+    'leisure': "🌳 Loisirs",
+    'mixed': "🔀 Mixte"
+}
+
+# Moment conseillé pour rééquilibrer chaque type de station
+REBALANCING_HINTS = {
+    'residential': "réapprovisionner avant la pointe du matin",
+    'workplace': "libérer des places avant 9h, réapprovisionner avant 17h",
+    'transit': "surveiller aux deux pointes de la journée",
+    'leisure': "anticiper les après-midi de week-end",
+    'mixed': "rééquilibrage au fil de l'eau"
+}
+
+WEEKDAYS = np.arange(HOURS_PER_WEEK) < 5 * 24
+
+
+def hour_of_week_profiles(history: StationHistory) -> np.ndarray:
+    """Occupation moyenne par heure de la semaine (lundi 0h = colonne 0), station × 168
+
+    Les heures jamais observées reprennent l'occupation moyenne de la station ;
+    une station sans aucune mesure a un profil NaN.
+    """
+    epochs = history.epochs
+    hour_of_week = day_of_week(epochs) * 24 + hour_of_day(epochs)
+    capacities = history.capacities
+    if capacities is None:
+        capacities = np.nanmax(history.values, axis=1, initial=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        occupancy = np.clip(history.values / capacities[:, None], 0, 1)
+
+    # Agrégation par produit matriciel avec l'indicatrice pas de temps × heure de la semaine
+    observed = ~np.isnan(occupancy)
+    indicator = np.zeros((history.n_steps, HOURS_PER_WEEK), dtype=np.float32)
+    indicator[np.arange(history.n_steps), hour_of_week] = 1
+    sums = np.where(observed, occupancy, 0).astype(np.float32) @ indicator
+    counts = observed.astype(np.float32) @ indicator
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        station_mean = sums.sum(axis=1) / counts.sum(axis=1)
+        profiles = np.where(counts > 0, sums / counts, station_mean[:, None])
+    return profiles.astype(np.float32)
+
+
+def _squared_distances(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    distances = ((points ** 2).sum(axis=1)[:, None] - 2 * points @ centroids.T
+                 + (centroids ** 2).sum(axis=1)[None, :])
+    return np.maximum(distances, 0)
+
+
+def _kmeans_plus_plus(points: np.ndarray, k: int, rng: np.random.Generator) -> np.ndarray:
+    """Initialisation k-means++ : centres éloignés tirés proportionnellement à la distance²"""
+    centroids = [points[rng.integers(len(points))]]
+    closest = _squared_distances(points, centroids[0][None, :])[:, 0]
+    for _ in range(1, k):
+        total = closest.sum()
+        index = rng.choice(len(points), p=closest / total) if total > 0 else rng.integers(len(points))
+        centroids.append(points[index])
+        closest = np.minimum(closest, _squared_distances(points, points[index][None, :])[:, 0])
+    return np.array(centroids)
+
+
+def kmeans(points: np.ndarray, k: int = N_CLUSTERS, seed: int = SEED, n_init: int = N_INIT,
+           max_iter: int = MAX_ITER) -> Dict[str, Any]:
+    """K-means (Lloyd) déterministe : meilleure inertie parmi n_init initialisations k-means++"""
+    points = np.asarray(points, dtype=np.float64)
+    k = min(k, len(points))
+    rng = np.random.default_rng(seed)
+    best = None
+    for _ in range(n_init):
+        centroids = _kmeans_plus_plus(points, k, rng)
+        labels = None
+        for _ in range(max_iter):
+            new_labels = _squared_distances(points, centroids).argmin(axis=1)
+            if labels is not None and np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+            # Nouveaux centres : sommes par groupe via l'indicatrice station × groupe
+            members = np.zeros((len(points), k))
+            members[np.arange(len(points)), labels] = 1
+            sizes = members.sum(axis=0)
+            centroids = np.where(sizes[:, None] > 0, members.T @ points / np.maximum(sizes, 1)[:, None],
+                                 centroids)
+        inertia = float(_squared_distances(points, centroids)[np.arange(len(points)), labels].sum())
+        if best is None or inertia < best['inertia']:
+            best = {'labels': labels, 'centroids': centroids, 'inertia': inertia}
+    return best
+
+
+def describe_centroid(centroid: np.ndarray) -> Dict[str, float]:
+    """Indicateurs d'usage d'un profil moyen (écarts d'occupation)"""
+    weekday = centroid[WEEKDAYS].reshape(5, 24).mean(axis=0)
+    weekend = centroid[~WEEKDAYS].reshape(2, 24).mean(axis=0)
+    return {
+        # Les vélos arrivent en journée de semaine (bureaux) ou partent le matin (résidentiel)
+        'daytime_gain': float(weekday[9:17].mean() - weekday[0:6].mean()),
+        # Usage de loisir : week-end plus vide l'après-midi qu'en semaine
+        'weekend_activity': float(weekday[12:20].mean() - weekend[12:20].mean()),
+        # Forte rotation aux deux pointes sans accumulation nette (pôle d'échange)
+        'peak_swing': float(np.abs(np.diff(weekday[6:20])).mean())
+    }
+
+
+def name_clusters(centroids: np.ndarray) -> List[str]:
+    """Attribue un type à chaque groupe (au plus un groupe par type, les autres sont « mixte »)"""
+    indicators = [describe_centroid(centroid) for centroid in centroids]
+    scores = {
+        'residential': [-ind['daytime_gain'] for ind in indicators],
+        'workplace': [ind['daytime_gain'] for ind in indicators],
+        'leisure': [ind['weekend_activity'] for ind in indicators],
+        'transit': [ind['peak_swing'] - abs(ind['daytime_gain']) / 8 for ind in indicators]
+    }
+    names = ['mixed'] * len(centroids)
+    # Affectation gloutonne des meilleurs couples (type, groupe)
+    pairs = sorted(((score, label, cluster) for label, values in scores.items()
+                    for cluster, score in enumerate(values)), reverse=True)
+    used = set()
+    for score, label, cluster in pairs:
+        if label in used or names[cluster] != 'mixed':
+            continue
+        names[cluster] = label
+        used.add(label)
+    return names
+
+
+class StationClusterer:
+    """Typologie des stations, mise en cache tant que les profils ne changent pas sensiblement"""
+
+    def __init__(self, n_clusters: int = N_CLUSTERS, seed: int = SEED,
+                 tolerance: float = PROFILE_TOLERANCE):
+        self.n_clusters = n_clusters
+        self.seed = seed
+        self.tolerance = tolerance
+        self.result: Optional[Dict[str, Any]] = None
+
+    def needs_refit(self, station_keys: np.ndarray, profiles: np.ndarray) -> bool:
+        """Nouveau calcul si les stations ont changé ou si les profils ont dérivé"""
+        if self.result is None or not np.array_equal(station_keys, self.result['station_keys']):
+            return True
+        drift = np.nanmean(np.abs(profiles - self.result['profiles']))
+        return not drift <= self.tolerance
+
+    def fit(self, history: StationHistory) -> Dict[str, Any]:
+        """Regroupe les stations observées ; les stations sans mesure ont le groupe -1"""
+        profiles = hour_of_week_profiles(history)
+        if not self.needs_refit(history.station_keys, profiles):
+            return self.result
+
+        observed = ~np.isnan(profiles).any(axis=1)
+        labels = np.full(len(profiles), -1, dtype=np.int64)
+        centroids = np.empty((0, HOURS_PER_WEEK))
+        if observed.any():
+            # Regroupement sur la forme du profil : occupation centrée sur la moyenne de la station
+            points = profiles[observed] - profiles[observed].mean(axis=1, keepdims=True)
+            model = kmeans(points, self.n_clusters, self.seed)
+            labels[observed] = model['labels']
+            # Profils moyens non centrés, pour l'affichage
+            centroids = np.array([profiles[observed][model['labels'] == cluster].mean(axis=0)
+                                  for cluster in range(len(model['centroids']))])
+
+        names = name_clusters(centroids) if len(centroids) else []
+        self.result = {
+            'station_keys': history.station_keys.copy(),
+            'profiles': profiles,
+            'labels': labels,
+            'centroids': centroids.astype(np.float32),
+            'names': names
+        }
+        return self.result
+
+    def station_types(self) -> pd.DataFrame:
+        """Type de chaque station (station_key, cluster, cluster_type, cluster_label)"""
+        if self.result is None:
+            raise RuntimeError("La typologie des stations n'a pas été calculée")
+        labels = self.result['labels']
+        types = np.array(self.result['names'] + [None], dtype=object)[labels]
+        return pd.DataFrame({
+            'station_key': self.result['station_keys'],
+            'cluster': labels,
+            'cluster_type': types,
+            'cluster_label': [CLUSTER_LABELS.get(name, "❔ Non observée") for name in types]
+        })
+
+    def label_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Ajoute le type de station au snapshot (stations inconnues du modèle : non observées)"""
+        types = self.station_types()
+        merged = df.merge(types, on='station_key', how='left')
+        merged['cluster'] = merged['cluster'].fillna(-1).astype(np.int64)
+        merged['cluster_label'] = merged['cluster_label'].fillna("❔ Non observée")
+        return merged
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Codec compact pour l'historique des vélos disponibles
+Timestamps en deltas, comptages en plages (run-length), entiers en varint, blocs vérifiés par CRC32
+"""
+
+import struct
+import zlib
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Iterator, Tuple
+
+from timestamps import decode_timestamps
+
+MISSING = -1
+MAGIC = b'VMCODEC1'
+ARCHIVE_MAGIC = b'VMARCH01'
+# échantillons, plages de deltas de temps, plages de valeurs, premier timestamp, taille, CRC32
+BLOCK_HEADER = struct.Struct('<IIIqII')
+# clé de station, nombre d'octets du flux
+STATION_HEADER = struct.Struct('<iI')
+BLOCK_SIZE = 4096
+
+
+def zigzag_encode(values: np.ndarray) -> np.ndarray:
+    """Entiers signés -> non signés (0, -1, 1, -2... -> 0, 1, 2, 3...)"""
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def zigzag_decode(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.uint64)
+    return ((values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64))
+
+
+def varint_encode(values: np.ndarray) -> bytes:
+    """Encodage LEB128 vectorisé (7 bits par octet, bit de poids fort = continuation)"""
+    values = np.asarray(values, dtype=np.uint64)
+    if not len(values):
+        return b''
+    bit_length = np.zeros(len(values), dtype=np.int64)
+    remaining = values.copy()
+    while remaining.any():
+        bit_length += remaining > 0
+        remaining >>= np.uint64(1)
+    n_bytes = np.maximum(1, -(-bit_length // 7))
+
+    offsets = np.concatenate([[0], np.cumsum(n_bytes)])
+    out = np.zeros(offsets[-1], dtype=np.uint8)
+    for position in range(int(n_bytes.max())):
+        mask = n_bytes > position
+        chunk = (values[mask] >> np.uint64(7 * position)) & np.uint64(0x7F)
+        more = (n_bytes[mask] > position + 1).astype(np.uint8) << 7
+        out[offsets[:-1][mask] + position] = chunk.astype(np.uint8) | more
+    return out.tobytes()
+
+
+def varint_decode(data: bytes) -> np.ndarray:
+    """Décodage LEB128 vectorisé de tout un flux"""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if not len(raw):
+        return np.empty(0, dtype=np.uint64)
+    ends = np.flatnonzero(raw < 0x80)
+    if not len(ends) or ends[-1] != len(raw) - 1:
+        raise ValueError("Flux varint tronqué")
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    # Position de chaque octet dans son entier
+    group = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    position = np.arange(len(raw)) - starts[group]
+    parts = (raw & 0x7F).astype(np.uint64) << (7 * position).astype(np.uint64)
+    return np.add.reduceat(parts, starts)
+
+
+def _runs(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Plages de valeurs identiques : (valeurs, longueurs)"""
+    if not len(values):
+        return values, np.empty(0, dtype=np.int64)
+    starts = np.flatnonzero(np.concatenate([[True], values[1:] != values[:-1]]))
+    lengths = np.diff(np.concatenate([starts, [len(values)]]))
+    return values[starts], lengths
+
+
+def encode_block(timestamps: np.ndarray, values: np.ndarray) -> bytes:
+    """Encode un bloc : en-tête, puis flux varint (plages des deltas de temps, plages des valeurs)"""
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    values = np.asarray(values, dtype=np.int64)
+    time_values, time_lengths = _runs(np.diff(timestamps))
+    run_values, run_lengths = _runs(values)
+    # Valeurs des plages encodées en écart à la plage précédente
+    run_deltas = np.diff(run_values, prepend=0)
+
+    payload = varint_encode(np.concatenate([
+        zigzag_encode(time_values), time_lengths.astype(np.uint64),
+        zigzag_encode(run_deltas), run_lengths.astype(np.uint64)
+    ]))
+    header = BLOCK_HEADER.pack(len(values), len(time_values), len(run_values),
+                               int(timestamps[0]) if len(timestamps) else 0,
+                               len(payload), zlib.crc32(payload))
+    return header + payload
+
+
+def decode_block(header: Tuple[int, ...], payload: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """Décode un bloc (vectorisé) en (timestamps int64, valeurs int64)"""
+    n_samples, n_time_runs, n_value_runs, first_timestamp, _, _ = header
+    numbers = varint_decode(payload)
+    if len(numbers) != 2 * (n_time_runs + n_value_runs):
+        raise ValueError("Bloc incohérent avec son en-tête")
+
+    time_values = zigzag_decode(numbers[:n_time_runs])
+    time_lengths = numbers[n_time_runs:2 * n_time_runs].astype(np.int64)
+    rest = numbers[2 * n_time_runs:]
+    run_values = np.cumsum(zigzag_decode(rest[:n_value_runs]))
+    run_lengths = rest[n_value_runs:].astype(np.int64)
+
+    timestamps = np.empty(n_samples, dtype=np.int64)
+    if n_samples:
+        timestamps[0] = first_timestamp
+        timestamps[1:] = first_timestamp + np.cumsum(np.repeat(time_values, time_lengths))
+    return timestamps, np.repeat(run_values, run_lengths)
+
+
+def iter_blocks(data: bytes, verify: bool = True) -> Iterator[Tuple[Tuple[int, ...], bytes]]:
+    """Parcourt les blocs d'un flux en vérifiant leur somme de contrôle"""
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Flux d'historique compressé invalide")
+    offset = len(MAGIC)
+    while offset < len(data):
+        header = BLOCK_HEADER.unpack_from(data, offset)
+        offset += BLOCK_HEADER.size
+        payload = data[offset:offset + header[4]]
+        offset += header[4]
+        if len(payload) != header[4]:
+            raise ValueError("Bloc tronqué")
+        if verify and zlib.crc32(payload) != header[5]:
+            raise ValueError(f"Somme de contrôle invalide (bloc à l'octet {offset - header[4]})")
+        yield header, payload
+
+
+def encode_series(timestamps: np.ndarray, values: np.ndarray, block_size: int = BLOCK_SIZE) -> bytes:
+    """Encode une série (timestamps epoch, comptages entiers ; MISSING = manquant) en blocs"""
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    values = np.asarray(values, dtype=np.int64)
+    blocks = [encode_block(timestamps[start:start + block_size], values[start:start + block_size])
+              for start in range(0, len(values), block_size)]
+    return MAGIC + b''.join(blocks)
+
+
+def decode_series(data: bytes, verify: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """Décode toute une série en tableaux NumPy"""
+    decoded = [decode_block(header, payload) for header, payload in iter_blocks(data, verify)]
+    if not decoded:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return (np.concatenate([timestamps for timestamps, _ in decoded]),
+            np.concatenate([values for _, values in decoded]))
+
+
+def encode_timeseries(response: Dict[str, Any], block_size: int = BLOCK_SIZE) -> bytes:
+    """Encode une réponse de /bikestation_timeseries (listes index/values)"""
+    timestamps = decode_timestamps(response['index'])
+    values = pd.to_numeric(pd.Series(response['values'], dtype=object), errors='coerce')
+    return encode_series(timestamps, values.fillna(MISSING).to_numpy(dtype=np.int64), block_size)
+
+
+def write_archive(path: str, station_keys: np.ndarray, timestamps: np.ndarray, matrix: np.ndarray,
+                  block_size: int = BLOCK_SIZE) -> int:
+    """Écrit une archive (une série compressée par station) ; matrix = temps × stations"""
+    size = 0
+    with open(path, 'wb') as f:
+        f.write(ARCHIVE_MAGIC + struct.pack('<I', len(station_keys)))
+        for column, station_key in enumerate(station_keys):
+            stream = encode_series(timestamps, matrix[:, column], block_size)
+            f.write(STATION_HEADER.pack(int(station_key), len(stream)))
+            f.write(stream)
+            size += len(stream)
+    return size
+
+
+def read_archive(path: str, verify: bool = True) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """Relit une archive : clé de station -> (timestamps, valeurs)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(ARCHIVE_MAGIC)] != ARCHIVE_MAGIC:
+        raise ValueError(f"Archive d'historique invalide: {path}")
+    (n_stations,) = struct.unpack_from('<I', data, len(ARCHIVE_MAGIC))
+    offset = len(ARCHIVE_MAGIC) + 4
+
+    series = {}
+    for _ in range(n_stations):
+        station_key, length = STATION_HEADER.unpack_from(data, offset)
+        offset += STATION_HEADER.size
+        series[station_key] = decode_series(data[offset:offset + length], verify)
+        offset += length
+    return series
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Collecte périodique de l'état des stations Vélomagg
+Ne transmet aux analyses et aux stockages que les stations modifiées
+"""
+
+import pandas as pd
+import time
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from schema import enforce_schema
+
+# Signature des abonnés : (stations modifiées, snapshot complet, horodatage)
+Listener = Callable[[pd.DataFrame, pd.DataFrame, datetime], None]
+
+
+def merge_snapshot(previous: Optional[pd.DataFrame], changed: pd.DataFrame,
+                   removed: Iterable[str] = ()) -> pd.DataFrame:
+    """Applique les lignes modifiées au snapshot précédent et retire les stations disparues (nouveau DataFrame)"""
+    removed = list(removed)
+    if removed and previous is not None and not previous.empty:
+        previous = previous[~previous['id'].isin(removed)].reset_index(drop=True)
+    if previous is None or previous.empty:
+        return enforce_schema(changed.reset_index(drop=True))
+    if changed.empty:
+        return previous
+
+    positions = pd.Index(previous['station_key']).get_indexer(changed['station_key'])
+    existing = positions >= 0
+
+    # Mise à jour colonne par colonne des stations connues
+    columns = {}
+    for column in previous.columns:
+        values = previous[column].to_numpy(copy=True)
+        values[positions[existing]] = changed[column].to_numpy()[existing]
+        columns[column] = values
+    merged = pd.DataFrame(columns, columns=previous.columns)
+
+    # Nouvelles stations ajoutées en fin de snapshot
+    if not existing.all():
+        merged = pd.concat([merged, changed[~existing]], ignore_index=True)
+
+    # Catégories réunies et types compacts rétablis
+    return enforce_schema(merged)
+
+
+class StationCollector:
+    """Interroge l'API à intervalle régulier et diffuse les changements aux abonnés"""
+
+    def __init__(self, analyzer, interval: float = 60):
+        self.analyzer = analyzer
+        self.interval = interval
+        self.snapshot: Optional[pd.DataFrame] = None
+        self.listeners: List[Listener] = []
+        self.ticks = 0
+        self.skipped_ticks = 0
+
+    def subscribe(self, listener: Listener):
+        """Enregistre un abonné notifié à chaque changement"""
+        self.listeners.append(listener)
+
+    def fetch_changes(self) -> Tuple[pd.DataFrame, List[str]]:
+        """Stations modifiées depuis la dernière interrogation (DataFrame vide si aucune) et identifiants disparus"""
+        changed_stations = self.analyzer.poll_changes()
+        removed = list(self.analyzer.removed_station_ids)
+        if not changed_stations:
+            return pd.DataFrame(), removed
+        return self.analyzer.build_status_frame(changed_stations), removed
+
+    def tick(self) -> pd.DataFrame:
+        """Effectue une interrogation et retourne les stations modifiées"""
+        self.ticks += 1
+        changed, removed = self.fetch_changes()
+
+        # 304 Not Modified ou aucune station modifiée ni retirée : aucun traitement
+        if changed.empty and not removed:
+            self.skipped_ticks += 1
+            return changed
+
+        self.snapshot = merge_snapshot(self.snapshot, changed, removed)
+        if changed.empty:
+            # Retraits seuls : les abonnés reçoivent un DataFrame vide aux colonnes du snapshot
+            changed = self.snapshot.iloc[:0]
+
+        timestamp = datetime.now()
+        for listener in self.listeners:
+            listener(changed, self.snapshot, timestamp)
+
+        return changed
+
+    def run(self, max_ticks: Optional[int] = None):
+        """Boucle de collecte (Ctrl+C pour arrêter)"""
+        print(f"📡 Collecte toutes les {self.interval:.0f}s...")
+        try:
+            while max_ticks is None or self.ticks < max_ticks:
+                started = time.monotonic()
+                changed = self.tick()
+                if not changed.empty:
+                    print(f"🔄 {datetime.now():%H:%M:%S} - {len(changed)} stations modifiées")
+                if max_ticks is not None and self.ticks >= max_ticks:
+                    break
+                time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            print("\n⏹️ Collecte interrompue")
+        print(f"✅ {self.ticks} interrogations, {self.skipped_ticks} sans changement")
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Matrice des distances et temps de trajet entre stations
+Forme condensée float32 (triangle supérieur), persistée sur disque par empreinte de l'ensemble des stations
+"""
+
+import glob
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Dict, Optional
+
+EARTH_RADIUS_KM = 6371
+DISTANCE_CACHE_DIR = os.path.join("cache", "distances")
+# Précision des coordonnées prises en compte (~1 m) : un déplacement plus petit ne reconstruit rien
+COORDINATE_DECIMALS = 5
+# Vitesse moyenne à vélo et détour du réseau viaire par rapport au vol d'oiseau
+CYCLING_SPEED_KMH = 15.0
+DETOUR_FACTOR = 1.3
+# Nombre de matrices conservées (mémoire et disque) : snapshot courant, registre d'un historique...
+MAX_CACHED_MATRICES = 4
+# Lignes calculées à la fois (borne la mémoire intermédiaire)
+BLOCK_ROWS = 512
+
+
+def haversine_matrix(lat1: np.ndarray, lon1: np.ndarray,
+                     lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Calcule la matrice des distances (km) entre deux ensembles de points GPS"""
+    lat1, lon1 = np.radians(lat1)[:, None], np.radians(lon1)[:, None]
+    lat2, lon2 = np.radians(lat2)[None, :], np.radians(lon2)[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def condensed_distances(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Distances (km, float32) de toutes les paires i < j, dans l'ordre ligne par ligne"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    n = len(lat)
+    condensed = np.empty(n * (n - 1) // 2, dtype=np.float32)
+    position = 0
+    for start in range(0, n, BLOCK_ROWS):
+        stop = min(start + BLOCK_ROWS, n)
+        block = haversine_matrix(lat[start:stop], lon[start:stop], lat, lon)
+        # Ligne i : colonnes j > i uniquement
+        upper = np.arange(n)[None, :] > np.arange(start, stop)[:, None]
+        values = block[upper]
+        condensed[position:position + len(values)] = values
+        position += len(values)
+    return condensed
+
+
+def condensed_index(rows: np.ndarray, cols: np.ndarray, n: int) -> np.ndarray:
+    """Position de la paire (i, j), i != j, dans la forme condensée (symétrique)"""
+    i = np.minimum(rows, cols).astype(np.int64)
+    j = np.maximum(rows, cols).astype(np.int64)
+    return n * i - i * (i + 1) // 2 + (j - i - 1)
+
+
+def station_set_hash(station_ids, latitudes: np.ndarray, longitudes: np.ndarray) -> str:
+    """Empreinte de l'ensemble des stations : identifiants et coordonnées arrondies, dans l'ordre"""
+    digest = hashlib.sha256("\0".join(map(str, station_ids)).encode('utf-8'))
+    coordinates = np.round(np.column_stack([latitudes, longitudes]).astype(np.float64), COORDINATE_DECIMALS)
+    digest.update(coordinates.tobytes())
+    return digest.hexdigest()
+
+
+class DistanceMatrix:
+    """Distances entre les stations d'un ensemble fixé (ordre des identifiants trié)"""
+
+    def __init__(self, station_ids, latitudes: np.ndarray, longitudes: np.ndarray,
+                 condensed: Optional[np.ndarray] = None):
+        self.station_ids = np.asarray(station_ids, dtype=object)
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.condensed = (condensed_distances(self.latitudes, self.longitudes)
+                          if condensed is None else np.asarray(condensed, dtype=np.float32))
+        self.content_hash = station_set_hash(self.station_ids, self.latitudes, self.longitudes)
+        self._rows = {station_id: row for row, station_id in enumerate(self.station_ids)}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'DistanceMatrix':
+        stations = df[['id', 'latitude', 'longitude']].drop_duplicates('id').sort_values('id')
+        return cls(stations['id'].to_numpy(dtype=object), stations['latitude'].to_numpy(dtype=np.float64),
+                   stations['longitude'].to_numpy(dtype=np.float64))
+
+    def __len__(self) -> int:
+        return len(self.station_ids)
+
+    def rows_for(self, station_ids) -> np.ndarray:
+        """Lignes correspondant à des identifiants (KeyError si une station est inconnue)"""
+        return np.fromiter((self._rows[station_id] for station_id in station_ids), dtype=np.int64)
+
+    def submatrix(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """Distances rows × cols (km, float32), sans reconstruire la matrice carrée"""
+        rows, cols = np.broadcast_arrays(np.asarray(rows, dtype=np.int64)[:, None],
+                                         np.asarray(cols, dtype=np.int64)[None, :])
+        distances = np.zeros(rows.shape, dtype=np.float32)
+        pairs = rows != cols
+        distances[pairs] = self.condensed[condensed_index(rows[pairs], cols[pairs], len(self))]
+        return distances
+
+    def for_frame(self, df: pd.DataFrame) -> np.ndarray:
+        """Matrice carrée des distances dans l'ordre des lignes du DataFrame"""
+        rows = self.rows_for(df['id'])
+        return self.submatrix(rows, rows)
+
+    def travel_minutes(self, distances_km: Optional[np.ndarray] = None, speed_kmh: float = CYCLING_SPEED_KMH,
+                       detour: float = DETOUR_FACTOR) -> np.ndarray:
+        """Temps de trajet estimé (minutes) : distance à vol d'oiseau × détour / vitesse"""
+        distances_km = self.condensed if distances_km is None else distances_km
+        return (distances_km * np.float32(detour * 60 / speed_kmh)).astype(np.float32)
+
+    def save(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Écriture atomique : un lecteur concurrent ne voit jamais de fichier partiel
+        temporary = f"{path}.tmp.npz"
+        np.savez(temporary, station_ids=self.station_ids.astype(str), latitudes=self.latitudes,
+                 longitudes=self.longitudes, condensed=self.condensed)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'DistanceMatrix':
+        with np.load(path) as data:
+            return cls(data['station_ids'].astype(object), data['latitudes'], data['longitudes'],
+                       data['condensed'])
+
+
+class DistanceCache:
+    """Matrice des distances du réseau, recalculée uniquement si des stations sont ajoutées ou déplacées"""
+
+    def __init__(self, cache_dir: Optional[str] = DISTANCE_CACHE_DIR):
+        # cache_dir=None : cache en mémoire uniquement
+        self.cache_dir = cache_dir
+        # Ordre d'utilisation : la moins récemment utilisée en tête
+        self._matrices: OrderedDict[str, DistanceMatrix] = OrderedDict()
+
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, f"{content_hash[:16]}.npz")
+
+    def get(self, df: pd.DataFrame) -> DistanceMatrix:
+        """Matrice de l'ensemble des stations du DataFrame (mémoire, puis disque, puis calcul)"""
+        stations = df[['id', 'latitude', 'longitude']].drop_duplicates('id').sort_values('id')
+        content_hash = station_set_hash(stations['id'], stations['latitude'].to_numpy(),
+                                        stations['longitude'].to_numpy())
+        if content_hash in self._matrices:
+            self._matrices.move_to_end(content_hash)
+            return self._matrices[content_hash]
+
+        matrix = None
+        path = self._path(content_hash) if self.cache_dir is not None else None
+        if path is not None and os.path.exists(path):
+            try:
+                matrix = DistanceMatrix.load(path)
+            except (OSError, ValueError, KeyError):
+                matrix = None
+            if matrix is not None and matrix.content_hash != content_hash:
+                matrix = None
+            if matrix is not None:
+                # Date de modification = dernière utilisation (éviction LRU sur disque)
+                os.utime(path)
+        if matrix is None:
+            matrix = DistanceMatrix.from_frame(stations)
+            if path is not None:
+                matrix.save(path)
+                self._evict_files()
+
+        self._matrices[content_hash] = matrix
+        while len(self._matrices) > MAX_CACHED_MATRICES:
+            self._matrices.popitem(last=False)
+        return matrix
+
+    def _evict_files(self):
+        """Supprime les matrices sur disque les moins récemment utilisées au-delà de MAX_CACHED_MATRICES"""
+        files = sorted(glob.glob(os.path.join(self.cache_dir, "*.npz")), key=os.path.getmtime, reverse=True)
+        for stale in files[MAX_CACHED_MATRICES:]:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+    def for_frame(self, df: pd.DataFrame) -> np.ndarray:
+        """Matrice carrée des distances (km, float32) dans l'ordre des lignes du DataFrame"""
+        return self.get(df).for_frame(df)
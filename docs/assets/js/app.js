@@ -26,19 +26,15 @@ function updateLastUpdate() {
 }
 
 /**
- * Charge les statistiques depuis l'API ou les fichiers locaux
+ * Charge le résumé précalculé de la page d'accueil (quelques centaines d'octets)
  */
 async function loadStatistics() {
     try {
-        // Tenter de charger depuis le fichier JSON local
-        const response = await fetch('data/velomagg_analysis_stats.json');
-        if (response.ok) {
-            const stats = await response.json();
-            updateStatsDisplay(stats);
-        } else {
-            // Fallback: charger directement depuis l'API
-            await loadFromAPI();
+        const response = await fetch('data/summary/overview.json');
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
         }
+        updateStatsDisplay(await response.json());
     } catch (error) {
         console.warn('Erreur lors du chargement des statistiques:', error);
         // Afficher des valeurs par défaut
@@ -46,53 +42,15 @@ async function loadStatistics() {
     }
 }
 
-/**
- * Charge les données directement depuis l'API VéloMAG
- */
-async function loadFromAPI() {
-    try {
-        const response = await fetch('https://portail-api-data.montpellier3m.fr/bikestation');
-        if (response.ok) {
-            const stations = await response.json();
-            const stats = calculateStats(stations);
-            updateStatsDisplay(stats);
-        }
-    } catch (error) {
-        console.warn('Erreur API:', error);
-        setDefaultStats();
-    }
-}
-
-/**
- * Calcule les statistiques à partir des données des stations
- */
-function calculateStats(stations) {
-    const totalStations = stations.length;
-    const totalBikes = stations.reduce((sum, station) =>
-        sum + (station.availableBikeNumber?.value || 0), 0);
-    const totalSlots = stations.reduce((sum, station) =>
-        sum + (station.totalSlotNumber?.value || 0), 0);
-    const occupationRate = totalSlots > 0 ? (totalBikes / totalSlots * 100) : 0;
-
-    return {
-        general: {
-            total_stations: totalStations,
-            total_bikes: totalBikes,
-            total_capacity: totalSlots,
-            average_occupancy: occupationRate / 100
-        }
-    };
-}
-
 /**
  * Met à jour l'affichage des statistiques
  */
-function updateStatsDisplay(stats) {
-    if (stats && stats.general) {
+function updateStatsDisplay(overview) {
+    if (overview) {
         const elements = {
-            'total-stations': stats.general.total_stations,
-            'total-bikes': stats.general.total_bikes,
-            'occupation-rate': (stats.general.average_occupancy * 100).toFixed(1) + '%'
+            'total-stations': overview.total_stations,
+            'total-bikes': overview.total_bikes,
+            'occupation-rate': (overview.average_occupancy * 100).toFixed(1) + '%'
         };
 
         Object.entries(elements).forEach(([id, value]) => {
@@ -116,14 +74,11 @@ function updateStatsDisplay(stats) {
  * Définit des statistiques par défaut
  */
 function setDefaultStats() {
-    const defaultStats = {
-        general: {
-            total_stations: 20,
-            total_bikes: 113,
-            average_occupancy: 0.426
-        }
-    };
-    updateStatsDisplay(defaultStats);
+    updateStatsDisplay({
+        total_stations: 20,
+        total_bikes: 113,
+        average_occupancy: 0.426
+    });
 }
 
 /**
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Collecte multi-réseaux : adaptateurs de flux (API NGSI de Montpellier, GBFS) et interrogation concurrente
+Tous les réseaux sont normalisés vers le schéma du DataFrame d'état et partagent le même registre
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import urllib.parse
+import aiohttp
+import numpy as np
+import pandas as pd
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+from collector import StationCollector
+from history_store import HistoryFile
+from main import REGISTRY_PATH, VelomaggAnalyzer
+from profiling import run_cli
+from schema import enforce_schema
+from validation import FLAT_LAYOUT, NGSI_LAYOUT, RecordLayout
+
+GBFS_FEEDS = ('station_information', 'station_status')
+# Indicateurs GBFS d'une station ouverte (absents = vrais)
+GBFS_OPEN_FLAGS = ('is_installed', 'is_renting', 'is_returning')
+FETCH_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, OSError, ValueError, KeyError, TypeError)
+
+
+def is_local(location: str) -> bool:
+    return not location.startswith(('http://', 'https://'))
+
+
+def local_path(location: str) -> str:
+    return location[len('file://'):] if location.startswith('file://') else location
+
+
+def join_location(base: str, location: str) -> str:
+    """Résout une URL de flux relative au document qui la référence (HTTP ou fichier local)"""
+    if not is_local(base):
+        return urllib.parse.urljoin(base, location)
+    if not is_local(location) or location.startswith('file://') or os.path.isabs(location):
+        return location
+    return os.path.join(os.path.dirname(local_path(base)), location)
+
+
+def _read_json(path: str) -> Any:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def localized_text(value: Any, language: Optional[str] = None) -> Any:
+    """Texte d'un champ GBFS 3 traduit ([{text, language}]) ; les chaînes simples sont rendues telles quelles"""
+    if not isinstance(value, list) or not value:
+        return value
+    for translation in value:
+        if isinstance(translation, dict) and translation.get('language') == language:
+            return translation.get('text')
+    return value[0].get('text') if isinstance(value[0], dict) else None
+
+
+def format_epoch(value: Any) -> Optional[str]:
+    """last_reported GBFS (epoch en GBFS 1-2, ISO en GBFS 3) -> horodatage au format de l'API"""
+    if type(value) in (int, float):
+        return time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(value))
+    return value if isinstance(value, str) else None
+
+
+def discover_feeds(discovery: Dict[str, Any], base: str, language: Optional[str] = None) -> Dict[str, str]:
+    """URLs des flux station_information et station_status annoncées par un gbfs.json (GBFS 2 ou 3)"""
+    data = discovery.get('data', {})
+    if 'feeds' in data:
+        feeds = data['feeds']
+    else:
+        # GBFS 1-2 : un jeu de flux par langue
+        language = language if language in data else next(iter(data), None)
+        feeds = data[language]['feeds'] if language is not None else []
+    urls = {feed['name']: join_location(base, feed['url']) for feed in feeds}
+    missing = [name for name in GBFS_FEEDS if name not in urls]
+    if missing:
+        raise ValueError(f"Flux GBFS absents de {base}: {', '.join(missing)}")
+    return {name: urls[name] for name in GBFS_FEEDS}
+
+
+class FeedAdapter(ABC):
+    """Source d'état des stations d'un réseau ; fetch() retourne les enregistrements au format de self.layout"""
+
+    layout: RecordLayout = FLAT_LAYOUT
+
+    def __init__(self, system: str):
+        self.system = system
+        self.failures = 0
+        # Dernier document et validateurs (ETag/Last-Modified ou date de modification) par emplacement
+        self._documents: Dict[str, Any] = {}
+        self._validators: Dict[str, Any] = {}
+
+    async def load(self, session: aiohttp.ClientSession, location: str) -> Tuple[Any, bool]:
+        """Document JSON (URL ou fichier local) et indicateur de modification depuis le dernier appel"""
+        if is_local(location):
+            path = local_path(location)
+            modified = os.stat(path).st_mtime_ns
+            if location in self._documents and self._validators.get(location) == modified:
+                return self._documents[location], False
+            data = await asyncio.to_thread(_read_json, path)
+            self._validators[location] = modified
+        else:
+            headers = {}
+            etag, last_modified = self._validators.get(location, (None, None))
+            if location in self._documents:
+                if etag:
+                    headers['If-None-Match'] = etag
+                if last_modified:
+                    headers['If-Modified-Since'] = last_modified
+            async with session.get(location, headers=headers) as response:
+                if response.status == 304:
+                    return self._documents[location], False
+                response.raise_for_status()
+                data = await response.json(content_type=None)
+                self._validators[location] = (response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        self._documents[location] = data
+        return data, True
+
+    @abstractmethod
+    async def fetch(self, session: aiohttp.ClientSession) -> Optional[List[Dict[str, Any]]]:
+        """Enregistrements de toutes les stations (None si rien n'a changé depuis le dernier appel)"""
+
+
+class MontpellierNgsiFeed(FeedAdapter):
+    """API NGSI de Montpellier Méditerranée Métropole (mêmes point d'accès et format que VelomaggAnalyzer)"""
+
+    layout = NGSI_LAYOUT
+
+    def __init__(self, system: str = 'montpellier', url: Optional[str] = None):
+        super().__init__(system)
+        # Identifiants NGSI conservés tels quels : registres et historiques existants restent valides
+        self.url = url or f"{VelomaggAnalyzer.BASE_URL}{VelomaggAnalyzer.STATIONS_ENDPOINT}"
+
+    async def fetch(self, session: aiohttp.ClientSession) -> Optional[List[Dict[str, Any]]]:
+        stations, changed = await self.load(session, self.url)
+        return stations if changed else None
+
+
+class GbfsFeed(FeedAdapter):
+    """Réseau publiant un flux GBFS (gbfs.json ou répertoire contenant station_information/station_status)"""
+
+    def __init__(self, system: str, url: str, language: Optional[str] = None, locality: Optional[str] = None):
+        super().__init__(system)
+        self.url = url
+        self.language = language
+        # GBFS ne décrit pas la commune : le nom du réseau en tient lieu par défaut
+        self.locality = locality or system
+        self._feed_urls: Optional[Dict[str, str]] = None
+
+    async def feed_urls(self, session: aiohttp.ClientSession) -> Dict[str, str]:
+        if self._feed_urls is None:
+            if self.url.endswith('.json'):
+                discovery, _ = await self.load(session, self.url)
+                self._feed_urls = discover_feeds(discovery, self.url, self.language)
+            else:
+                base = self.url.rstrip('/') + '/'
+                self._feed_urls = {name: join_location(base, f"{name}.json") for name in GBFS_FEEDS}
+        return self._feed_urls
+
+    async def fetch(self, session: aiohttp.ClientSession) -> Optional[List[Dict[str, Any]]]:
+        urls = await self.feed_urls(session)
+        (information, information_changed), (status, status_changed) = await asyncio.gather(
+            self.load(session, urls['station_information']), self.load(session, urls['station_status']))
+        if not (information_changed or status_changed):
+            return None
+        return self.normalize(information, status)
+
+    def normalize(self, information: Dict[str, Any], status: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Jointure station_information × station_status en enregistrements plats (une clé par colonne)
+
+        Les champs absents restent à None : la validation met la station en quarantaine avec son motif.
+        """
+        descriptions = {station.get('station_id'): station for station in information['data']['stations']}
+        records = []
+        for state in status['data']['stations']:
+            station = descriptions.get(state.get('station_id'), {})
+            # GBFS 3 : num_vehicles_available (num_bikes_available en GBFS 1-2)
+            bikes = state.get('num_bikes_available', state.get('num_vehicles_available'))
+            docks = state.get('num_docks_available')
+            capacity = station.get('capacity')
+            if capacity is None and type(bikes) is int and type(docks) is int:
+                capacity = bikes + docks
+            is_open = all(state.get(flag, True) for flag in GBFS_OPEN_FLAGS)
+            records.append({
+                # Identifiant préfixé par le réseau : unique dans le registre partagé
+                'id': f"{self.system}:{state.get('station_id')}",
+                'address': station.get('address') or localized_text(station.get('name'), self.language),
+                'locality': self.locality,
+                'available_bikes': bikes,
+                'free_slots': docks,
+                'total_slots': capacity,
+                'status': 'working' if is_open else 'closed',
+                'latitude': station.get('lat'),
+                'longitude': station.get('lon'),
+                'last_update': format_epoch(state.get('last_reported'))
+            })
+        return records
+
+
+class MultiSystemCollector(StationCollector):
+    """Interroge plusieurs réseaux en parallèle ; les abonnés reçoivent les changements de tous les réseaux"""
+
+    def __init__(self, feeds: List[FeedAdapter], analyzer: Optional[VelomaggAnalyzer] = None,
+                 interval: float = 60, timeout: float = 30):
+        systems = [feed.system for feed in feeds]
+        if len(set(systems)) != len(systems):
+            raise ValueError(f"Noms de réseaux en double: {systems}")
+        # L'analyseur fournit le registre partagé, la validation et la construction du DataFrame d'état
+        super().__init__(analyzer or VelomaggAnalyzer(), interval)
+        self.feeds = list(feeds)
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._signatures: Dict[str, Dict[str, tuple]] = {system: {} for system in systems}
+
+    async def _fetch(self, feed: FeedAdapter, session: aiohttp.ClientSession) -> Optional[List[Dict[str, Any]]]:
+        try:
+            return await feed.fetch(session)
+        except FETCH_ERRORS as e:
+            # Un réseau indisponible n'interrompt pas la collecte des autres
+            feed.failures += 1
+            print(f"❌ Réseau {feed.system} indisponible: {e}")
+            return None
+
+    def changed_records(self, feed: FeedAdapter,
+                        records: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Enregistrements modifiés depuis la dernière interrogation de ce réseau et identifiants disparus"""
+        previous = self._signatures[feed.system]
+        signatures = {}
+        changed = []
+        for record in records:
+            station_id = feed.layout.station_id(record)
+            if not isinstance(station_id, str):
+                # Transmis tel quel : la validation le met en quarantaine
+                changed.append(record)
+                continue
+            signature = feed.layout.signature(record)
+            signatures[station_id] = signature
+            if station_id not in previous or previous[station_id] != signature:
+                changed.append(record)
+        self._signatures[feed.system] = signatures
+        removed = [station_id for station_id in previous if station_id not in signatures]
+        return changed, removed
+
+    async def poll(self) -> Tuple[pd.DataFrame, List[str]]:
+        """Interroge tous les réseaux simultanément et normalise leurs stations modifiées"""
+        async with aiohttp.ClientSession(timeout=self.timeout) as session:
+            results = await asyncio.gather(*(self._fetch(feed, session) for feed in self.feeds))
+
+        frames = []
+        removed = []
+        for feed, records in zip(self.feeds, results):
+            if records is None:
+                continue
+            changed, feed_removed = self.changed_records(feed, records)
+            removed.extend(feed_removed)
+            if not changed:
+                continue
+            frame = self.analyzer.build_status_frame(changed, feed.layout)
+            if not frame.empty:
+                frame.insert(1, 'system', feed.system)
+                frames.append(frame)
+        if not frames:
+            return pd.DataFrame(), removed
+        # Catégories de chaque réseau réunies
+        return enforce_schema(pd.concat(frames, ignore_index=True)), removed
+
+    def fetch_changes(self) -> Tuple[pd.DataFrame, List[str]]:
+        return asyncio.run(self.poll())
+
+
+def system_summary(snapshot: pd.DataFrame) -> pd.DataFrame:
+    """Indicateurs comparés des réseaux (stations, vélos, capacité, occupation, stations vides/pleines)"""
+    grouped = snapshot.groupby('system', observed=True)
+    summary = grouped.agg(stations=('station_key', 'size'), bikes=('available_bikes', 'sum'),
+                          capacity=('total_slots', 'sum'))
+    summary['occupancy'] = np.divide(summary['bikes'], summary['capacity'],
+                                     out=np.zeros(len(summary)), where=summary['capacity'] > 0)
+    summary['empty_share'] = grouped['available_bikes'].apply(lambda values: (values == 0).mean())
+    summary['full_share'] = grouped['free_slots'].apply(lambda values: (values == 0).mean())
+    return summary
+
+
+def parse_feed_option(option: str) -> GbfsFeed:
+    """--gbfs NOM=URL (gbfs.json ou répertoire, URL ou chemin local)"""
+    system, separator, url = option.partition('=')
+    if not separator or not system or not url:
+        raise argparse.ArgumentTypeError(f"Format attendu NOM=URL: {option}")
+    return GbfsFeed(system, url)
+
+
+def main_feeds():
+    """Fonction principale de la collecte multi-réseaux"""
+    parser = argparse.ArgumentParser(description="Collecte simultanée de plusieurs réseaux de vélos en libre-service")
+    parser.add_argument('--gbfs', type=parse_feed_option, action='append', default=[], metavar='NOM=URL',
+                        help="Réseau GBFS (gbfs.json ou répertoire, URL ou chemin local ; répétable)")
+    parser.add_argument('--ngsi', metavar='URL', help="Point d'accès NGSI de Montpellier (URL ou fichier local)")
+    parser.add_argument('--no-montpellier', action='store_true', help="Ne pas interroger Vélomagg")
+    parser.add_argument('--interval', type=float, default=60, help="Intervalle d'interrogation (secondes)")
+    parser.add_argument('--ticks', type=int, help="Nombre d'interrogations (défaut: jusqu'à Ctrl+C)")
+    parser.add_argument('--history', help="Fichier d'historique partagé par tous les réseaux (HistoryFile)")
+    parser.add_argument('--capacity', type=int, default=4096, help="Nombre maximal de stations de l'historique")
+    args = parser.parse_args()
+
+    feeds: List[FeedAdapter] = [] if args.no_montpellier else [MontpellierNgsiFeed(url=args.ngsi)]
+    feeds.extend(args.gbfs)
+    if not feeds:
+        parser.error("aucun réseau à interroger")
+
+    registry_path = REGISTRY_PATH
+    if args.history:
+        # Les clés du registre indexent les colonnes de l'historique : il est conservé à côté
+        registry_path = f"{os.path.splitext(args.history)[0]}_registry.json"
+    analyzer = VelomaggAnalyzer(registry_path)
+    collector = MultiSystemCollector(feeds, analyzer, interval=args.interval)
+
+    if args.history:
+        if os.path.exists(args.history):
+            history = HistoryFile(args.history, writable=True)
+        else:
+            history = HistoryFile.create(args.history, datetime.now(), step_seconds=max(1, int(args.interval)),
+                                         capacity=args.capacity)
+        collector.subscribe(history.record)
+        collector.subscribe(lambda changed, snapshot, timestamp: analyzer.save_registry())
+
+    print(f"🌍 Réseaux: {', '.join(feed.system for feed in feeds)}")
+    collector.run(args.ticks)
+
+    if collector.snapshot is not None:
+        print("\n📊 Comparaison des réseaux:")
+        for row in system_summary(collector.snapshot).itertuples():
+            print(f"   {row.Index:<15} {row.stations:5d} stations  {row.bikes:6d} vélos  "
+                  f"occupation {row.occupancy:.1%}  vides {row.empty_share:.1%}  pleines {row.full_share:.1%}")
+    print(f"🧪 Validation: {analyzer.validation.quarantined} station(s) en quarantaine "
+          f"sur {analyzer.validation.checked}")
+
+
+if __name__ == "__main__":
+    run_cli(main_feeds)
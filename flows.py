@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Inférence des flux de vélos à partir des variations de disponibilité
+Départs/arrivées par station et détection des rééquilibrages opérateur, sur toute la matrice
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+from history import StationHistory
+from registry import StationRegistry
+from timestamps import hour_of_day
+
+
+class TripFlows:
+    """Départs, arrivées et rééquilibrages inférés (stations × pas de temps)"""
+
+    def __init__(self, history: StationHistory, departures: np.ndarray, arrivals: np.ndarray,
+                 rebalancing: np.ndarray, rebalanced_bikes: np.ndarray):
+        self.station_keys = history.station_keys
+        # Chaque variation est datée par la fin de l'intervalle
+        self.timestamps = history.timestamps[1:]
+        self.departures = departures
+        self.arrivals = arrivals
+        self.rebalancing = rebalancing
+        self.rebalanced_bikes = rebalanced_bikes
+
+    @property
+    def hours(self) -> np.ndarray:
+        return hour_of_day(self.timestamps.view(np.int64))
+
+    def hourly(self) -> pd.DataFrame:
+        """Flux du réseau agrégés par heure de la journée"""
+        hours = self.hours
+        return pd.DataFrame({
+            'hour': np.arange(24),
+            'departures': np.bincount(hours, weights=self.departures.sum(axis=0), minlength=24),
+            'arrivals': np.bincount(hours, weights=self.arrivals.sum(axis=0), minlength=24),
+            'rebalancing_moves': np.bincount(hours, weights=self.rebalancing.sum(axis=0), minlength=24)
+        })
+
+    def station_hourly(self) -> np.ndarray:
+        """Départs par station et par heure (stations × 24)"""
+        order = np.argsort(self.hours, kind='stable')
+        sorted_hours = self.hours[order]
+        starts = np.flatnonzero(np.r_[True, np.diff(sorted_hours) != 0])
+        result = np.zeros((len(self.station_keys), 24))
+        if len(order):
+            result[:, sorted_hours[starts]] = np.add.reduceat(self.departures[:, order], starts, axis=1)
+        return result
+
+    def by_station(self) -> pd.DataFrame:
+        """Totaux par station"""
+        departures = self.departures.sum(axis=1)
+        arrivals = self.arrivals.sum(axis=1)
+        return pd.DataFrame({
+            'station_key': self.station_keys,
+            'departures': departures,
+            'arrivals': arrivals,
+            'net_flow': arrivals - departures,
+            'rebalancing_moves': self.rebalancing.sum(axis=1),
+            'rebalanced_bikes': self.rebalanced_bikes.sum(axis=1)
+        })
+
+    def by_area(self, registry: StationRegistry) -> pd.DataFrame:
+        """Totaux par commune (addressLocality du registre)"""
+        localities = np.array([registry.localities[key] for key in self.station_keys], dtype=object)
+        areas, codes = np.unique(localities, return_inverse=True)
+        departures = np.bincount(codes, weights=self.departures.sum(axis=1), minlength=len(areas))
+        arrivals = np.bincount(codes, weights=self.arrivals.sum(axis=1), minlength=len(areas))
+        return pd.DataFrame({
+            'locality': areas,
+            'stations': np.bincount(codes, minlength=len(areas)),
+            'departures': departures,
+            'arrivals': arrivals,
+            'net_flow': arrivals - departures,
+            'rebalanced_bikes': np.bincount(codes, weights=self.rebalanced_bikes.sum(axis=1), minlength=len(areas))
+        })
+
+
+def infer_trip_flows(history: StationHistory, rebalancing_threshold: int = 5,
+                     window_steps: int = 1) -> TripFlows:
+    """Calcule les flux à partir des différences successives de vélos disponibles
+
+    Une variation d'au moins `rebalancing_threshold` vélos en un pas est attribuée à
+    l'opérateur si une variation de sens opposé, aussi importante, a lieu ailleurs sur le
+    réseau dans la fenêtre de ±`window_steps` pas (camion qui retire puis dépose).
+    """
+    delta = np.diff(history.values, axis=1)
+    delta = np.where(np.isnan(delta), 0, delta)
+
+    large_drop = delta <= -rebalancing_threshold
+    large_rise = delta >= rebalancing_threshold
+
+    # Présence d'une forte variation de sens opposé dans la fenêtre temporelle (tout le réseau)
+    def network_window(mask: np.ndarray) -> np.ndarray:
+        any_step = mask.any(axis=0).astype(np.int64)
+        cumulative = np.concatenate([[0], np.cumsum(any_step)])
+        n = len(any_step)
+        lower = np.clip(np.arange(n) - window_steps, 0, n)
+        upper = np.clip(np.arange(n) + window_steps + 1, 0, n)
+        return (cumulative[upper] - cumulative[lower]) > 0
+
+    rebalancing = (large_drop & network_window(large_rise)[None, :]) | \
+                  (large_rise & network_window(large_drop)[None, :])
+
+    flows = np.where(rebalancing, 0, delta)
+    departures = np.clip(-flows, 0, None)
+    arrivals = np.clip(flows, 0, None)
+    rebalanced_bikes = np.where(rebalancing, np.abs(delta), 0)
+
+    return TripFlows(history, departures, arrivals, rebalancing, rebalanced_bikes)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Prévision à court terme de la disponibilité des vélos
+Un modèle saisonnier (profil hebdomadaire + AR(1) sur l'écart) ajusté pour toutes les stations à la fois
+"""
+
+import pandas as pd
+import numpy as np
+from datetime import timedelta
+from typing import Dict, List, Any, Optional
+
+from history import StationHistory
+
+WEEK_MINUTES = 7 * 24 * 60
+
+
+class AvailabilityForecaster:
+    """Prévision vectorisée des vélos disponibles à 15/30/60 minutes"""
+
+    HORIZONS = (15, 30, 60)
+
+    def __init__(self, season_minutes: int = WEEK_MINUTES,
+                 refit_interval: timedelta = timedelta(hours=6)):
+        self.season_minutes = season_minutes
+        self.refit_interval = np.timedelta64(int(refit_interval.total_seconds()), 's')
+        self.params = None
+
+    def _slots(self, timestamps: np.ndarray, step_minutes: int) -> np.ndarray:
+        """Position de chaque instant dans la saison (créneau de la semaine)"""
+        step_seconds = step_minutes * 60
+        epoch = np.asarray(timestamps, dtype='datetime64[s]').astype(np.int64)
+        return (epoch // step_seconds) % (self.season_minutes // step_minutes)
+
+    def needs_refit(self, now: Optional[np.datetime64] = None) -> bool:
+        """Indique si les paramètres doivent être réajustés"""
+        if self.params is None:
+            return True
+        now = np.datetime64('now', 's') if now is None else np.datetime64(now, 's')
+        return now - self.params['fitted_at'] >= self.refit_interval
+
+    def fit(self, history: StationHistory, now: Optional[np.datetime64] = None) -> Dict[str, Any]:
+        """Ajuste le profil saisonnier et le coefficient AR(1) de chaque station"""
+        if history.n_steps == 0:
+            # API muette : les paramètres précédents (éventuellement aucun) sont conservés
+            print("⚠️ Historique vide : modèle de prévision non réajusté")
+            return self.params
+        step = history.step_minutes
+        n_slots = self.season_minutes // step
+        values = history.values.astype(np.float64)
+        observed = ~np.isnan(values)
+        filled = np.where(observed, values, 0.0)
+
+        # Profil saisonnier : moyenne par créneau, regroupée par tri + reduceat
+        slots = self._slots(history.timestamps, step)
+        order = np.argsort(slots, kind='stable')
+        sorted_slots = slots[order]
+        starts = np.flatnonzero(np.r_[True, np.diff(sorted_slots) != 0])
+        sums = np.add.reduceat(filled[:, order], starts, axis=1)
+        counts = np.add.reduceat(observed[:, order].astype(np.int64), starts, axis=1)
+
+        # Stations sans aucune mesure : pas de prévision (NaN)
+        n_observed = observed.sum(axis=1)
+        station_mean = np.where(n_observed > 0, filled.sum(axis=1) / np.maximum(n_observed, 1), np.nan)
+        profile = np.repeat(station_mean[:, None], n_slots, axis=1)
+        seen = sorted_slots[starts]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            slot_means = sums / counts
+        profile[:, seen] = np.where(counts > 0, slot_means, profile[:, seen])
+
+        # Coefficient AR(1) sur les résidus, estimé par moindres carrés pour chaque station
+        residuals = np.where(observed, values - profile[:, slots], 0.0)
+        pair_ok = observed[:, 1:] & observed[:, :-1]
+        numerator = (residuals[:, 1:] * residuals[:, :-1] * pair_ok).sum(axis=1)
+        denominator = (residuals[:, :-1] ** 2 * pair_ok).sum(axis=1)
+        phi = np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+        capacities = history.capacities
+        if capacities is None:
+            capacities = np.nanmax(np.where(observed, values, np.nan), axis=1)
+
+        self.params = {
+            'station_keys': history.station_keys.copy(),
+            'step_minutes': step,
+            'profile': profile.astype(np.float32),
+            'phi': np.clip(phi, 0.0, 0.999).astype(np.float32),
+            'capacities': np.nan_to_num(capacities, nan=np.inf).astype(np.float32),
+            'fitted_at': np.datetime64('now', 's') if now is None else np.datetime64(now, 's')
+        }
+        self._build_index()
+        return self.params
+
+    def _build_index(self):
+        """Table clé de station -> ligne des paramètres"""
+        keys = self.params['station_keys']
+        self._rows = np.full(int(keys.max(initial=-1)) + 1, -1, dtype=np.int64)
+        self._rows[keys] = np.arange(len(keys))
+
+    def ensure_fitted(self, history: StationHistory, now: Optional[np.datetime64] = None) -> bool:
+        """Réajuste le modèle uniquement si le calendrier l'exige"""
+        if self.needs_refit(now):
+            self.fit(history, now)
+            return True
+        return False
+
+    def predict(self, current: np.ndarray, now: Optional[np.datetime64] = None,
+                horizons: Optional[List[int]] = None) -> Dict[int, np.ndarray]:
+        """Prévoit les vélos disponibles pour chaque horizon (minutes), stations dans l'ordre du modèle"""
+        if self.params is None:
+            raise RuntimeError("Le modèle de prévision n'a pas été ajusté")
+
+        now = np.datetime64('now', 's') if now is None else np.datetime64(now, 's')
+        horizons = horizons or list(self.HORIZONS)
+        step = self.params['step_minutes']
+        profile = self.params['profile']
+        n_slots = profile.shape[1]
+
+        slot_now = int(self._slots(np.array([now]), step)[0])
+        deviation = np.asarray(current, dtype=np.float32) - profile[:, slot_now]
+
+        forecasts = {}
+        for horizon in horizons:
+            steps = max(1, int(round(horizon / step)))
+            expected = profile[:, (slot_now + steps) % n_slots] + self.params['phi'] ** steps * deviation
+            forecasts[horizon] = np.clip(expected, 0, self.params['capacities'])
+        return forecasts
+
+    def forecast_frame(self, df: pd.DataFrame, now: Optional[np.datetime64] = None,
+                       horizons: Optional[List[int]] = None) -> pd.DataFrame:
+        """Ajoute les colonnes forecast_<h>min au snapshot courant (NaN si aucun modèle n'a pu être ajusté)"""
+        if self.params is None:
+            result = df[['station_key', 'id', 'address', 'available_bikes']].copy()
+            for horizon in horizons or self.HORIZONS:
+                result[f'forecast_{horizon}min'] = np.full(len(df), np.nan, dtype=np.float32)
+            return result
+        keys = df['station_key'].to_numpy(dtype=np.int64)
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        in_range = (keys >= 0) & (keys < len(self._rows))
+        rows[in_range] = self._rows[keys[in_range]]
+        known = rows >= 0
+        rows = rows[known]
+
+        current = np.full(len(self.params['station_keys']), np.nan, dtype=np.float32)
+        current[rows] = df['available_bikes'].to_numpy()[known]
+        forecasts = self.predict(current, now, horizons)
+
+        result = df[['station_key', 'id', 'address', 'available_bikes']].copy()
+        for horizon, values in forecasts.items():
+            column = np.full(len(df), np.nan, dtype=np.float32)
+            column[known] = values[rows]
+            result[f'forecast_{horizon}min'] = column
+        return result
+
+    def save(self, path: str):
+        """Sauvegarde les paramètres ajustés"""
+        np.savez_compressed(path, **{key: np.asarray(value) for key, value in self.params.items()})
+
+    def load(self, path: str):
+        """Recharge des paramètres ajustés"""
+        with np.load(path, allow_pickle=False) as data:
+            self.params = {key: data[key] for key in data.files}
+        self.params['step_minutes'] = int(self.params['step_minutes'])
+        self._build_index()
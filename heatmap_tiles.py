@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Agrégation spatiale des métriques de stations sur des grilles carrées multi-niveaux
+Couches de heatmap légères précalculées pour la carte interactive
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+from history import StationHistory
+from registry import StationRegistry
+from flows import TripFlows
+
+# Niveau de zoom de la carte -> taille de cellule en mètres
+ZOOM_CELL_METERS = {12: 1000, 14: 400, 16: 150}
+METERS_PER_DEGREE = 111320
+HEAT_METRICS = ('mean_occupancy', 'empty_share', 'flows')
+# Métriques additives (sommées par cellule), les autres sont moyennées
+SUMMED_METRICS = ('flows',)
+HEAT_METRIC_LABELS = {
+    'mean_occupancy': "Occupation moyenne",
+    'empty_share': "Part du temps à vide",
+    'flows': "Flux (départs + arrivées)"
+}
+
+
+def station_metrics(history: StationHistory, registry: StationRegistry,
+                    flows: Optional[TripFlows] = None) -> pd.DataFrame:
+    """Métriques historiques par station : occupation moyenne, part du temps à vide, flux"""
+    keys = history.station_keys
+    capacities = registry.capacities[keys].astype(np.float32)
+    values = history.values
+    observed = ~np.isnan(values)
+    # Stations jamais observées : NaN, ignorées lors de l'agrégation
+    n_observed = np.where(observed.any(axis=1), observed.sum(axis=1), np.nan)
+
+    # Capacité nulle : occupation inconnue (NaN) plutôt qu'infinie, comme une station non observée
+    with np.errstate(invalid='ignore', divide='ignore'):
+        occupancy = np.where(capacities > 0, np.where(observed, values, 0).sum(axis=1) / n_observed / capacities,
+                             np.nan)
+
+    metrics = pd.DataFrame({
+        'station_key': keys,
+        'latitude': registry.latitudes[keys],
+        'longitude': registry.longitudes[keys],
+        'mean_occupancy': occupancy,
+        'empty_share': (observed & (values == 0)).sum(axis=1) / n_observed
+    })
+    if flows is not None:
+        metrics['flows'] = flows.departures.sum(axis=1) + flows.arrivals.sum(axis=1)
+    return metrics
+
+
+def snapshot_metrics(df: pd.DataFrame) -> pd.DataFrame:
+    """Mêmes métriques à partir d'un seul snapshot (format analyze_current_status)"""
+    return pd.DataFrame({
+        'station_key': df['station_key'],
+        'latitude': df['latitude'],
+        'longitude': df['longitude'],
+        'mean_occupancy': df['occupancy_rate'],
+        'empty_share': (df['available_bikes'] == 0).astype(np.float64)
+    })
+
+
+def aggregate_grid(metrics: pd.DataFrame, cell_meters: float,
+                   columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Regroupe les stations par cellule carrée (vectorisé) : moyenne des taux, somme des flux"""
+    columns = [column for column in (columns or HEAT_METRICS) if column in metrics]
+    metrics = metrics.dropna(subset=['latitude', 'longitude'])
+    latitude = metrics['latitude'].to_numpy(dtype=np.float64)
+    longitude = metrics['longitude'].to_numpy(dtype=np.float64)
+
+    # Cellules d'environ cell_meters de côté à la latitude moyenne du réseau
+    cell_lat = cell_meters / METERS_PER_DEGREE
+    cell_lon = cell_lat / np.cos(np.radians(latitude.mean() if len(latitude) else 0))
+    cells = np.stack([np.floor(latitude / cell_lat), np.floor(longitude / cell_lon)], axis=1).astype(np.int64)
+    unique_cells, codes = np.unique(cells, axis=0, return_inverse=True)
+    codes = codes.ravel()
+    counts = np.bincount(codes, minlength=len(unique_cells))
+
+    grid = pd.DataFrame({
+        'latitude': (unique_cells[:, 0] + 0.5) * cell_lat,
+        'longitude': (unique_cells[:, 1] + 0.5) * cell_lon,
+        'stations': counts
+    })
+    for column in columns:
+        values = metrics[column].to_numpy(dtype=np.float64)
+        valid = np.isfinite(values)
+        sums = np.bincount(codes[valid], weights=values[valid], minlength=len(unique_cells))
+        if column in SUMMED_METRICS:
+            grid[column] = sums
+            continue
+        valid_counts = np.bincount(codes[valid], minlength=len(unique_cells))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            grid[column] = sums / valid_counts
+    return grid
+
+
+def build_heat_layers(metrics: pd.DataFrame,
+                      zoom_cells: Dict[int, float] = ZOOM_CELL_METERS) -> Dict[int, pd.DataFrame]:
+    """Une grille agrégée par niveau de zoom"""
+    return {zoom: aggregate_grid(metrics, cell_meters) for zoom, cell_meters in zoom_cells.items()}
+
+
+def layer_points(grid: pd.DataFrame, metric: str) -> List[List[float]]:
+    """Points [lat, lon, poids] d'une couche, poids normalisé entre 0 et 1"""
+    values = grid[metric].to_numpy(dtype=np.float64)
+    valid = np.isfinite(values)
+    peak = values[valid].max() if valid.any() else 0
+    weights = values / peak if peak > 0 else values
+    return np.column_stack([grid['latitude'].to_numpy()[valid].round(5),
+                            grid['longitude'].to_numpy()[valid].round(5),
+                            weights[valid].round(3)]).tolist()
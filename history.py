@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Historique des stations Vélomagg sous forme de matrice station × temps
+Base commune des analyses temporelles vectorisées
+"""
+
+import pandas as pd
+import numpy as np
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+
+from timestamps import MISSING_EPOCH, decode_timestamps, to_datetime64
+
+
+class StationHistory:
+    """Historique échantillonné sur une grille temporelle régulière (stations × pas de temps)"""
+
+    def __init__(self, station_keys: np.ndarray, timestamps: np.ndarray, values: np.ndarray,
+                 step_minutes: int = 15, capacities: Optional[np.ndarray] = None):
+        # Clés entières du registre des stations (une par ligne de la matrice)
+        self.station_keys = np.asarray(station_keys, dtype=np.int32)
+        self.timestamps = np.asarray(timestamps, dtype='datetime64[s]')
+        # Valeurs manquantes = NaN
+        self.values = np.asarray(values, dtype=np.float32)
+        self.step_minutes = step_minutes
+        self.capacities = None if capacities is None else np.asarray(capacities, dtype=np.float32)
+
+    @property
+    def epochs(self) -> np.ndarray:
+        """Instants de la grille en secondes epoch UTC (vue int64, sans copie)"""
+        return self.timestamps.view(np.int64)
+
+    @property
+    def n_stations(self) -> int:
+        return self.values.shape[0]
+
+    @property
+    def n_steps(self) -> int:
+        return self.values.shape[1]
+
+    def rows_for(self, station_keys: np.ndarray) -> np.ndarray:
+        """Lignes de la matrice correspondant à des clés de station (-1 si absente)"""
+        station_keys = np.asarray(station_keys, dtype=np.int64)
+        lookup = np.full(max(int(self.station_keys.max(initial=-1)), int(station_keys.max(initial=-1))) + 1,
+                         -1, dtype=np.int64)
+        lookup[self.station_keys] = np.arange(self.n_stations)
+        return np.where(station_keys >= 0, lookup[np.maximum(station_keys, 0)], -1)
+
+    @classmethod
+    def from_timeseries(cls, series: Dict[int, Dict[str, Any]], step_minutes: int = 15,
+                        start: Optional[datetime] = None, end: Optional[datetime] = None,
+                        capacities: Optional[Dict[int, int]] = None) -> 'StationHistory':
+        """Construit la matrice à partir des réponses de /bikestation_timeseries (clé de station -> réponse)"""
+        parsed = {}
+        for station_key, data in series.items():
+            parsed[station_key] = None
+            if data and data.get('index'):
+                epochs = decode_timestamps(data['index'])
+                valid = epochs != MISSING_EPOCH
+                parsed[station_key] = (epochs[valid], np.asarray(data['values'], dtype=np.float32)[valid])
+        return cls.from_arrays(parsed, step_minutes, start, end, capacities)
+
+    @classmethod
+    def from_arrays(cls, series: Dict[int, Optional[Tuple[np.ndarray, np.ndarray]]], step_minutes: int = 15,
+                    start: Optional[datetime] = None, end: Optional[datetime] = None,
+                    capacities: Optional[Dict[int, int]] = None) -> 'StationHistory':
+        """Construit la matrice à partir de séries décodées (clé de station -> (epochs, valeurs) ou None)"""
+        station_keys = list(series.keys())
+        parsed = {}
+        for station_key, arrays in series.items():
+            if arrays is not None and len(arrays[0]):
+                epochs, values = arrays
+                parsed[station_key] = (to_datetime64(epochs), np.asarray(values, dtype=np.float32))
+
+        step = np.timedelta64(step_minutes * 60, 's')
+        if start is None or end is None:
+            all_times = [ts for ts, _ in parsed.values()]
+            if not all_times:
+                return cls(station_keys, np.array([], dtype='datetime64[s]'),
+                           np.empty((len(station_keys), 0)), step_minutes)
+        start = np.datetime64(start, 's') if start is not None else min(ts.min() for ts in all_times)
+        end = np.datetime64(end, 's') if end is not None else max(ts.max() for ts in all_times)
+
+        # Alignement de la grille sur le pas de temps
+        start = start - (start - np.datetime64(0, 's')) % step
+        n_steps = int((end - start) // step) + 1
+        grid = start + np.arange(n_steps) * step
+
+        values = np.full((len(station_keys), n_steps), np.nan, dtype=np.float32)
+        for row, station_key in enumerate(station_keys):
+            if station_key not in parsed:
+                continue
+            timestamps, station_values = parsed[station_key]
+            buckets = ((timestamps - start) // step).astype(np.int64)
+            valid = (buckets >= 0) & (buckets < n_steps)
+            # En cas de plusieurs mesures dans un même pas, la dernière l'emporte
+            values[row, buckets[valid]] = station_values[valid]
+
+        caps = None
+        if capacities is not None:
+            caps = np.array([capacities.get(station_key, np.nan) for station_key in station_keys])
+
+        history = cls(station_keys, grid, values, step_minutes, caps)
+        history.forward_fill()
+        return history
+
+    def forward_fill(self):
+        """Propage la dernière valeur connue sur les pas manquants (vectorisé)"""
+        mask = ~np.isnan(self.values)
+        idx = np.where(mask, np.arange(self.n_steps), 0)
+        np.maximum.accumulate(idx, axis=1, out=idx)
+        self.values = self.values[np.arange(self.n_stations)[:, None], idx]
+
+    def tail(self, steps: int) -> 'StationHistory':
+        """Retourne les derniers pas de temps de l'historique"""
+        return StationHistory(self.station_keys, self.timestamps[-steps:], self.values[:, -steps:],
+                              self.step_minutes, self.capacities)
+
+
+def collect_history(analyzer, df: pd.DataFrame, days: int = 14, step_minutes: int = 15,
+                    attr_name: str = "availableBikeNumber") -> StationHistory:
+    """Récupère l'historique de toutes les stations d'un snapshot"""
+    to_date = datetime.now()
+    from_date = to_date - timedelta(days=days)
+    from_date_str = from_date.strftime("%Y-%m-%dT%H:%M:%S")
+    to_date_str = to_date.strftime("%Y-%m-%dT%H:%M:%S")
+
+    series = {}
+    for station_key, station_id in zip(df['station_key'].tolist(), df['id']):
+        series[station_key] = analyzer.get_station_timeseries(station_id, attr_name, from_date_str, to_date_str)
+
+    capacities = dict(zip(df['station_key'].tolist(), df['total_slots']))
+    return StationHistory.from_timeseries(series, step_minutes, capacities=capacities)
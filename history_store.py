@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Fichier d'historique à disposition fixe, ouvert par memory-mapping
+Matrice temps × stations en int16 : lecture sans copie, pages partagées entre processus
+"""
+
+import struct
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Optional, Union
+
+from codec import write_archive
+from history import StationHistory
+from timeline import to_epoch
+
+MAGIC = b'VMHIST01'
+VERSION = 1
+# magic, version, capacité (colonnes), epoch de départ, pas (s), nombre de ticks
+HEADER = struct.Struct('<8sIIqqq')
+N_TICKS_OFFSET = HEADER.size - 8
+INDEX_OFFSET = 64
+PAGE_SIZE = 4096
+MISSING = -1
+
+
+def _epoch(timestamp: Union[int, str, datetime, np.datetime64]) -> int:
+    """Instant en secondes epoch (les entiers sont déjà des epochs)"""
+    if isinstance(timestamp, (int, np.integer)):
+        return int(timestamp)
+    return to_epoch(timestamp)
+
+
+class HistoryFile:
+    """Historique d'un attribut (vélos disponibles) pour toutes les stations, sur une grille régulière"""
+
+    def __init__(self, path: str, writable: bool = False):
+        self.path = path
+        self.writable = writable
+        self._data: Optional[np.memmap] = None
+        self.refresh()
+
+    @classmethod
+    def create(cls, path: str, start, step_seconds: int = 60, capacity: int = 1024,
+               station_keys: Optional[np.ndarray] = None) -> 'HistoryFile':
+        """Crée un fichier vide ; capacity = nombre maximal de stations (colonnes)"""
+        start_epoch = _epoch(start)
+        start_epoch -= start_epoch % step_seconds
+        index = np.full(capacity, MISSING, dtype=np.int32)
+        if station_keys is not None:
+            index[:len(station_keys)] = station_keys
+
+        data_offset = -(-(INDEX_OFFSET + index.nbytes) // PAGE_SIZE) * PAGE_SIZE
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, capacity, start_epoch, step_seconds, 0))
+            f.seek(INDEX_OFFSET)
+            f.write(index.tobytes())
+            f.truncate(data_offset)
+        return cls(path, writable=True)
+
+    def refresh(self):
+        """Relit l'en-tête et remappe les données (après un ajout par un autre processus)"""
+        with open(self.path, 'rb') as f:
+            magic, version, capacity, start_epoch, step_seconds, n_ticks = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Fichier d'historique invalide: {self.path}")
+
+        self.capacity = capacity
+        self.start_epoch = start_epoch
+        self.step_seconds = step_seconds
+        self.n_ticks = n_ticks
+        self.data_offset = -(-(INDEX_OFFSET + 4 * capacity) // PAGE_SIZE) * PAGE_SIZE
+        self.index = np.fromfile(self.path, dtype=np.int32, count=capacity, offset=INDEX_OFFSET)
+        self._columns = {int(key): column for column, key in enumerate(self.index) if key != MISSING}
+
+        self._data = None
+        if n_ticks > 0:
+            self._data = np.memmap(self.path, dtype=np.int16, mode='r', offset=self.data_offset,
+                                   shape=(n_ticks, capacity))
+
+    @property
+    def station_keys(self) -> np.ndarray:
+        """Clés des stations enregistrées (dans l'ordre des colonnes)"""
+        return self.index[self.index != MISSING]
+
+    def columns_for(self, station_keys: np.ndarray) -> np.ndarray:
+        """Colonnes de la matrice correspondant à des clés de station (-1 si absente)"""
+        return np.array([self._columns.get(int(key), -1) for key in station_keys], dtype=np.int64)
+
+    def timestamps(self, start_tick: int = 0, end_tick: Optional[int] = None) -> np.ndarray:
+        """Instants (secondes epoch) des ticks demandés"""
+        end_tick = self.n_ticks if end_tick is None else end_tick
+        return self.start_epoch + np.arange(start_tick, end_tick, dtype=np.int64) * self.step_seconds
+
+    def tick_for(self, timestamp) -> int:
+        return (_epoch(timestamp) - self.start_epoch) // self.step_seconds
+
+    def matrix(self) -> np.ndarray:
+        """Matrice complète temps × stations (vue memmap, sans copie)"""
+        if self._data is None:
+            return np.empty((0, self.capacity), dtype=np.int16)
+        return self._data
+
+    def window(self, start=None, end=None) -> np.ndarray:
+        """Tranche temporelle [start, end[ (vue memmap, sans copie)"""
+        start_tick = 0 if start is None else max(0, self.tick_for(start))
+        end_tick = self.n_ticks if end is None else min(self.n_ticks, self.tick_for(end))
+        return self.matrix()[start_tick:end_tick]
+
+    def station_series(self, station_key: int) -> np.ndarray:
+        """Série d'une station (vue à pas constant, sans copie)"""
+        return self.matrix()[:, self._columns[int(station_key)]]
+
+    def add_stations(self, station_keys: np.ndarray) -> np.ndarray:
+        """Réserve une colonne pour les nouvelles stations"""
+        new_keys = [int(key) for key in station_keys if int(key) not in self._columns]
+        if not new_keys:
+            return self.columns_for(station_keys)
+        free = np.flatnonzero(self.index == MISSING)
+        if len(free) < len(new_keys):
+            raise ValueError(f"Capacité du fichier dépassée ({self.capacity} stations)")
+
+        index = self.index.copy()
+        index[free[:len(new_keys)]] = new_keys
+        with open(self.path, 'r+b') as f:
+            f.seek(INDEX_OFFSET)
+            f.write(index.tobytes())
+        self.refresh()
+        return self.columns_for(station_keys)
+
+    def append(self, rows: np.ndarray):
+        """Ajoute des ticks (lignes de largeur capacity) en étendant le fichier"""
+        if not self.writable:
+            raise PermissionError("Fichier d'historique ouvert en lecture seule")
+        rows = np.ascontiguousarray(np.atleast_2d(rows), dtype=np.int16)
+        if rows.shape[1] != self.capacity:
+            raise ValueError(f"Largeur de ligne attendue: {self.capacity}")
+
+        with open(self.path, 'r+b') as f:
+            # Données d'abord, compteur ensuite : un lecteur ne voit jamais de tick incomplet
+            f.seek(self.data_offset + self.n_ticks * self.capacity * 2)
+            f.write(rows.tobytes())
+            f.flush()
+            f.seek(N_TICKS_OFFSET)
+            f.write(struct.pack('<q', self.n_ticks + len(rows)))
+        self.refresh()
+
+    def append_snapshot(self, snapshot: pd.DataFrame, timestamp, column: str = 'available_bikes') -> int:
+        """Ajoute l'état d'un snapshot au tick correspondant ; les ticks manquants reprennent la dernière valeur"""
+        tick = self.tick_for(timestamp)
+        if tick < self.n_ticks:
+            return 0
+
+        columns = self.add_stations(snapshot['station_key'].to_numpy())
+        last = self.matrix()[-1].copy() if self.n_ticks else np.full(self.capacity, MISSING, dtype=np.int16)
+        row = last.copy()
+        row[columns] = snapshot[column].to_numpy()
+
+        gap = tick - self.n_ticks
+        rows = np.vstack([np.repeat(last[None, :], gap, axis=0), row[None, :]])
+        self.append(rows)
+        return len(rows)
+
+    def record(self, changed: pd.DataFrame, snapshot: pd.DataFrame, timestamp: datetime):
+        """Abonné du collecteur : ajoute le snapshot courant"""
+        self.append_snapshot(snapshot, timestamp)
+
+    def to_history(self, start=None, end=None, step_minutes: Optional[int] = None) -> StationHistory:
+        """Convertit une tranche en StationHistory (copie float32, valeurs manquantes = NaN)"""
+        window = self.window(start, end)
+        start_tick = 0 if start is None else max(0, self.tick_for(start))
+        keys = self.station_keys
+        values = window[:, self.columns_for(keys)].T.astype(np.float32)
+        values[values == MISSING] = np.nan
+        timestamps = self.timestamps(start_tick, start_tick + len(window)).astype('datetime64[s]')
+        return StationHistory(keys, timestamps, values, step_minutes or max(1, self.step_seconds // 60))
+
+    def export_archive(self, path: str, start=None, end=None) -> int:
+        """Exporte une tranche en archive compressée (codec.py) ; retourne la taille des séries"""
+        window = self.window(start, end)
+        start_tick = 0 if start is None else max(0, self.tick_for(start))
+        keys = self.station_keys
+        return write_archive(path, keys, self.timestamps(start_tick, start_tick + len(window)),
+                             window[:, self.columns_for(keys)])
+
+    def close(self):
+        self._data = None
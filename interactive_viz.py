@@ -3,20 +3,169 @@
 Script pour lancer uniquement les visualisations interactives
 """
 
+import argparse
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from main import VelomaggAnalyzer
 from advanced_analytics import AdvancedAnalytics
+from build_cache import BuildManifest, hash_inputs
+from heatmap_tiles import (HEAT_METRICS, HEAT_METRIC_LABELS, build_heat_layers,
+                           layer_points, snapshot_metrics, station_metrics)
+from history import collect_history
+from replay import encode_replay
+from clustering import CLUSTER_LABELS, HOURS_PER_WEEK
+from profiling import profile_stage, run_cli
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import folium
 from folium import plugins
+from branca.element import MacroElement
+from jinja2 import Template
 import webbrowser
 
+
+class ZoomLevelSwitch(MacroElement):
+    """N'affiche, dans chaque groupe, que la heatmap de la grille adaptée au zoom courant"""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var levels = [
+            {%- for group, layers in this.levels.items() %}
+                {group: {{ group }}, layers: [
+                {%- for zoom, heat in layers %}[{{ zoom }}, {{ heat }}],{% endfor -%}
+                ]},
+            {%- endfor %}
+            ];
+            function update() {
+                var zoom = map.getZoom();
+                levels.forEach(function(level) {
+                    var chosen = level.layers[0][1];
+                    level.layers.forEach(function(layer) {
+                        if (layer[0] <= zoom) { chosen = layer[1]; }
+                    });
+                    level.layers.forEach(function(layer) {
+                        if (layer[1] === chosen) { level.group.addLayer(layer[1]); }
+                        else { level.group.removeLayer(layer[1]); }
+                    });
+                });
+            }
+            map.on('zoomend', update);
+            update();
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, levels):
+        super().__init__()
+        self._name = 'ZoomLevelSwitch'
+        self.levels = levels
+
+
+class ReplayControl(MacroElement):
+    """Relecture de l'occupation des stations avec un curseur temporel
+
+    Les deltas de chaque station sont décodés une seule fois au chargement ; le curseur ne fait
+    que restyler les marqueurs existants.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var data = {{ this.payload|tojson }};
+            var raw = atob(data.deltas);
+            var bytes = new Uint8Array(raw.length);
+            for (var i = 0; i < raw.length; i++) { bytes[i] = raw.charCodeAt(i); }
+            var deltas = data.dtype === 'int8' ? new Int8Array(bytes.buffer) : new Int16Array(bytes.buffer);
+
+            var n = data.base.length, frames = data.frames, width = frames - 1;
+            var counts = new Int16Array(n * frames);
+            for (var s = 0; s < n; s++) {
+                var value = data.base[s];
+                counts[s * frames] = value;
+                for (var f = 1; f < frames; f++) {
+                    value += deltas[s * width + f - 1];
+                    counts[s * frames + f] = value;
+                }
+            }
+
+            var layer = L.layerGroup().addTo(map);
+            var markers = data.latitude.map(function(lat, s) {
+                return L.circleMarker([lat, data.longitude[s]], {radius: 6, weight: 1})
+                    .bindTooltip('').addTo(layer);
+            });
+
+            function color(rate) {
+                return rate > 0.8 ? 'red' : rate > 0.6 ? 'orange' : rate > 0.3 ? 'green' : 'blue';
+            }
+
+            var control = L.control({position: 'bottomleft'});
+            control.onAdd = function() {
+                var div = L.DomUtil.create('div', 'leaflet-bar');
+                div.style.background = 'white';
+                div.style.padding = '6px 10px';
+                div.innerHTML = '<button type="button">▶</button> ' +
+                    '<input type="range" min="0" max="' + (frames - 1) + '" value="0" style="width: 320px; vertical-align: middle;"> ' +
+                    '<span></span>';
+                L.DomEvent.disableClickPropagation(div);
+                return div;
+            };
+            control.addTo(map);
+            var container = control.getContainer();
+            var button = container.querySelector('button');
+            var slider = container.querySelector('input');
+            var label = container.querySelector('span');
+
+            function show(frame) {
+                for (var s = 0; s < n; s++) {
+                    var marker = markers[s];
+                    if (data.first[s] < 0 || frame < data.first[s]) {
+                        marker.setStyle({opacity: 0, fillOpacity: 0});
+                        continue;
+                    }
+                    var bikes = counts[s * frames + frame];
+                    var rate = data.capacity[s] ? bikes / data.capacity[s] : 0;
+                    marker.setStyle({color: color(rate), fillColor: color(rate), opacity: 1, fillOpacity: 0.8});
+                    marker.setRadius(4 + 8 * Math.min(rate, 1));
+                    marker.setTooltipContent(data.address[s] + ' - ' + bikes + ' vélos');
+                }
+                var date = new Date((data.start + frame * data.step) * 1000);
+                label.textContent = date.toISOString().slice(0, 16).replace('T', ' ') + ' UTC';
+            }
+
+            var timer = null;
+            slider.addEventListener('input', function() { show(+slider.value); });
+            button.addEventListener('click', function() {
+                if (timer) {
+                    clearInterval(timer);
+                    timer = null;
+                    button.textContent = '▶';
+                    return;
+                }
+                button.textContent = '⏸';
+                timer = setInterval(function() {
+                    slider.value = (+slider.value + 1) % frames;
+                    show(+slider.value);
+                }, {{ this.frame_ms }});
+            });
+            show(0);
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, payload, frame_ms=100):
+        super().__init__()
+        self._name = 'ReplayControl'
+        self.payload = payload
+        self.frame_ms = frame_ms
+
+
 class InteractiveVisualizer:
     """Générateur de visualisations interactives"""
     
@@ -25,8 +174,16 @@ class InteractiveVisualizer:
         self.advanced = AdvancedAnalytics(self.analyzer)
         
     def create_plotly_dashboard(self, df):
-        """Crée un dashboard Plotly interactif"""
+        """Crée un dashboard Plotly interactif
+
+        Si la typologie des stations a été calculée (AdvancedAnalytics.cluster_stations),
+        le type d'usage de chaque station figure dans l'infobulle.
+        """
         print("📊 Création du dashboard Plotly...")
+        if self.advanced.clusterer.result is not None:
+            hover_text = df['address'] + '<br>' + self.advanced.clusterer.label_frame(df)['cluster_label'].to_numpy()
+        else:
+            hover_text = df['address']
         
         # Création des sous-graphiques
         fig = make_subplots(
@@ -66,7 +223,7 @@ class InteractiveVisualizer:
                     showscale=True,
                     colorbar=dict(title="Taux d'occupation")
                 ),
-                text=df['address'],
+                text=hover_text,
                 hovertemplate='<b>%{text}</b><br>Capacité: %{x}<br>Occupation: %{y:.1%}<br>Vélos: %{marker.size}<extra></extra>',
                 name='Stations'
             ),
@@ -114,8 +271,12 @@ class InteractiveVisualizer:
         
         return fig
     
-    def create_interactive_map(self, df):
-        """Crée une carte Folium interactive"""
+    def create_interactive_map(self, df, heat_layers=None):
+        """Crée une carte Folium interactive
+
+        heat_layers : grilles précalculées par niveau de zoom (heatmap_tiles.build_heat_layers),
+        par défaut agrégées à partir du snapshot courant
+        """
         print("🗺️ Création de la carte interactive...")
         
         # Centre sur Montpellier
@@ -168,19 +329,42 @@ class InteractiveVisualizer:
                 tooltip=f"{station['address'][:30]}... - {station['available_bikes']} vélos"
             ).add_to(m)
         
-        # Ajout d'une heatmap de densité
-        heat_data = [[row['latitude'], row['longitude'], row['available_bikes']] 
-                     for idx, row in df.iterrows()]
-        
-        plugins.HeatMap(heat_data, radius=15, blur=10, gradient={
-            0.2: 'blue', 0.4: 'lime', 0.6: 'orange', 1: 'red'
-        }).add_to(m)
-        
+        # Heatmaps agrégées par grille : une couche par métrique, la grille suit le niveau de zoom
+        if heat_layers is None:
+            heat_layers = build_heat_layers(snapshot_metrics(df))
+        levels = {}
+        for metric in HEAT_METRICS:
+            if not all(metric in grid for grid in heat_layers.values()):
+                continue
+            group = folium.FeatureGroup(name=f"🔥 {HEAT_METRIC_LABELS[metric]}",
+                                        show=metric == 'mean_occupancy')
+            levels[group.get_name()] = []
+            for zoom, grid in sorted(heat_layers.items()):
+                heat = plugins.HeatMap(layer_points(grid, metric), radius=25, blur=15, gradient={
+                    0.2: 'blue', 0.4: 'lime', 0.6: 'orange', 1: 'red'
+                })
+                heat.add_to(group)
+                levels[group.get_name()].append([zoom, heat.get_name()])
+            group.add_to(m)
+        ZoomLevelSwitch(levels).add_to(m)
+
         # Contrôles de couches
         folium.LayerControl().add_to(m)
         
         return m
     
+    def create_replay_map(self, df, history, start=None, end=None, step_minutes=5):
+        """Carte interactive avec relecture de l'occupation sur une période (curseur temporel)
+
+        history : StationHistory des vélos disponibles (collect_history, HistoryFile.to_history)
+        """
+        m = self.create_interactive_map(df)
+        print("⏯️ Encodage de la relecture...")
+        payload = encode_replay(history, df, start, end, step_minutes)
+        ReplayControl(payload).add_to(m)
+        print(f"   {payload['frames']} images, {len(payload['deltas']) / 1024:.0f} Ko de deltas")
+        return m
+    
     def create_temporal_analysis(self, station_ids=None, days=7):
         """Crée une analyse temporelle interactive"""
         print("⏰ Analyse temporelle interactive...")
@@ -227,45 +411,172 @@ class InteractiveVisualizer:
         )
         
         return fig
+    
+    def create_cluster_profiles(self):
+        """Profil hebdomadaire moyen de chaque type de station (AdvancedAnalytics.cluster_stations)"""
+        result = self.advanced.clusterer.result
+        if result is None:
+            raise RuntimeError("La typologie des stations n'a pas été calculée")
+        
+        fig = go.Figure()
+        colors = px.colors.qualitative.Set1
+        days = ['Lun', 'Mar', 'Mer', 'Jeu', 'Ven', 'Sam', 'Dim']
+        hours = [f"{days[hour // 24]} {hour % 24}h" for hour in range(HOURS_PER_WEEK)]
+        for cluster, (name, centroid) in enumerate(zip(result['names'], result['centroids'])):
+            size = int((result['labels'] == cluster).sum())
+            fig.add_trace(
+                go.Scatter(
+                    x=hours,
+                    y=centroid,
+                    mode='lines',
+                    name=f"{CLUSTER_LABELS[name]} ({size})",
+                    line=dict(color=colors[cluster % len(colors)], width=2),
+                    hovertemplate='%{x}<br>Occupation: %{y:.0%}<extra></extra>'
+                )
+            )
+        
+        fig.update_layout(
+            title="🧭 Profils d'usage hebdomadaires par type de station",
+            xaxis_title="Heure de la semaine",
+            yaxis_title="Occupation moyenne",
+            yaxis_tickformat='.0%',
+            template="plotly_white",
+            height=500
+        )
+        
+        return fig
 
 def main_interactive():
-    """Fonction principale pour les visualisations interactives"""
+    """Fonction principale pour les visualisations interactives
+
+    Retourne (dashboard, carte, analyse temporelle) ; le dashboard et la carte valent None
+    lorsque le build incrémental les a jugés inchangés (fichiers déjà à jour, non régénérés).
+    """
+    parser = argparse.ArgumentParser(description="Visualisations interactives Vélomagg")
+    parser.add_argument('--history-days', type=int, default=7,
+                        help="Jours d'historique pour les couches de la carte (0: snapshot courant seul)")
+    args = parser.parse_args()
+    
     print("🎨 Lancement des visualisations interactives VéloMAG")
     
     viz = InteractiveVisualizer()
+    manifest = BuildManifest()
     
     # Récupération des données
     print("\n📡 Récupération des données...")
     df = viz.analyzer.analyze_current_status()
     
+    history = None
+    if args.history_days > 0:
+        print(f"\n📚 Récupération de {args.history_days} jours d'historique...")
+        with profile_stage('history'):
+            history = collect_history(viz.analyzer, df, days=args.history_days)
+    
+    # Couches de heatmap historiques (occupation, temps à vide, flux) plutôt que le seul snapshot
+    heat_layers = None
+    if history is not None:
+        with profile_stage('heat_layers'):
+            flows = viz.advanced.infer_trip_flows(history)
+            heat_layers = build_heat_layers(station_metrics(history, viz.analyzer.registry, flows))
+    
+    # Typologie calculée avant le dashboard : le type d'usage figure dans ses infobulles
+    station_types = None
+    if history is not None:
+        with profile_stage('clustering'):
+            viz.advanced.cluster_stations(df, history)
+        station_types = viz.advanced.clusterer.station_types()
+    
     # 1. Dashboard Plotly
     print("\n📊 Génération du dashboard interactif...")
-    dashboard = viz.create_plotly_dashboard(df)
-    dashboard.write_html("dashboard_velomagg.html")
-    print("✅ Dashboard sauvegardé: dashboard_velomagg.html")
+    dashboard = None
+    input_hash = hash_inputs("dashboard_velomagg.html", df[['available_bikes', 'free_slots', 'total_slots',
+                                                             'occupancy_rate', 'address', 'status']],
+                             station_types if station_types is not None else '')
+    if manifest.should_build("dashboard_velomagg.html", input_hash):
+        with profile_stage('rendering_dashboard'):
+            dashboard = viz.create_plotly_dashboard(df)
+            dashboard.write_html("dashboard_velomagg.html")
+        manifest.record("dashboard_velomagg.html", "dashboard_velomagg.html", input_hash)
+        print("✅ Dashboard sauvegardé: dashboard_velomagg.html")
+    else:
+        print("♻️ Dashboard inchangé")
     
     # 2. Carte interactive
     print("\n🗺️ Génération de la carte interactive...")
-    map_viz = viz.create_interactive_map(df)
-    map_viz.save("carte_velomagg.html")
-    print("✅ Carte sauvegardée: carte_velomagg.html")
+    map_viz = None
+    input_hash = hash_inputs("carte_velomagg.html", df[['latitude', 'longitude', 'address', 'available_bikes',
+                                                         'free_slots', 'total_slots', 'occupancy_rate', 'status']],
+                             *(heat_layers or {}).values())
+    if manifest.should_build("carte_velomagg.html", input_hash):
+        with profile_stage('rendering_map'):
+            map_viz = viz.create_interactive_map(df, heat_layers)
+            map_viz.save("carte_velomagg.html")
+        manifest.record("carte_velomagg.html", "carte_velomagg.html", input_hash)
+        print("✅ Carte sauvegardée: carte_velomagg.html")
+    else:
+        print("♻️ Carte inchangée")
+    
+    # Relecture de l'occupation sur la période de l'historique collecté
+    replay_viz = None
+    if history is not None:
+        print("\n⏯️ Génération de la carte de relecture...")
+        input_hash = hash_inputs("replay_velomagg.html", df[['station_key', 'latitude', 'longitude', 'address',
+                                                              'total_slots']],
+                                 history.station_keys.tobytes(), history.epochs.tobytes(), history.values.tobytes())
+        if manifest.should_build("replay_velomagg.html", input_hash):
+            with profile_stage('rendering_replay'):
+                replay_viz = viz.create_replay_map(df, history)
+                replay_viz.save("replay_velomagg.html")
+            manifest.record("replay_velomagg.html", "replay_velomagg.html", input_hash)
+            print("✅ Relecture sauvegardée: replay_velomagg.html")
+        else:
+            print("♻️ Relecture inchangée")
     
-    # 3. Analyse temporelle
+    # Typologie des stations (profils hebdomadaires moyens par groupe)
+    if history is not None:
+        print("\n🧭 Génération des profils de stations...")
+        cluster_viz = viz.create_cluster_profiles()
+        input_hash = hash_inputs("cluster_profiles.html", cluster_viz.to_json())
+        if manifest.should_build("cluster_profiles.html", input_hash):
+            with profile_stage('rendering_clusters'):
+                cluster_viz.write_html("cluster_profiles.html")
+            manifest.record("cluster_profiles.html", "cluster_profiles.html", input_hash)
+            print("✅ Profils de stations sauvegardés: cluster_profiles.html")
+        else:
+            print("♻️ Profils de stations inchangés")
+    
+    # 3. Analyse temporelle (l'empreinte porte sur la figure, construite à partir de l'historique)
     print("\n⏰ Génération de l'analyse temporelle...")
-    temporal_viz = viz.create_temporal_analysis()
-    temporal_viz.write_html("temporal_analysis.html")
-    print("✅ Analyse temporelle sauvegardée: temporal_analysis.html")
+    with profile_stage('temporal_analysis'):
+        temporal_viz = viz.create_temporal_analysis()
+    input_hash = hash_inputs("temporal_analysis.html", temporal_viz.to_json())
+    if manifest.should_build("temporal_analysis.html", input_hash):
+        with profile_stage('rendering_temporal'):
+            temporal_viz.write_html("temporal_analysis.html")
+        manifest.record("temporal_analysis.html", "temporal_analysis.html", input_hash)
+        print("✅ Analyse temporelle sauvegardée: temporal_analysis.html")
+    else:
+        print("♻️ Analyse temporelle inchangée")
+    
+    manifest.save()
+    print(f"\n🧱 Build incrémental: {manifest.summary()}")
     
     print("\n✅ Visualisations générées:")
     print("  📊 dashboard_velomagg.html - Dashboard principal")
     print("  🗺️ carte_velomagg.html - Carte interactive")  
+    if history is not None:
+        print("  ⏯️ replay_velomagg.html - Relecture de l'occupation")
+        print("  🧭 cluster_profiles.html - Profils des types de stations")
     print("  ⏰ temporal_analysis.html - Analyse temporelle")
     
-    # Ouverture automatique dans le navigateur
-    print("\n🌐 Ouverture automatique dans le navigateur...")
-    webbrowser.open("dashboard_velomagg.html")
+    # Ouverture automatique dans le navigateur (le dashboard peut manquer si son build a été ignoré)
+    if os.path.exists("dashboard_velomagg.html"):
+        print("\n🌐 Ouverture automatique dans le navigateur...")
+        webbrowser.open(os.path.abspath("dashboard_velomagg.html"))
+    else:
+        print("\n⚠️ dashboard_velomagg.html absent : ouverture dans le navigateur ignorée")
     
     return dashboard, map_viz, temporal_viz
 
 if __name__ == "__main__":
-    main_interactive()
+    run_cli(main_interactive)
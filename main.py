@@ -16,29 +16,105 @@ from typing import List, Dict, Any, Optional
 import urllib.parse
 import os
 
+from registry import StationRegistry
+from build_cache import BuildManifest, hash_inputs, write_if_changed
+from summaries import EXTREME_FIELDS, export_summaries
+from profiling import profile_stage, run_cli
+from timestamps import MISSING_EPOCH, decode_timestamps, hour_of_day, to_datetime64
+from schema import API_TIMESTAMP_FORMAT, enforce_schema, format_memory_report, json_default
+from validation import RecordLayout, ValidationMetrics, validate_stations
+
+# Registre persistant : les clés des stations restent identiques d'une exécution à l'autre
+REGISTRY_PATH = os.path.join("cache", "station_registry.json")
+
 class VelomaggAnalyzer:
     """Classe principale pour analyser les données Vélomagg"""
     
     BASE_URL = "https://portail-api-data.montpellier3m.fr"
     STATIONS_ENDPOINT = "/bikestation"
     TIMESERIES_ENDPOINT = "/bikestation_timeseries"
+    # Attributs dont la modification signale un changement d'état d'une station
+    CHANGE_FIELDS = ('availableBikeNumber', 'freeSlotNumber', 'status')
     
-    def __init__(self):
+    def __init__(self, registry_path: Optional[str] = REGISTRY_PATH):
         self.stations_data = None
         self.timeseries_cache = {}
+        # Clés entières stables des stations pour l'historique, les modèles et les analyses
+        # (registry_path=None : registre en mémoire uniquement)
+        self.registry_path = registry_path
+        if registry_path and os.path.exists(registry_path):
+            self.registry = StationRegistry.load(registry_path)
+        else:
+            self.registry = StationRegistry()
+        # Validateurs HTTP de la dernière réponse /bikestation (requêtes conditionnelles)
+        self._etag = None
+        self._last_modified = None
+        self._station_signatures = {}
+        # Stations absentes de la dernière réponse alors qu'elles figuraient dans la précédente
+        self.removed_station_ids: List[str] = []
+        # Compteurs de validation des réponses de l'API (stations en quarantaine)
+        self.validation = ValidationMetrics()
+    
+    def _fetch_stations(self) -> Optional[List[Dict[str, Any]]]:
+        """Interroge /bikestation en requête conditionnelle (None si 304 Not Modified)"""
+        headers = {}
+        if self.stations_data is not None:
+            if self._etag:
+                headers['If-None-Match'] = self._etag
+            if self._last_modified:
+                headers['If-Modified-Since'] = self._last_modified
+        
+        response = requests.get(f"{self.BASE_URL}{self.STATIONS_ENDPOINT}", headers=headers)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        
+        self._etag = response.headers.get('ETag')
+        self._last_modified = response.headers.get('Last-Modified')
+        self.stations_data = response.json()
+        return self.stations_data
         
     def get_all_stations(self) -> List[Dict[str, Any]]:
         """Récupère la liste de toutes les stations"""
         try:
-            response = requests.get(f"{self.BASE_URL}{self.STATIONS_ENDPOINT}")
-            response.raise_for_status()
-            self.stations_data = response.json()
+            if self._fetch_stations() is None:
+                print("♻️ Stations inchangées depuis la dernière récupération (304)")
+                return self.stations_data
             print(f"✅ Récupération de {len(self.stations_data)} stations")
             return self.stations_data
         except requests.RequestException as e:
             print(f"❌ Erreur lors de la récupération des stations: {e}")
             return []
     
+    def station_signature(self, station: Dict[str, Any]) -> tuple:
+        """Valeurs suivies pour détecter le changement d'état d'une station"""
+        return tuple((station.get(field) or {}).get('value') for field in self.CHANGE_FIELDS)
+    
+    def poll_changes(self) -> Optional[List[Dict[str, Any]]]:
+        """Retourne uniquement les stations modifiées depuis le dernier appel (None si 304)"""
+        try:
+            stations = self._fetch_stations()
+        except requests.RequestException as e:
+            print(f"❌ Erreur lors de la récupération des stations: {e}")
+            return None
+        
+        self.removed_station_ids = []
+        if stations is None:
+            if self._station_signatures or not self.stations_data:
+                return None
+            # Premier suivi après analyze_current_status : la réponse déjà reçue sert de point de départ
+            stations = self.stations_data
+        
+        previous = self._station_signatures
+        # Stations sans identifiant : transmises telles quelles, la validation les met en quarantaine
+        signatures = {station.get('id'): self.station_signature(station) for station in stations}
+        self._station_signatures = signatures
+        self.removed_station_ids = [station_id for station_id in previous
+                                    if station_id is not None and station_id not in signatures]
+        
+        return [station for station in stations
+                if station.get('id') is None or previous.get(station['id']) != signatures[station['id']]]
+    
     def get_station_timeseries(self, station_id: str, attr_name: str = "availableBikeNumber", 
                               from_date: str = "2024-01-01T00:00:00", 
                               to_date: str = "2025-01-01T00:00:00") -> Dict[str, Any]:
@@ -72,29 +148,46 @@ class VelomaggAnalyzer:
     def analyze_current_status(self) -> pd.DataFrame:
         """Analyse l'état actuel de toutes les stations"""
         if not self.stations_data:
-            self.get_all_stations()
+            with profile_stage('fetch'):
+                self.get_all_stations()
         
-        stations_list = []
-        for station in self.stations_data:
-            station_info = {
-                'id': station['id'],
-                'address': station['address']['value']['streetAddress'],
-                'locality': station['address']['value']['addressLocality'],
-                'available_bikes': station['availableBikeNumber']['value'],
-                'free_slots': station['freeSlotNumber']['value'],
-                'total_slots': station['totalSlotNumber']['value'],
-                'status': station['status']['value'],
-                'latitude': station['location']['value']['coordinates'][1],
-                'longitude': station['location']['value']['coordinates'][0],
-                'last_update': station['availableBikeNumber']['metadata'].get('timestamp', {}).get('value', 'N/A')
-            }
-            stations_list.append(station_info)
+        with profile_stage('parsing'):
+            return self.build_status_frame(self.stations_data)
+    
+    def build_status_frame(self, stations: List[Dict[str, Any]],
+                           layout: Optional[RecordLayout] = None) -> pd.DataFrame:
+        """Construit le DataFrame d'état à partir d'une liste de stations de l'API (format NGSI par défaut)"""
+        # Stations invalides mises de côté (avec leurs motifs) plutôt que d'interrompre l'analyse
+        report = validate_stations(stations, layout)
+        self.validation.record(report)
+        if report.quarantined:
+            print(f"⚠️ {report.quarantined} station(s) en quarantaine: "
+                  f"{', '.join(f'{reason} ×{count}' for reason, count in report.reasons.most_common(3))}")
         
-        df = pd.DataFrame(stations_list)
-        df['occupancy_rate'] = df['available_bikes'] / df['total_slots']
-        df['utilization_rate'] = (df['total_slots'] - df['free_slots']) / df['total_slots']
+        df = pd.DataFrame(report.columns)
+        known_stations = len(self.registry)
+        keys = self.registry.register_frame(df)
+        if len(self.registry) > known_stations:
+            self.save_registry()
+        df.insert(0, 'station_key', keys)
+        # Adresses internées par le registre : une seule chaîne par station, quel que soit le nombre de snapshots
+        df['address'] = [self.registry.addresses[key] for key in keys.tolist()]
+        # Capacité nulle : taux à 0 plutôt qu'une division par zéro
+        total_slots = df['total_slots'].to_numpy(dtype=np.float64)
+        has_slots = total_slots > 0
+        df['occupancy_rate'] = np.divide(df['available_bikes'].to_numpy(dtype=np.float64), total_slots,
+                                         out=np.zeros(len(df)), where=has_slots)
+        df['utilization_rate'] = np.divide(total_slots - df['free_slots'].to_numpy(dtype=np.float64), total_slots,
+                                           out=np.zeros(len(df)), where=has_slots)
         
-        return df
+        return enforce_schema(df)
+    
+    def save_registry(self):
+        """Sauvegarde le registre des stations à son emplacement persistant"""
+        if not self.registry_path:
+            return
+        os.makedirs(os.path.dirname(self.registry_path) or '.', exist_ok=True)
+        self.registry.save(self.registry_path)
     
     def generate_statistics_report(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Génère un rapport statistique complet"""
@@ -122,11 +215,12 @@ class VelomaggAnalyzer:
                     'max': df['total_slots'].max()
                 }
             },
+            # Seuls les champs utiles des stations extrêmes (pas la ligne complète)
             'extremes': {
-                'most_occupied': df.loc[df['occupancy_rate'].idxmax()].to_dict(),
-                'least_occupied': df.loc[df['occupancy_rate'].idxmin()].to_dict(),
-                'largest_station': df.loc[df['total_slots'].idxmax()].to_dict(),
-                'smallest_station': df.loc[df['total_slots'].idxmin()].to_dict()
+                'most_occupied': df.loc[df['occupancy_rate'].idxmax(), EXTREME_FIELDS].to_dict(),
+                'least_occupied': df.loc[df['occupancy_rate'].idxmin(), EXTREME_FIELDS].to_dict(),
+                'largest_station': df.loc[df['total_slots'].idxmax(), EXTREME_FIELDS].to_dict(),
+                'smallest_station': df.loc[df['total_slots'].idxmin(), EXTREME_FIELDS].to_dict()
             }
         }
         
@@ -147,13 +241,18 @@ class VelomaggAnalyzer:
         if not data or 'values' not in data:
             return {}
         
-        # Création du DataFrame
+        # Création du DataFrame (horodatages décodés en secondes epoch UTC, mesures non datées écartées)
+        epochs = decode_timestamps(data['index'])
+        valid = epochs != MISSING_EPOCH
+        if not valid.any():
+            return {}
+        epochs = epochs[valid]
         df = pd.DataFrame({
-            'timestamp': pd.to_datetime(data['index']),
-            'available_bikes': data['values']
+            'timestamp': to_datetime64(epochs),
+            'available_bikes': np.asarray(data['values'])[valid]
         })
         
-        df['hour'] = df['timestamp'].dt.hour
+        df['hour'] = hour_of_day(epochs)
         df['day_of_week'] = df['timestamp'].dt.day_name()
         df['date'] = df['timestamp'].dt.date
         
@@ -169,7 +268,8 @@ class VelomaggAnalyzer:
         
         return analysis
     
-    def create_visualizations(self, df: pd.DataFrame, output_dir: str = "visualizations"):
+    def create_visualizations(self, df: pd.DataFrame, output_dir: str = "visualizations",
+                              manifest: Optional[BuildManifest] = None):
         """Crée des visualisations des données"""
         os.makedirs(output_dir, exist_ok=True)
         
@@ -177,62 +277,86 @@ class VelomaggAnalyzer:
         plt.style.use('seaborn-v0_8')
         
         # 1. Distribution des vélos disponibles
-        plt.figure(figsize=(10, 6))
-        plt.hist(df['available_bikes'], bins=20, alpha=0.7, color='skyblue', edgecolor='black')
-        plt.title('Distribution du nombre de vélos disponibles par station')
-        plt.xlabel('Nombre de vélos disponibles')
-        plt.ylabel('Nombre de stations')
-        plt.grid(True, alpha=0.3)
-        plt.savefig(f"{output_dir}/bikes_distribution.png", dpi=300, bbox_inches='tight')
-        plt.close()
+        artifact = "visualizations/bikes_distribution.png"
+        input_hash = hash_inputs(artifact, df[['available_bikes']])
+        if manifest is None or manifest.should_build(artifact, input_hash):
+            plt.figure(figsize=(10, 6))
+            plt.hist(df['available_bikes'], bins=20, alpha=0.7, color='skyblue', edgecolor='black')
+            plt.title('Distribution du nombre de vélos disponibles par station')
+            plt.xlabel('Nombre de vélos disponibles')
+            plt.ylabel('Nombre de stations')
+            plt.grid(True, alpha=0.3)
+            plt.savefig(f"{output_dir}/bikes_distribution.png", dpi=300, bbox_inches='tight')
+            plt.close()
+            if manifest is not None:
+                manifest.record(artifact, f"{output_dir}/bikes_distribution.png", input_hash)
         
         # 2. Taux d'occupation par station
-        plt.figure(figsize=(12, 8))
-        plt.scatter(df['longitude'], df['latitude'], c=df['occupancy_rate'], 
-                   cmap='RdYlGn_r', s=df['total_slots']*3, alpha=0.7)
-        plt.colorbar(label='Taux d\'occupation')
-        plt.title('Taux d\'occupation des stations Vélomagg (taille = capacité)')
-        plt.xlabel('Longitude')
-        plt.ylabel('Latitude')
-        plt.grid(True, alpha=0.3)
-        plt.savefig(f"{output_dir}/occupancy_map.png", dpi=300, bbox_inches='tight')
-        plt.close()
+        artifact = "visualizations/occupancy_map.png"
+        input_hash = hash_inputs(artifact, df[['longitude', 'latitude', 'occupancy_rate', 'total_slots']])
+        if manifest is None or manifest.should_build(artifact, input_hash):
+            plt.figure(figsize=(12, 8))
+            plt.scatter(df['longitude'], df['latitude'], c=df['occupancy_rate'], 
+                       cmap='RdYlGn_r', s=df['total_slots']*3, alpha=0.7)
+            plt.colorbar(label='Taux d\'occupation')
+            plt.title('Taux d\'occupation des stations Vélomagg (taille = capacité)')
+            plt.xlabel('Longitude')
+            plt.ylabel('Latitude')
+            plt.grid(True, alpha=0.3)
+            plt.savefig(f"{output_dir}/occupancy_map.png", dpi=300, bbox_inches='tight')
+            plt.close()
+            if manifest is not None:
+                manifest.record(artifact, f"{output_dir}/occupancy_map.png", input_hash)
         
         # 3. Top 10 des stations les plus/moins occupées
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
-        
-        # Plus occupées
-        top_occupied = df.nlargest(10, 'occupancy_rate')
-        ax1.barh(range(len(top_occupied)), top_occupied['occupancy_rate'])
-        ax1.set_yticks(range(len(top_occupied)))
-        ax1.set_yticklabels([addr[:30] + '...' if len(addr) > 30 else addr 
-                            for addr in top_occupied['address']], fontsize=8)
-        ax1.set_title('Top 10 stations les plus occupées')
-        ax1.set_xlabel('Taux d\'occupation')
-        
-        # Moins occupées
-        least_occupied = df.nsmallest(10, 'occupancy_rate')
-        ax2.barh(range(len(least_occupied)), least_occupied['occupancy_rate'])
-        ax2.set_yticks(range(len(least_occupied)))
-        ax2.set_yticklabels([addr[:30] + '...' if len(addr) > 30 else addr 
-                            for addr in least_occupied['address']], fontsize=8)
-        ax2.set_title('Top 10 stations les moins occupées')
-        ax2.set_xlabel('Taux d\'occupation')
-        
-        plt.tight_layout()
-        plt.savefig(f"{output_dir}/top_stations.png", dpi=300, bbox_inches='tight')
-        plt.close()
+        artifact = "visualizations/top_stations.png"
+        input_hash = hash_inputs(artifact, df[['address', 'occupancy_rate']])
+        if manifest is None or manifest.should_build(artifact, input_hash):
+            fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6))
+            
+            # Plus occupées
+            top_occupied = df.nlargest(10, 'occupancy_rate')
+            ax1.barh(range(len(top_occupied)), top_occupied['occupancy_rate'])
+            ax1.set_yticks(range(len(top_occupied)))
+            ax1.set_yticklabels([addr[:30] + '...' if len(addr) > 30 else addr 
+                                for addr in top_occupied['address']], fontsize=8)
+            ax1.set_title('Top 10 stations les plus occupées')
+            ax1.set_xlabel('Taux d\'occupation')
+            
+            # Moins occupées
+            least_occupied = df.nsmallest(10, 'occupancy_rate')
+            ax2.barh(range(len(least_occupied)), least_occupied['occupancy_rate'])
+            ax2.set_yticks(range(len(least_occupied)))
+            ax2.set_yticklabels([addr[:30] + '...' if len(addr) > 30 else addr 
+                                for addr in least_occupied['address']], fontsize=8)
+            ax2.set_title('Top 10 stations les moins occupées')
+            ax2.set_xlabel('Taux d\'occupation')
+            
+            plt.tight_layout()
+            plt.savefig(f"{output_dir}/top_stations.png", dpi=300, bbox_inches='tight')
+            plt.close()
+            if manifest is not None:
+                manifest.record(artifact, f"{output_dir}/top_stations.png", input_hash)
         
         print(f"✅ Visualisations sauvegardées dans le dossier '{output_dir}'")
     
-    def export_data(self, df: pd.DataFrame, stats: Dict[str, Any], filename: str = "velomagg_analysis"):
+    def export_data(self, df: pd.DataFrame, stats: Dict[str, Any], filename: str = "velomagg_analysis",
+                    manifest: Optional[BuildManifest] = None):
         """Exporte les données et statistiques"""
-        # Export CSV
-        df.to_csv(f"{filename}.csv", index=False, encoding='utf-8')
+        # Les fichiers ne sont réécrits que si leur contenu change
+        exports = {
+            f"{filename}.csv": df.to_csv(index=False, date_format=API_TIMESTAMP_FORMAT.replace('%f', '000')).encode('utf-8'),
+            f"{filename}_stats.json": json.dumps(stats, indent=2, ensure_ascii=False, default=json_default).encode('utf-8')
+        }
         
-        # Export JSON des statistiques
-        with open(f"{filename}_stats.json", 'w', encoding='utf-8') as f:
-            json.dump(stats, f, indent=2, ensure_ascii=False, default=str)
+        for path, data in exports.items():
+            artifact = f"data/{os.path.basename(path)}"
+            input_hash = hash_inputs(data)
+            if manifest is not None and not manifest.should_build(artifact, input_hash):
+                continue
+            write_if_changed(path, data)
+            if manifest is not None:
+                manifest.record(artifact, path, input_hash)
         
         print(f"✅ Données exportées: {filename}.csv et {filename}_stats.json")
 
@@ -241,14 +365,17 @@ def main():
     print("🚴 Démarrage de l'analyse Vélomagg Montpellier")
     
     analyzer = VelomaggAnalyzer()
+    manifest = BuildManifest()
     
     # 1. Récupération et analyse des données actuelles
     print("\n📊 Analyse de l'état actuel des stations...")
     current_df = analyzer.analyze_current_status()
+    print(f"🧮 Mémoire des données:\n{format_memory_report({'snapshot': current_df})}")
     
     # 2. Génération des statistiques
     print("\n📈 Génération du rapport statistique...")
-    stats = analyzer.generate_statistics_report(current_df)
+    with profile_stage('statistics'):
+        stats = analyzer.generate_statistics_report(current_df)
     
     # 3. Affichage des résultats principaux
     print("\n" + "="*50)
@@ -268,17 +395,24 @@ def main():
     
     # 4. Création des visualisations
     print("\n📊 Création des visualisations...")
-    analyzer.create_visualizations(current_df)
+    with profile_stage('rendering'):
+        analyzer.create_visualizations(current_df, manifest=manifest)
     
     # 5. Export des données
     print("\n💾 Export des données...")
-    analyzer.export_data(current_df, stats)
+    with profile_stage('export'):
+        analyzer.export_data(current_df, stats, manifest=manifest)
+        written = export_summaries(current_df, stats, manifest=manifest)
+    print(f"✅ Résumés du site: {written} fichier(s) écrit(s) dans summary/")
+    manifest.save()
+    print(f"🧱 Build incrémental: {manifest.summary()}")
     
     # 6. Analyse temporelle d'une station exemple
     if len(current_df) > 0:
         sample_station = current_df.iloc[0]['id']
         print(f"\n⏰ Analyse temporelle de la station exemple: {sample_station}")
-        temporal_analysis = analyzer.analyze_temporal_patterns(sample_station, days=7)
+        with profile_stage('temporal_patterns'):
+            temporal_analysis = analyzer.analyze_temporal_patterns(sample_station, days=7)
         if temporal_analysis:
             print(f"🕐 Heure de pointe: {temporal_analysis['trends']['peak_hour']}h")
             print(f"🕐 Heure creuse: {temporal_analysis['trends']['low_hour']}h")
@@ -287,7 +421,8 @@ def main():
     print("📁 Fichiers générés:")
     print("   - velomagg_analysis.csv (données détaillées)")
     print("   - velomagg_analysis_stats.json (statistiques)")
+    print("   - summary/ (résumés par vue, .gz précompressés)")
     print("   - visualizations/ (graphiques)")
 
 if __name__ == "__main__":
-    main()
+    run_cli(main)
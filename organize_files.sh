@@ -8,28 +8,9 @@ echo "================================================"
 # Créer les répertoires nécessaires
 mkdir -p docs/data docs/reports docs/visualizations
 
-# Copier les fichiers HTML principaux
-echo "📋 Copie des visualisations..."
-cp dashboard_velomagg.html docs/ 2>/dev/null || echo "⚠️ dashboard_velomagg.html non trouvé"
-cp carte_velomagg.html docs/ 2>/dev/null || echo "⚠️ carte_velomagg.html non trouvé"
-cp temporal_analysis.html docs/ 2>/dev/null || echo "⚠️ temporal_analysis.html non trouvé"
-
-# Copier les données
-echo "📊 Copie des données..."
-cp velomagg_analysis.csv docs/data/ 2>/dev/null || echo "⚠️ velomagg_analysis.csv non trouvé"
-cp velomagg_analysis_stats.json docs/data/ 2>/dev/null || echo "⚠️ velomagg_analysis_stats.json non trouvé"
-
-# Copier les rapports
-echo "📄 Copie des rapports..."
-cp rapport_detaille.txt docs/reports/ 2>/dev/null || echo "⚠️ rapport_detaille.txt non trouvé"
-
-# Copier les visualisations statiques
-echo "🖼️ Copie des graphiques..."
-if [ -d "visualizations" ]; then
-    cp -r visualizations/* docs/visualizations/ 2>/dev/null || echo "⚠️ Aucune visualisation trouvée"
-else
-    echo "⚠️ Dossier visualizations non trouvé"
-fi
+# Publier les artefacts générés (seuls les fichiers modifiés sont copiés)
+echo "📋 Publication des artefacts modifiés..."
+python3 scripts/sync_site.py
 
 # Créer un fichier _config.yml pour GitHub Pages
 echo "⚙️ Configuration GitHub Pages..."
@@ -112,24 +93,6 @@ cat > docs/.gitignore << EOF
 *.log
 EOF
 
-# Créer un index.json pour l'API des données
-echo "🔧 Création de l'index API..."
-cat > docs/data/index.json << EOF
-{
-  "api": {
-    "version": "1.0",
-    "last_update": "$(date -u +"%Y-%m-%dT%H:%M:%SZ")",
-    "endpoints": {
-      "csv": "velomagg_analysis.csv",
-      "json": "velomagg_analysis_stats.json",
-      "reports": "../reports/rapport_detaille.txt",
-      "visualizations": "../visualizations/"
-    }
-  },
-  "description": "API des données VéloMAG Stats"
-}
-EOF
-
 # Afficher la structure finale
 echo ""
 echo "✅ Organisation terminée!"
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Profilage à la demande des points d'entrée (option --profile)
+CPU (cProfile + échantillonnage des piles), mémoire par étape (tracemalloc), rapports dans profiles/
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+PROFILE_FLAG = '--profile'
+PROFILE_DIR = "profiles"
+SAMPLE_INTERVAL = 0.005
+TOP_SITES = 10
+TOP_FUNCTIONS = 40
+
+_active: Optional['RunProfiler'] = None
+
+
+class StageStats:
+    """Temps et allocations cumulés d'une étape nommée"""
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.memory_delta = 0
+        self.peak = 0
+        self.sites: Counter = Counter()
+
+
+class RunProfiler:
+    """Profil d'une exécution complète, découpée en étapes (voir profile_stage)"""
+
+    def __init__(self, name: str, output_dir: str = PROFILE_DIR, interval: float = SAMPLE_INTERVAL):
+        self.name = name
+        self.output_dir = os.path.join(output_dir, f"{name}-{datetime.now():%Y%m%d-%H%M%S}")
+        self.interval = interval
+        self.cpu = cProfile.Profile()
+        self.stages: Dict[str, StageStats] = defaultdict(StageStats)
+        # Étapes en cours, par thread (seul le thread qui a démarré le profil en ouvre)
+        self.stage_stacks: Dict[int, List[str]] = defaultdict(list)
+        self.thread_id: Optional[int] = None
+        # Pics mémoire (absolus) des étapes ouvertes, le plus interne en dernier : tracemalloc n'a qu'un
+        # pic global, remis à zéro à l'entrée de chaque étape, que l'étape englobante doit retrouver
+        self._peaks: List[int] = []
+        self.stacks: Counter = Counter()
+        self.overhead = 0.0
+        self._bookkeeping = False
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def start(self):
+        self.thread_id = threading.get_ident()
+        tracemalloc.start()
+        self._sampler = threading.Thread(target=self._sample, name='profiler-sampler', daemon=True)
+        self._sampler.start()
+        self.started = time.perf_counter()
+        self.cpu.enable()
+
+    def stop(self):
+        self.cpu.disable()
+        self.elapsed = time.perf_counter() - self.started - self.overhead
+        self._stop.set()
+        self._sampler.join()
+        self.peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    def _sample(self):
+        """Échantillonne les piles de tous les threads (format « collapsed » des flamegraphs)"""
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            main_thread = threading.main_thread().ident
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or (thread_id == main_thread and self._bookkeeping):
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stages = [f"[{name}]" for name in self.stage_stacks.get(thread_id, ())]
+                root = [names.get(thread_id, str(thread_id))] + stages
+                self.stacks[';'.join(root + frames[::-1])] += 1
+
+    @contextmanager
+    def stage(self, name: str):
+        """Mesure le temps et les allocations d'une étape (cumulés si elle se répète)
+
+        Les instantanés tracemalloc sont pris hors profilage CPU et leur durée est déduite
+        des étapes englobantes : le rapport ne mesure que le programme.
+        """
+        stats = self.stages[name]
+        before, current_before = self._snapshot()
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+        self._peaks.append(0)
+        tracemalloc.reset_peak()
+        stage_stack = self.stage_stacks[threading.get_ident()]
+        stage_stack.append(name)
+        overhead_before = self.overhead
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats.seconds += time.perf_counter() - started - (self.overhead - overhead_before)
+            stage_stack.pop()
+            # Pic propre à l'étape, y compris ceux de ses sous-étapes (remises à zéro comprises)
+            peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+            after, current = self._snapshot()
+            bookkeeping = time.perf_counter()
+            self._pause()
+            stats.calls += 1
+            stats.memory_delta += current - current_before
+            stats.peak = max(stats.peak, peak - current_before)
+            for diff in after.compare_to(before, 'lineno'):
+                frame = diff.traceback[0]
+                if os.path.basename(frame.filename) not in ('tracemalloc.py', 'profiling.py'):
+                    stats.sites[f"{frame.filename}:{frame.lineno}"] += diff.size_diff
+            self._resume(bookkeeping)
+
+    def _pause(self):
+        self.cpu.disable()
+        self._bookkeeping = True
+
+    def _resume(self, paused_at: float):
+        self._bookkeeping = False
+        self.overhead += time.perf_counter() - paused_at
+        self.cpu.enable()
+
+    def _snapshot(self):
+        """Instantané mémoire (hors profilage CPU)"""
+        paused_at = time.perf_counter()
+        self._pause()
+        snapshot = tracemalloc.take_snapshot()
+        current = tracemalloc.get_traced_memory()[0]
+        self._resume(paused_at)
+        return snapshot, current
+
+    def hotspot_report(self) -> str:
+        """Rapport texte : étapes, sites d'allocation, fonctions les plus coûteuses"""
+        lines = [f"Profil de {self.name} - {self.elapsed:.2f} s, pic mémoire {self.peak / 2**20:.1f} Mo", ""]
+        lines.append("ÉTAPES (temps décroissant)")
+        for name, stats in sorted(self.stages.items(), key=lambda item: -item[1].seconds):
+            lines.append(f"  {name:<32} {stats.seconds:8.3f} s  {stats.calls:4d} appel(s)  "
+                         f"mémoire {stats.memory_delta / 2**20:+8.2f} Mo  pic {stats.peak / 2**20:8.2f} Mo")
+            for site, size in stats.sites.most_common(TOP_SITES):
+                if size > 0:
+                    lines.append(f"      {size / 1024:10.1f} Ko  {site}")
+        lines.append("")
+
+        for sort_key, title in (('cumulative', "TEMPS CUMULÉ"), ('tottime', "TEMPS PROPRE")):
+            stream = io.StringIO()
+            pstats.Stats(self.cpu, stream=stream).strip_dirs().sort_stats(sort_key).print_stats(TOP_FUNCTIONS)
+            lines.append(f"FONCTIONS - {title}")
+            lines.append(stream.getvalue())
+        return "\n".join(lines)
+
+    def write_reports(self) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.cpu.dump_stats(os.path.join(self.output_dir, 'cpu.pstats'))
+        with open(os.path.join(self.output_dir, 'hotspots.txt'), 'w', encoding='utf-8') as f:
+            f.write(self.hotspot_report())
+        with open(os.path.join(self.output_dir, 'stacks.folded'), 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        return self.output_dir
+
+
+@contextmanager
+def profile_stage(name: str):
+    """Délimite une étape du profil ; sans effet lorsque le profilage n'est pas actif
+
+    Les étapes ouvertes par d'autres threads (collecteur du serveur) sont ignorées : cProfile
+    et les pauses de RunProfiler ne concernent que le thread qui a démarré le profil.
+    Leurs piles restent visibles dans l'échantillonnage.
+    """
+    if _active is None or threading.get_ident() != _active.thread_id:
+        yield
+        return
+    with _active.stage(name):
+        yield
+
+
+def run_cli(entry_point: Callable, name: Optional[str] = None):
+    """Lance un point d'entrée, sous profilage si --profile figure dans la ligne de commande"""
+    global _active
+    if PROFILE_FLAG not in sys.argv:
+        return entry_point()
+
+    # Retiré avant le point d'entrée pour ne pas gêner son propre argparse
+    sys.argv.remove(PROFILE_FLAG)
+    profiler = RunProfiler(name or entry_point.__name__)
+    _active = profiler
+    profiler.start()
+    try:
+        with profiler.stage('total'):
+            return entry_point()
+    finally:
+        profiler.stop()
+        _active = None
+        output_dir = profiler.write_reports()
+        print(f"\n🔬 Profil écrit dans {output_dir}/ (hotspots.txt, stacks.folded, cpu.pstats)")
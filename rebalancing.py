@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Planification du rééquilibrage des stations Vélomagg
+Transforme l'état actuel du réseau en déplacements concrets de vélos
+"""
+
+import pandas as pd
+import numpy as np
+from typing import Dict, List, Any, Optional, Tuple
+
+from distances import DistanceCache
+
+
+class RebalancingPlanner:
+    """Planificateur de déplacements de vélos entre stations"""
+
+    def __init__(self, target_occupancy: float = 0.5, tolerance: float = 0.1,
+                 distances: Optional[DistanceCache] = None):
+        # Cible alignée sur le balance_score (occupation proche de 50% = optimal)
+        self.target_occupancy = target_occupancy
+        # Écart toléré (en fraction de capacité) avant de proposer un déplacement
+        self.tolerance = tolerance
+        # Matrice des distances partagée avec les autres analyses (persistée sur disque)
+        self.distances = distances if distances is not None else DistanceCache()
+
+    def distance_matrix(self, df: pd.DataFrame) -> np.ndarray:
+        """Retourne la matrice des distances entre stations, dans l'ordre du DataFrame"""
+        return self.distances.for_frame(df)
+
+    def compute_imbalances(self, df: pd.DataFrame) -> np.ndarray:
+        """Calcule l'excédent (>0) ou le déficit (<0) de vélos de chaque station"""
+        total_slots = df['total_slots'].to_numpy(dtype=np.int64)
+        available = df['available_bikes'].to_numpy(dtype=np.int64)
+
+        target = np.round(total_slots * self.target_occupancy).astype(np.int64)
+        imbalance = available - target
+
+        # Pas de déplacement pour les stations dans la bande de tolérance ou hors service
+        within_band = np.abs(imbalance) <= np.floor(total_slots * self.tolerance)
+        inactive = (df['status'] != 'working').to_numpy()
+        imbalance[within_band | inactive] = 0
+
+        return imbalance
+
+    def _shortest_paths(self, cost: np.ndarray, flow: np.ndarray, supply: np.ndarray, demand: np.ndarray,
+                        potentials: Dict[str, np.ndarray]):
+        """Dijkstra (coûts réduits par les potentiels) de la source au puits dans le graphe résiduel
+
+        Source -> donneur ayant encore des vélos (coût 0), donneur -> receveur (cost[i, j]),
+        receveur -> donneur lorsqu'un flux peut être défait (-cost[i, j]), receveur en déficit -> puits (0).
+        Retourne les distances, les prédécesseurs et le receveur relié au puits (-1 si inaccessible).
+        """
+        donor_potential, receiver_potential = potentials['donors'], potentials['receivers']
+        sink_potential = potentials['sink'][0]
+        n_donors, n_receivers = cost.shape
+        donor_dist = np.where(supply > 0, np.maximum(-donor_potential, 0.0), np.inf)
+        receiver_dist = np.full(n_receivers, np.inf)
+        sink_dist, target = np.inf, -1
+        donor_parent = np.full(n_donors, -1, dtype=np.int64)
+        receiver_parent = np.full(n_receivers, -1, dtype=np.int64)
+        donor_done = np.zeros(n_donors, dtype=bool)
+        receiver_done = np.zeros(n_receivers, dtype=bool)
+
+        while True:
+            donor_candidates = np.where(donor_done, np.inf, donor_dist)
+            receiver_candidates = np.where(receiver_done, np.inf, receiver_dist)
+            i = int(np.argmin(donor_candidates))
+            j = int(np.argmin(receiver_candidates))
+            nearest = min(donor_candidates[i], receiver_candidates[j])
+            if sink_dist <= nearest or nearest == np.inf:
+                return donor_dist, receiver_dist, sink_dist, donor_parent, receiver_parent, target
+
+            if donor_candidates[i] <= receiver_candidates[j]:
+                donor_done[i] = True
+                reduced = np.maximum(cost[i] + donor_potential[i] - receiver_potential, 0.0)
+                candidate = donor_dist[i] + reduced
+                better = ~receiver_done & (candidate < receiver_dist)
+                receiver_dist[better] = candidate[better]
+                receiver_parent[better] = i
+                continue
+
+            receiver_done[j] = True
+            if demand[j] > 0:
+                candidate = receiver_dist[j] + max(receiver_potential[j] - sink_potential, 0.0)
+                if candidate < sink_dist:
+                    sink_dist, target = candidate, j
+            # Arcs retour : vélos déjà affectés à ce receveur que l'on peut réaffecter
+            reduced = np.maximum(receiver_potential[j] - cost[:, j] - donor_potential, 0.0)
+            candidate = receiver_dist[j] + reduced
+            better = (flow[:, j] > 0) & ~donor_done & (candidate < donor_dist)
+            donor_dist[better] = candidate[better]
+            donor_parent[better] = j
+
+    def solve_transport(self, supply: np.ndarray, demand: np.ndarray,
+                        cost: np.ndarray) -> List[Tuple[int, int, int]]:
+        """Affecte les vélos des donneurs aux receveurs pour un coût total (vélos × km) minimal
+
+        Problème de transport résolu exactement par plus courts chemins successifs : chaque étape
+        achemine un maximum de vélos le long du chemin le moins coûteux du graphe résiduel
+        (en défaisant au besoin des affectations précédentes). Toute l'offre possible est affectée.
+        """
+        n_donors, n_receivers = cost.shape
+        if n_donors == 0 or n_receivers == 0:
+            return []
+
+        cost = np.asarray(cost, dtype=np.float64)
+        supply = np.asarray(supply, dtype=np.int64).copy()
+        demand = np.asarray(demand, dtype=np.int64).copy()
+        flow = np.zeros(cost.shape, dtype=np.int64)
+        # Potentiels nuls valides au départ : aucun arc de coût négatif sans flux
+        potentials = {'donors': np.zeros(n_donors), 'receivers': np.zeros(n_receivers), 'sink': np.zeros(1)}
+
+        while supply.any() and demand.any():
+            donor_dist, receiver_dist, sink_dist, donor_parent, receiver_parent, target = self._shortest_paths(
+                cost, flow, supply, demand, potentials)
+            if target < 0:
+                break
+
+            # Chemin source -> donneur -> ... -> receveur -> puits (arcs alternativement avant et retour)
+            forward, backward = [], []
+            j = target
+            while True:
+                i = int(receiver_parent[j])
+                forward.append((i, j))
+                if donor_parent[i] < 0:
+                    source = i
+                    break
+                j = int(donor_parent[i])
+                backward.append((i, j))
+
+            bikes = min(supply[source], demand[target], *(flow[i, j] for i, j in backward))
+            for i, j in forward:
+                flow[i, j] += bikes
+            for i, j in backward:
+                flow[i, j] -= bikes
+            supply[source] -= bikes
+            demand[target] -= bikes
+
+            # Potentiels plafonnés à la distance du puits : les coûts réduits restent positifs
+            potentials['donors'] += np.minimum(donor_dist, sink_dist)
+            potentials['receivers'] += np.minimum(receiver_dist, sink_dist)
+            potentials['sink'] += sink_dist
+
+        return [(int(i), int(j), int(flow[i, j])) for i, j in np.argwhere(flow > 0)]
+
+    def plan_moves(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Génère la liste des déplacements de vélos (station source -> station cible)"""
+        if df.empty:
+            return []
+
+        imbalance = self.compute_imbalances(df)
+        donors = np.flatnonzero(imbalance > 0)
+        receivers = np.flatnonzero(imbalance < 0)
+
+        # Seules les paires donneur × receveur sont extraites de la forme condensée
+        matrix = self.distances.get(df)
+        rows = matrix.rows_for(df['id'])
+        cost = matrix.submatrix(rows[donors], rows[receivers])
+        flows = self.solve_transport(imbalance[donors], -imbalance[receivers], cost)
+
+        ids = df['id'].to_numpy()
+        addresses = df['address'].to_numpy()
+        moves = []
+        for i, j, bikes in flows:
+            src, dst = donors[i], receivers[j]
+            moves.append({
+                'from_id': ids[src],
+                'from_address': addresses[src],
+                'to_id': ids[dst],
+                'to_address': addresses[dst],
+                'bikes': int(bikes),
+                'distance_km': float(cost[i, j])
+            })
+
+        # Les déplacements les plus importants en premier
+        moves.sort(key=lambda move: (-move['bikes'], move['distance_km']))
+        return moves
+
+    def summarize(self, moves: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Résume un plan de rééquilibrage"""
+        total_bikes = sum(move['bikes'] for move in moves)
+        return {
+            'moves': len(moves),
+            'bikes_moved': total_bikes,
+            'total_distance_km': sum(move['distance_km'] for move in moves),
+            'bike_km': sum(move['bikes'] * move['distance_km'] for move in moves)
+        }
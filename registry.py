@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Registre compact des stations Vélomagg
+Associe chaque identifiant NGSI (urn:ngsi-ld:station:...) à une clé entière dense
+"""
+
+import json
+import sys
+import pandas as pd
+import numpy as np
+from typing import Dict, List, Any, Iterable, Optional
+
+from schema import enforce_schema
+
+
+class StationRegistry:
+    """Clés entières et métadonnées statiques des stations (stockage en tableaux)"""
+
+    __slots__ = ('_keys', 'ids', 'addresses', 'localities', 'latitudes', 'longitudes', 'capacities')
+
+    def __init__(self, initial_capacity: int = 64):
+        self._keys: Dict[str, int] = {}
+        self.ids: List[str] = []
+        self.addresses: List[str] = []
+        self.localities: List[str] = []
+        self.latitudes = np.full(initial_capacity, np.nan, dtype=np.float32)
+        self.longitudes = np.full(initial_capacity, np.nan, dtype=np.float32)
+        self.capacities = np.zeros(initial_capacity, dtype=np.int16)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, station_id: str) -> bool:
+        return station_id in self._keys
+
+    def _grow(self, size: int):
+        """Agrandit les tableaux numériques (doublement de capacité)"""
+        if size <= len(self.latitudes):
+            return
+        new_size = max(size, 2 * len(self.latitudes))
+        extra = new_size - len(self.latitudes)
+        self.latitudes = np.concatenate([self.latitudes, np.full(extra, np.nan, dtype=np.float32)])
+        self.longitudes = np.concatenate([self.longitudes, np.full(extra, np.nan, dtype=np.float32)])
+        self.capacities = np.concatenate([self.capacities, np.zeros(extra, dtype=np.int16)])
+
+    def key(self, station_id: str) -> int:
+        """Clé entière d'une station déjà enregistrée"""
+        return self._keys[station_id]
+
+    def intern(self, station_id: str) -> int:
+        """Retourne la clé d'une station, en l'enregistrant si nécessaire"""
+        key = self._keys.get(station_id)
+        if key is None:
+            key = len(self.ids)
+            station_id = sys.intern(station_id)
+            self._keys[station_id] = key
+            self.ids.append(station_id)
+            self.addresses.append('')
+            self.localities.append('')
+            self._grow(key + 1)
+        return key
+
+    def keys(self, station_ids: Iterable[str]) -> np.ndarray:
+        """Clés d'une liste d'identifiants (-1 pour les stations inconnues)"""
+        get = self._keys.get
+        return np.fromiter((get(station_id, -1) for station_id in station_ids), dtype=np.int32)
+
+    def station_ids(self, keys: Iterable[int]) -> List[str]:
+        """Identifiants NGSI correspondant à des clés"""
+        return [self.ids[key] for key in keys]
+
+    def update(self, key: int, address: str, locality: str, latitude: float, longitude: float,
+               capacity: int):
+        """Met à jour les métadonnées statiques d'une station"""
+        self.addresses[key] = sys.intern(address)
+        self.localities[key] = sys.intern(locality)
+        self.latitudes[key] = latitude
+        self.longitudes[key] = longitude
+        self.capacities[key] = capacity
+
+    def register_frame(self, df: pd.DataFrame) -> np.ndarray:
+        """Enregistre les stations d'un DataFrame d'état et retourne leurs clés"""
+        keys = np.fromiter((self.intern(station_id) for station_id in df['id']), dtype=np.int32, count=len(df))
+        for key, address, locality in zip(keys.tolist(), df['address'], df['locality']):
+            self.addresses[key] = sys.intern(address)
+            self.localities[key] = sys.intern(locality)
+        self.latitudes[keys] = df['latitude'].to_numpy()
+        self.longitudes[keys] = df['longitude'].to_numpy()
+        self.capacities[keys] = df['total_slots'].to_numpy()
+        return keys
+
+    def metadata_frame(self, keys: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """Métadonnées statiques sous forme de DataFrame indexé par clé"""
+        if keys is None:
+            keys = np.arange(len(self), dtype=np.int32)
+        return enforce_schema(pd.DataFrame({
+            'station_key': keys,
+            'id': [self.ids[key] for key in keys],
+            'address': [self.addresses[key] for key in keys],
+            'locality': [self.localities[key] for key in keys],
+            'latitude': self.latitudes[keys],
+            'longitude': self.longitudes[keys],
+            'total_slots': self.capacities[keys]
+        }))
+
+    def save(self, path: str):
+        """Sauvegarde le registre (les clés doivent rester stables entre exécutions)"""
+        n = len(self)
+        data = {
+            'ids': self.ids,
+            'addresses': self.addresses,
+            'localities': self.localities,
+            'latitudes': self.latitudes[:n].tolist(),
+            'longitudes': self.longitudes[:n].tolist(),
+            'capacities': self.capacities[:n].tolist()
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> 'StationRegistry':
+        """Recharge un registre sauvegardé"""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        registry = cls(max(64, len(data['ids'])))
+        for station_id in data['ids']:
+            registry.intern(station_id)
+        registry.addresses = [sys.intern(value) for value in data['addresses']]
+        registry.localities = [sys.intern(value) for value in data['localities']]
+        n = len(registry)
+        registry.latitudes[:n] = data['latitudes']
+        registry.longitudes[:n] = data['longitudes']
+        registry.capacities[:n] = data['capacities']
+        return registry
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Données de relecture de la carte : occupation des stations encodée en deltas
+Un tableau compact par station, chargé une seule fois par le navigateur
+"""
+
+import base64
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Optional
+
+from history import StationHistory
+from timeline import to_epoch
+
+NOT_OBSERVED = -1
+
+
+def _window(history: StationHistory, start=None, end=None, step_minutes: Optional[int] = None):
+    """Colonnes de l'historique retenues pour la relecture (période et pas d'échantillonnage)"""
+    epochs = history.epochs
+    columns = np.arange(history.n_steps)
+    if start is not None:
+        columns = columns[epochs[columns] >= to_epoch(start)]
+    if end is not None:
+        columns = columns[epochs[columns] <= to_epoch(end)]
+    stride = max(1, (step_minutes or history.step_minutes) // history.step_minutes)
+    return columns[::stride], history.step_minutes * stride
+
+
+def encode_replay(history: StationHistory, df: pd.DataFrame, start=None, end=None,
+                  step_minutes: Optional[int] = 5) -> Dict[str, Any]:
+    """Encode l'historique des stations du snapshot pour la relecture
+
+    Par station : première valeur, indice de la première mesure, puis différences successives
+    (int8, ou int16 si une variation dépasse ±127) ; le tout en base64, station par station.
+    """
+    columns, step = _window(history, start, end, step_minutes)
+    if not len(columns):
+        raise ValueError("Aucun pas de temps sur la période demandée")
+    rows = history.rows_for(df['station_key'].to_numpy())
+    present = rows >= 0
+
+    values = np.full((len(df), len(columns)), np.nan, dtype=np.float32)
+    values[present] = history.values[rows[present]][:, columns]
+    observed = ~np.isnan(values)
+    first = np.where(observed.any(axis=1), observed.argmax(axis=1), NOT_OBSERVED)
+
+    # Report de la dernière mesure sur les pas manquants ; avant la première, valeur de celle-ci
+    idx = np.where(observed, np.arange(len(columns)), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    idx = np.maximum(idx, np.maximum(first, 0)[:, None])
+    values = values[np.arange(len(df))[:, None], idx]
+    counts = np.nan_to_num(values, nan=0).astype(np.int16)
+
+    deltas = np.diff(counts, axis=1)
+    dtype = np.int8 if np.abs(deltas).max(initial=0) <= 127 else np.int16
+
+    return {
+        'start': int(history.epochs[columns[0]]),
+        'step': step * 60,
+        'frames': len(columns),
+        'dtype': np.dtype(dtype).name,
+        'base': counts[:, 0].tolist(),
+        'first': first.tolist(),
+        'capacity': df['total_slots'].astype(int).tolist(),
+        'latitude': df['latitude'].round(6).tolist(),
+        'longitude': df['longitude'].round(6).tolist(),
+        'address': df['address'].str[:40].tolist(),
+        'deltas': base64.b64encode(np.ascontiguousarray(deltas, dtype=dtype).tobytes()).decode('ascii')
+    }
+
+
+def decode_replay(payload: Dict[str, Any]) -> np.ndarray:
+    """Décodage de référence (stations × images), -1 avant la première mesure"""
+    n_stations = len(payload['base'])
+    deltas = np.frombuffer(base64.b64decode(payload['deltas']), dtype=payload['dtype'])
+    deltas = deltas.reshape(n_stations, payload['frames'] - 1).astype(np.int32)
+    counts = np.concatenate([np.asarray(payload['base'], dtype=np.int32)[:, None], deltas], axis=1)
+    counts = np.cumsum(counts, axis=1)
+    before_first = np.arange(payload['frames'])[None, :] < np.asarray(payload['first'])[:, None]
+    counts[before_first | (np.asarray(payload['first']) == NOT_OBSERVED)[:, None]] = NOT_OBSERVED
+    return counts
@@ -23,6 +23,10 @@ case "${1:-help}" in
         echo "🔬 Lancement de l'analyse avancée..."
         $VENV_PATH advanced_analytics.py
         ;;
+    "serve")
+        echo "🌐 Lancement du serveur de statistiques..."
+        $VENV_PATH server.py
+        ;;
     "notebook")
         echo "📓 Ouverture du notebook Jupyter..."
         echo "Utilisez VS Code pour ouvrir: velomagg_analysis.ipynb"
@@ -53,6 +57,7 @@ case "${1:-help}" in
         echo "  ./run.sh setup     - Configuration initiale"
         echo "  ./run.sh analyze   - Analyse standard"
         echo "  ./run.sh advanced  - Analyse avancée"
+        echo "  ./run.sh serve     - Serveur de statistiques local"
         echo "  ./run.sh notebook  - Notebook Jupyter"
         echo "  ./run.sh install   - Installer dépendances"
         echo "  ./run.sh clean     - Nettoyer fichiers"
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Schéma compact des DataFrames de stations
+Catégories pour les chaînes répétées, petits entiers, float32, horodatages datetime64
+"""
+
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from timestamps import decode_timestamps, to_datetime64
+
+# Format des horodatages de l'API (2025-08-03T19:06:17.000Z)
+API_TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'
+# Décimales conservées à l'export JSON des colonnes float32
+JSON_DECIMALS = 6
+
+STATION_DTYPES = {
+    'station_key': np.int32,
+    # Réseau d'origine (collecte multi-systèmes)
+    'system': 'category',
+    'locality': 'category',
+    'status': 'category',
+    'available_bikes': np.int16,
+    'free_slots': np.int16,
+    'total_slots': np.int16,
+    'latitude': np.float32,
+    'longitude': np.float32,
+    # Instant UTC sans fuseau, à la seconde (comme StationHistory)
+    'last_update': 'datetime64[s]',
+    'occupancy_rate': np.float32,
+    'utilization_rate': np.float32,
+    'balance_score': np.float32,
+    'availability_score': np.float32,
+    'efficiency_score': np.float32,
+}
+
+INTEGER_COLUMNS = [column for column, dtype in STATION_DTYPES.items()
+                   if dtype != 'category' and np.issubdtype(np.dtype(dtype), np.integer)]
+
+
+def parse_timestamps(values: Iterable) -> np.ndarray:
+    """Horodatages ISO de l'API -> datetime64[s] UTC (NaT si absent ou invalide)"""
+    return to_datetime64(decode_timestamps(values))
+
+
+def enforce_schema(df: pd.DataFrame, dtypes: Optional[Dict[str, object]] = None) -> pd.DataFrame:
+    """Convertit les colonnes connues vers le schéma compact (en place, retourne le DataFrame)"""
+    dtypes = STATION_DTYPES if dtypes is None else dtypes
+    for column, dtype in dtypes.items():
+        if column not in df or df[column].dtype == dtype:
+            continue
+        if dtype == 'datetime64[s]' and not pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = parse_timestamps(df[column])
+        elif column in INTEGER_COLUMNS and df[column].isna().any():
+            # Valeurs manquantes : float32 plutôt qu'un entier impossible
+            df[column] = df[column].astype(np.float32)
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def json_default(value):
+    """Conversion des types NumPy/pandas du schéma pour la sérialisation JSON"""
+    if value is pd.NaT:
+        return None
+    if isinstance(value, np.floating):
+        # Plus courte représentation du float32 (43.605366 et non 43.60536575317383)
+        return float(str(value))
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def json_records(df: pd.DataFrame) -> list:
+    """Enregistrements prêts pour JSON (float32 arrondis, sans bruit de conversion en float64)"""
+    floats = [column for column, dtype in df.dtypes.items() if dtype == np.float32]
+    if floats:
+        df = df.astype({column: np.float64 for column in floats}).round({column: JSON_DECIMALS for column in floats})
+    return df.to_dict('records')
+
+
+def frame_memory(df: pd.DataFrame) -> int:
+    """Taille mémoire réelle d'un DataFrame (chaînes comprises)"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def memory_report(frames: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Occupation mémoire de plusieurs DataFrames : total et par ligne"""
+    rows = []
+    for name, df in frames.items():
+        size = frame_memory(df)
+        rows.append({'frame': name, 'rows': len(df), 'columns': df.shape[1],
+                     'bytes': size, 'bytes_per_row': size / len(df) if len(df) else 0.0})
+    return pd.DataFrame(rows)
+
+
+def format_memory_report(frames: Dict[str, pd.DataFrame]) -> str:
+    return "\n".join(f"   {row.frame:<20} {row.rows:6d} lignes  {row.bytes / 1024:8.1f} Ko  "
+                     f"({row.bytes_per_row:.0f} o/ligne)"
+                     for row in memory_report(frames).itertuples())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark du codec d'historique : taux de compression et débit de décodage
+Sur un fichier d'historique (history_store.py) ou, à défaut, sur une semaine simulée
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+# Ajouter le répertoire parent au path pour importer les modules du projet
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from codec import MISSING, decode_series, encode_series
+
+
+def simulated_history(n_stations: int = 60, days: int = 7, step_seconds: int = 60, seed: int = 0):
+    """Comptages réalistes : longues plages constantes, quelques départs/arrivées, trous de collecte"""
+    rng = np.random.default_rng(seed)
+    n_ticks = days * 86400 // step_seconds
+    timestamps = 1754006400 + np.arange(n_ticks, dtype=np.int64) * step_seconds
+    changes = rng.random((n_ticks, n_stations)) < 0.03
+    steps = np.where(changes, rng.choice([-1, 1], size=(n_ticks, n_stations)), 0)
+    matrix = np.clip(8 + np.cumsum(steps, axis=0), 0, 20).astype(np.int64)
+    matrix[rng.random((n_ticks, n_stations)) < 0.001] = MISSING
+    return timestamps, matrix
+
+
+def load_history(path: str):
+    from history_store import HistoryFile
+    history = HistoryFile(path)
+    keys = history.station_keys
+    return history.timestamps(), np.asarray(history.matrix()[:, history.columns_for(keys)], dtype=np.int64)
+
+
+def benchmark(timestamps: np.ndarray, matrix: np.ndarray, repeat: int = 3):
+    n_ticks, n_stations = matrix.shape
+    samples = n_ticks * n_stations
+
+    start = time.perf_counter()
+    streams = [encode_series(timestamps, matrix[:, column]) for column in range(n_stations)]
+    encode_seconds = time.perf_counter() - start
+
+    decode_seconds = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        decoded = [decode_series(stream) for stream in streams]
+        decode_seconds = min(decode_seconds, time.perf_counter() - start)
+
+    for column, (_, values) in enumerate(decoded):
+        if not np.array_equal(values, matrix[:, column]):
+            raise AssertionError(f"Décodage incorrect pour la colonne {column}")
+
+    encoded = sum(len(stream) for stream in streams)
+    # Références : int64 + int16 par mesure (NumPy), réponse JSON de l'API
+    raw = samples * (8 + 2)
+    index = [f"{stamp}Z" for stamp in np.datetime_as_string(timestamps.astype('datetime64[s]'), unit='ms')]
+    json_size = sum(len(json.dumps({'index': index,
+                                    'values': matrix[:, column].tolist()}))
+                    for column in range(min(n_stations, 5))) * n_stations / min(n_stations, 5)
+
+    print(f"📦 {n_stations} stations × {n_ticks} mesures = {samples:,} échantillons")
+    print(f"   Taille encodée:    {encoded / 1024:,.1f} Ko")
+    print(f"   Compression:       ×{raw / encoded:,.1f} (vs NumPy int64+int16), "
+          f"×{json_size / encoded:,.1f} (vs JSON)")
+    print(f"   Encodage:          {samples / encode_seconds / 1e6:,.1f} M échantillons/s")
+    print(f"   Décodage:          {samples / decode_seconds / 1e6:,.1f} M échantillons/s "
+          f"({raw / decode_seconds / 2**20:,.0f} Mo/s décompressés)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du codec d'historique")
+    parser.add_argument('history', nargs='?', help="Fichier d'historique (history_store.py)")
+    parser.add_argument('--stations', type=int, default=60)
+    parser.add_argument('--days', type=int, default=7)
+    args = parser.parse_args()
+
+    if args.history:
+        timestamps, matrix = load_history(args.history)
+    else:
+        timestamps, matrix = simulated_history(args.stations, args.days)
+    benchmark(timestamps, matrix)
+
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,7 @@ def test_imports():
         ("seaborn", "Visualisations statistiques"),
         ("plotly", "Graphiques interactifs"),
         ("folium", "Cartes interactives"),
+        ("aiohttp", "Requêtes HTTP asynchrones"),
         ("json", "Parsing JSON"),
         ("datetime", "Gestion des dates"),
         ("urllib.parse", "Parsing d'URLs"),
@@ -62,7 +62,7 @@ def clean_export_files():
 def clean_directories():
     """Supprime les répertoires temporaires"""
     print("📁 Suppression des répertoires temporaires...")
-    dirs_to_clean = ['exports', 'reports', 'visualizations', 'logs', '__pycache__']
+    dirs_to_clean = ['exports', 'reports', 'visualizations', 'summary', 'profiles', 'cache', 'logs', '__pycache__']
     
     count = 0
     for dir_name in dirs_to_clean:
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Publication incrémentale des artefacts générés vers docs/
+Ne copie que les fichiers dont le contenu a changé (voir build_cache.py)
+"""
+
+import glob
+import json
+import os
+import shutil
+import sys
+from datetime import datetime, timezone
+
+# Ajouter le répertoire parent au path pour importer les modules du projet
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from build_cache import BuildManifest, hash_file, write_if_changed
+
+# Fichiers générés à la racine -> emplacement dans le site
+ARTIFACTS = {
+    'dashboard_velomagg.html': 'dashboard_velomagg.html',
+    'carte_velomagg.html': 'carte_velomagg.html',
+    'temporal_analysis.html': 'temporal_analysis.html',
+    'velomagg_analysis.csv': 'data/velomagg_analysis.csv',
+    'velomagg_analysis_stats.json': 'data/velomagg_analysis_stats.json',
+    'rapport_detaille.txt': 'reports/rapport_detaille.txt',
+}
+
+
+def sync_site() -> int:
+    """Publie les artefacts modifiés et retourne le nombre de fichiers copiés"""
+    manifest = BuildManifest()
+    copied = []
+
+    # 1. Artefacts suivis par le manifeste : seule la sortie du dernier build est publiée
+    for artifact in sorted(manifest.entries):
+        if manifest.publish(artifact):
+            copied.append(artifact)
+
+    # 2. Autres fichiers générés : copie si le contenu diffère
+    artifacts = dict(ARTIFACTS)
+    for source in glob.glob('visualizations/*.png'):
+        artifacts[source] = f"visualizations/{os.path.basename(source)}"
+
+    for source, artifact in artifacts.items():
+        if artifact in manifest.entries or not os.path.exists(source):
+            continue
+        target = manifest.site_path(artifact)
+        if hash_file(source) != hash_file(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(source, target)
+            copied.append(artifact)
+
+    for artifact in copied:
+        print(f"📋 {artifact}")
+
+    # L'index des données n'est réécrit que si des données ont changé
+    index_path = manifest.site_path('data/index.json')
+    if copied or not os.path.exists(index_path):
+        index = {
+            "api": {
+                "version": "1.0",
+                "last_update": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "endpoints": {
+                    "csv": "velomagg_analysis.csv",
+                    "json": "velomagg_analysis_stats.json",
+                    "summary": "summary/",
+                    "reports": "../reports/rapport_detaille.txt",
+                    "visualizations": "../visualizations/"
+                }
+            },
+            "description": "API des données VéloMAG Stats"
+        }
+        write_if_changed(index_path, (json.dumps(index, indent=2, ensure_ascii=False) + "\n").encode('utf-8'))
+
+    print(f"✅ {len(copied)} fichier(s) publié(s) dans {manifest.site_dir}/")
+    return len(copied)
+
+
+if __name__ == "__main__":
+    sync_site()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Serveur HTTP local des statistiques Vélomagg
+Expose des endpoints JSON précalculés à partir du snapshot du collecteur
+"""
+
+import argparse
+import json
+import threading
+import urllib.parse
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Any, Optional
+
+from main import VelomaggAnalyzer
+from advanced_analytics import AdvancedAnalytics
+from collector import StationCollector
+from timeline import NetworkTimeline
+from profiling import profile_stage, run_cli
+from schema import json_default, json_records
+
+# Colonnes exposées pour l'état d'une station
+STATION_FIELDS = ['station_key', 'id', 'address', 'locality', 'available_bikes', 'free_slots',
+                  'total_slots', 'status', 'latitude', 'longitude', 'last_update', 'occupancy_rate']
+
+
+def encode_json(payload: Any) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, default=json_default).encode('utf-8')
+
+
+class HourlyProfiles:
+    """Profils horaires de disponibilité accumulés à chaque tick (station × heure)"""
+
+    def __init__(self):
+        self.sums = np.zeros((0, 24), dtype=np.float64)
+        self.counts = np.zeros((0, 24), dtype=np.int64)
+
+    def update(self, snapshot: pd.DataFrame, timestamp: datetime):
+        keys = snapshot['station_key'].to_numpy(dtype=np.int64)
+        size = int(keys.max(initial=-1)) + 1
+        if size > len(self.sums):
+            extra = size - len(self.sums)
+            self.sums = np.vstack([self.sums, np.zeros((extra, 24))])
+            self.counts = np.vstack([self.counts, np.zeros((extra, 24), dtype=np.int64)])
+        self.sums[keys, timestamp.hour] += snapshot['available_bikes'].to_numpy()
+        self.counts[keys, timestamp.hour] += 1
+
+    def means(self) -> np.ndarray:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.sums / self.counts
+
+    def to_payload(self) -> Dict[str, Any]:
+        means = self.means()
+        network = self.sums.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            network_mean = network / np.maximum(self.counts.max(axis=0, initial=0), 1)
+
+        def as_hours(row):
+            return {hour: round(float(value), 2) for hour, value in enumerate(row) if not np.isnan(value)}
+
+        observed = self.counts.sum(axis=0) > 0
+        return {
+            'network': {
+                'pattern': as_hours(np.where(observed, network_mean, np.nan)),
+                # Heure où le moins de vélos sont disponibles sur le réseau = pointe d'usage
+                'peak_hour': int(np.argmin(np.where(observed, network_mean, np.inf))) if observed.any() else None
+            },
+            'stations': {int(key): as_hours(row) for key, row in enumerate(means) if self.counts[key].any()}
+        }
+
+
+class StatsCache:
+    """Réponses JSON précalculées, rafraîchies à chaque tick du collecteur"""
+
+    def __init__(self, analyzer: VelomaggAnalyzer, advanced: AdvancedAnalytics,
+                 timeline: Optional[NetworkTimeline] = None):
+        self.analyzer = analyzer
+        self.advanced = advanced
+        self.timeline = timeline
+        self.profiles = HourlyProfiles()
+        self.responses: Dict[str, bytes] = {}
+        self.station_responses: Dict[int, bytes] = {}
+        self.last_refresh: Optional[datetime] = None
+
+    def refresh(self, changed: pd.DataFrame, snapshot: pd.DataFrame, timestamp: datetime):
+        """Recalcule les réponses (abonné du collecteur)"""
+        with profile_stage('refresh_statistics'):
+            stats = self.analyzer.generate_statistics_report(snapshot)
+            problems = self.advanced.identify_problem_stations(snapshot)
+            self.profiles.update(snapshot, timestamp)
+
+        # Seules les stations modifiées sont réencodées
+        station_responses = dict(self.station_responses)
+        for record in json_records(changed[STATION_FIELDS]):
+            station_responses[int(record['station_key'])] = encode_json(record)
+        # Stations retirées en amont : leur réponse disparaît avec elles
+        live_keys = set(snapshot['station_key'].astype(int))
+        if len(live_keys) != len(station_responses):
+            station_responses = {key: response for key, response in station_responses.items()
+                                 if key in live_keys}
+
+        responses = {
+            '/api/summary': encode_json({
+                'updated_at': timestamp,
+                'general': stats['general'],
+                'distribution': stats['distribution'],
+                'validation': self.analyzer.validation.to_dict()
+            }),
+            '/api/stations': encode_json({
+                'updated_at': timestamp,
+                'stations': json_records(snapshot[STATION_FIELDS])
+            }),
+            '/api/problems': encode_json({
+                'updated_at': timestamp,
+                'problems': {
+                    name: [{field: station[field] for field in ('station_key', 'id', 'address',
+                                                                 'available_bikes', 'free_slots')}
+                           for station in stations]
+                    for name, stations in problems.items()
+                }
+            }),
+            '/api/peaks': encode_json({'updated_at': timestamp, **self.profiles.to_payload()})
+        }
+
+        # Remplacement atomique des références lues par les threads du serveur
+        self.station_responses = station_responses
+        self.responses = responses
+        self.last_refresh = timestamp
+
+    def lookup(self, path: str) -> Optional[bytes]:
+        """Retourne la réponse précalculée d'un chemin (None si inconnu)"""
+        path, _, query = path.partition('?')
+        path = path.rstrip('/')
+        if path == '/api/state' and self.timeline is not None:
+            return self.state_at(query)
+        if path.startswith('/api/stations/'):
+            key = path.rsplit('/', 1)[1]
+            return self.station_responses.get(int(key)) if key.isdigit() else None
+        if path == '/api/health':
+            return encode_json({'last_refresh': self.last_refresh, 'stations': len(self.station_responses)})
+        return self.responses.get(path)
+
+    def state_at(self, query: str) -> Optional[bytes]:
+        """État du réseau à un instant passé (/api/state?at=2025-08-03T19:00:00), calculé à la demande"""
+        params = urllib.parse.parse_qs(query)
+        if 'at' not in params:
+            return None
+        try:
+            df = self.timeline.state_at(params['at'][0])
+        except ValueError:
+            return None
+        return encode_json({'at': params['at'][0], 'stations': json_records(df[STATION_FIELDS])})
+
+
+def make_handler(cache: StatsCache):
+    """Crée la classe de handler HTTP liée au cache"""
+
+    class StatsRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = cache.lookup(self.path)
+            status = 200
+            if body is None:
+                status = 404
+                body = encode_json({'error': 'not found', 'path': self.path})
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StatsRequestHandler
+
+
+def serve(host: str = '127.0.0.1', port: int = 8000, interval: float = 60):
+    """Lance le collecteur en tâche de fond et le serveur HTTP"""
+    analyzer = VelomaggAnalyzer()
+    advanced = AdvancedAnalytics(analyzer)
+    timeline = NetworkTimeline(analyzer.registry)
+    cache = StatsCache(analyzer, advanced, timeline)
+
+    collector = StationCollector(analyzer, interval=interval)
+    collector.subscribe(timeline.record)
+    collector.subscribe(cache.refresh)
+    collector.tick()
+
+    thread = threading.Thread(target=collector.run, daemon=True)
+    thread.start()
+
+    server = ThreadingHTTPServer((host, port), make_handler(cache))
+    print(f"🌐 Serveur de statistiques: http://{host}:{port}/api/summary")
+    print("   Endpoints: /api/summary, /api/stations, /api/stations/<clé>, /api/problems, /api/peaks, /api/state?at=<date>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹️ Arrêt du serveur")
+    finally:
+        server.server_close()
+
+
+def main_serve():
+    """Fonction principale du mode serveur"""
+    parser = argparse.ArgumentParser(description="Serveur HTTP des statistiques Vélomagg")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--interval', type=float, default=60, help="Intervalle de collecte (secondes)")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.interval)
+
+
+if __name__ == "__main__":
+    run_cli(main_serve)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Snapshot des stations avec métriques dérivées calculées à la demande
+Évite de recopier et recalculer les scores d'efficacité à chaque analyse
+"""
+
+import pandas as pd
+import numpy as np
+from functools import cached_property
+from typing import Dict, Optional
+
+from schema import enforce_schema
+
+# Seuils de détection des stations problématiques
+LOW_EFFICIENCY_THRESHOLD = 0.3
+OVERSIZED_THRESHOLD = 0.1
+UNDERSIZED_THRESHOLD = 0.9
+
+
+class StationSnapshot:
+    """État du réseau à un instant donné et ses métriques dérivées (mémoïsées)"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.frame = df
+
+    def matches(self, df: pd.DataFrame) -> bool:
+        """Indique si le snapshot correspond toujours à ce DataFrame
+
+        Comparaison d'identité : un DataFrame modifié en place n'est pas détecté.
+        Les DataFrames d'état sont traités comme immuables (le collecteur en construit un nouveau
+        à chaque changement) ; après une modification en place, appeler SnapshotCache.invalidate().
+        """
+        return df is self.frame
+
+    def _rate(self, numerator: pd.Series) -> pd.Series:
+        """Rapport à la capacité ; 0 pour les stations de capacité nulle (comme build_status_frame)"""
+        total = self.frame['total_slots'].to_numpy(dtype=np.float64)
+        return pd.Series(np.divide(numerator.to_numpy(dtype=np.float64), total,
+                                   out=np.zeros(len(total)), where=total > 0),
+                         index=self.frame.index)
+
+    @cached_property
+    def occupancy_rate(self) -> pd.Series:
+        if 'occupancy_rate' in self.frame:
+            return self.frame['occupancy_rate']
+        return self._rate(self.frame['available_bikes'])
+
+    @cached_property
+    def utilization_rate(self) -> pd.Series:
+        if 'utilization_rate' in self.frame:
+            return self.frame['utilization_rate']
+        return self._rate(self.frame['total_slots'] - self.frame['free_slots'])
+
+    @cached_property
+    def balance_score(self) -> pd.Series:
+        """Score d'équilibre (proche de 50% = optimal)"""
+        return 1 - abs(self.occupancy_rate - 0.5) * 2
+
+    @cached_property
+    def availability_score(self) -> pd.Series:
+        """Score de disponibilité (évite les stations vides/pleines)"""
+        return pd.Series(
+            np.where((self.frame['available_bikes'] == 0) | (self.frame['free_slots'] == 0), 0, 1),
+            index=self.frame.index
+        )
+
+    @cached_property
+    def efficiency_score(self) -> pd.Series:
+        return (
+            self.balance_score * 0.4 +
+            self.availability_score * 0.3 +
+            self.utilization_rate * 0.3
+        )
+
+    @cached_property
+    def efficiency_frame(self) -> pd.DataFrame:
+        """Snapshot enrichi des colonnes d'efficacité (construit une seule fois)"""
+        return enforce_schema(self.frame.assign(
+            utilization_rate=self.utilization_rate,
+            balance_score=self.balance_score,
+            availability_score=self.availability_score,
+            efficiency_score=self.efficiency_score
+        ))
+
+    @cached_property
+    def problem_masks(self) -> Dict[str, pd.Series]:
+        """Masques booléens des stations problématiques"""
+        return {
+            'always_empty': self.frame['available_bikes'] == 0,
+            'always_full': self.frame['free_slots'] == 0,
+            'low_efficiency': self.efficiency_score < LOW_EFFICIENCY_THRESHOLD,
+            'inactive': self.frame['status'] != 'working',
+            'oversized': self.utilization_rate < OVERSIZED_THRESHOLD,
+            'undersized': self.utilization_rate > UNDERSIZED_THRESHOLD
+        }
+
+    @cached_property
+    def problem_counts(self) -> Dict[str, int]:
+        return {name: int(mask.sum()) for name, mask in self.problem_masks.items()}
+
+    def problem_records(self, name: str) -> list:
+        """Stations d'une catégorie de problème, au format enregistrement"""
+        return self.efficiency_frame[self.problem_masks[name]].to_dict('records')
+
+
+class SnapshotCache:
+    """Conserve le dernier snapshot et l'invalide quand le DataFrame source change"""
+
+    def __init__(self):
+        self._snapshot: Optional[StationSnapshot] = None
+
+    def get(self, df: pd.DataFrame) -> StationSnapshot:
+        if self._snapshot is None or not self._snapshot.matches(df):
+            self._snapshot = StationSnapshot(df)
+        return self._snapshot
+
+    def invalidate(self):
+        self._snapshot = None
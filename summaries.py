@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Résumés JSON par vue pour le site statique (docs/data/summary/)
+Petits fichiers au schéma stable, précompressés en gzip (et brotli si disponible)
+"""
+
+import gzip
+import json
+import os
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+
+from build_cache import BuildManifest, hash_inputs, write_if_changed
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# À incrémenter à chaque changement incompatible de la structure des fichiers
+SCHEMA_VERSION = 1
+SUMMARY_DIR = "summary"
+EXTREME_FIELDS = ['id', 'address', 'locality', 'available_bikes', 'total_slots', 'occupancy_rate']
+OCCUPANCY_BINS = [0, 0.1, 0.3, 0.5, 0.7, 0.9, 1.0001]
+
+
+def _station(row: pd.Series) -> Dict[str, Any]:
+    return {
+        'id': row['id'],
+        'address': row['address'],
+        'locality': row['locality'],
+        'available_bikes': int(row['available_bikes']),
+        'total_slots': int(row['total_slots']),
+        'occupancy_rate': round(float(row['occupancy_rate']), 4)
+    }
+
+
+def build_view_summaries(df: pd.DataFrame, stats: Dict[str, Any],
+                         updated_at: Optional[datetime] = None) -> Dict[str, Dict[str, Any]]:
+    """Un document par vue du site : chiffres clés, extrêmes, distribution, communes"""
+    updated_at = (updated_at or datetime.now(timezone.utc)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    general = stats['general']
+    header = {'schema': SCHEMA_VERSION, 'updated_at': updated_at}
+
+    occupancy_counts = np.histogram(df['occupancy_rate'].fillna(0).clip(0, 1), bins=OCCUPANCY_BINS)[0]
+    localities = df.groupby('locality', sort=True).agg(
+        stations=('id', 'size'),
+        bikes=('available_bikes', 'sum'),
+        capacity=('total_slots', 'sum')
+    )
+
+    return {
+        'overview': {
+            **header,
+            'total_stations': int(general['total_stations']),
+            'working_stations': int(general['working_stations']),
+            'total_bikes': int(general['total_bikes']),
+            'total_capacity': int(general['total_capacity']),
+            'average_occupancy': round(float(general['average_occupancy']), 4),
+            'median_occupancy': round(float(general['median_occupancy']), 4)
+        },
+        'extremes': {
+            **header,
+            **{name: _station(df.loc[index]) for name, index in (
+                ('most_occupied', df['occupancy_rate'].idxmax()),
+                ('least_occupied', df['occupancy_rate'].idxmin()),
+                ('largest_station', df['total_slots'].idxmax()),
+                ('smallest_station', df['total_slots'].idxmin())
+            )}
+        },
+        'distribution': {
+            **header,
+            'occupancy_bins': [0, 0.1, 0.3, 0.5, 0.7, 0.9, 1.0],
+            'occupancy_counts': occupancy_counts.tolist(),
+            'bikes_per_station': {
+                'mean': round(float(df['available_bikes'].mean()), 2),
+                'min': int(df['available_bikes'].min()),
+                'max': int(df['available_bikes'].max())
+            }
+        },
+        'localities': {
+            **header,
+            'localities': [
+                {'locality': locality, 'stations': int(row['stations']), 'bikes': int(row['bikes']),
+                 'capacity': int(row['capacity']),
+                 'occupancy_rate': round(row['bikes'] / row['capacity'], 4) if row['capacity'] else 0.0}
+                for locality, row in localities.iterrows()
+            ]
+        }
+    }
+
+
+def compressed_variants(data: bytes) -> Dict[str, bytes]:
+    """Contenu brut et variantes précompressées (gzip déterministe : mtime=0)"""
+    variants = {'': data, '.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    return variants
+
+
+def export_summaries(df: pd.DataFrame, stats: Dict[str, Any], output_dir: str = SUMMARY_DIR,
+                     manifest: Optional[BuildManifest] = None) -> int:
+    """Écrit les résumés et leurs variantes compressées ; retourne le nombre de fichiers écrits"""
+    written = 0
+    for view, summary in build_view_summaries(df, stats).items():
+        # L'horodatage ne compte pas dans l'empreinte : une vue inchangée n'est pas republiée
+        input_hash = hash_inputs(view, {key: value for key, value in summary.items() if key != 'updated_at'})
+        artifact = f"data/{SUMMARY_DIR}/{view}.json"
+        if manifest is not None and not manifest.should_build(artifact, input_hash):
+            continue
+        data = json.dumps(summary, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        for suffix, content in compressed_variants(data).items():
+            path = os.path.join(output_dir, f"{view}.json{suffix}")
+            written += write_if_changed(path, content)
+            if manifest is not None:
+                manifest.record(artifact + suffix, path, input_hash)
+    return written
@@ -0,0 +1,99 @@
+"""
+Collecte multi-réseaux sur des flux locaux (NGSI de Montpellier et GBFS)
+"""
+
+import json
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feeds import GbfsFeed, MontpellierNgsiFeed, MultiSystemCollector
+from main import VelomaggAnalyzer
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'feeds')
+
+
+@pytest.fixture
+def feed_dir(tmp_path):
+    # Copie modifiable : la détection des changements repose sur la date de modification des fichiers
+    return shutil.copytree(FIXTURES, tmp_path / 'feeds')
+
+
+@pytest.fixture
+def collector(feed_dir):
+    feeds = [
+        MontpellierNgsiFeed(url=str(feed_dir / 'ngsi' / 'bikestation.json')),
+        GbfsFeed('lyon', str(feed_dir / 'gbfs' / 'gbfs.json'))
+    ]
+    return MultiSystemCollector(feeds, VelomaggAnalyzer(registry_path=None), interval=0)
+
+
+def rewrite_status(feed_dir, update):
+    """Modifie station_status.json et avance sa date de modification"""
+    path = feed_dir / 'gbfs' / 'station_status.json'
+    document = json.loads(path.read_text(encoding='utf-8'))
+    update(document['data']['stations'])
+    path.write_text(json.dumps(document), encoding='utf-8')
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_tick_normalizes_both_layouts(collector):
+    changed = collector.tick()
+
+    assert set(changed['id']) == {'urn:ngsi-ld:station:001', 'urn:ngsi-ld:station:002', 'lyon:10', 'lyon:11'}
+    assert dict(zip(changed['id'], changed['system'])) == {
+        'urn:ngsi-ld:station:001': 'montpellier', 'urn:ngsi-ld:station:002': 'montpellier',
+        'lyon:10': 'lyon', 'lyon:11': 'lyon'
+    }
+    part_dieu = changed.set_index('id').loc['lyon:11']
+    # GBFS 3 : num_vehicles_available, nom traduit et station fermée à la location
+    assert part_dieu['available_bikes'] == 3
+    assert part_dieu['address'] == 'Gare Part-Dieu'
+    assert part_dieu['status'] == 'closed'
+    assert part_dieu['locality'] == 'lyon'
+    assert changed.set_index('id').loc['urn:ngsi-ld:station:001', 'occupancy_rate'] == pytest.approx(7 / 12)
+
+
+def test_malformed_records_are_quarantined(collector):
+    collector.tick()
+
+    validation = collector.analyzer.validation.to_dict()
+    assert validation['checked'] == 6
+    assert validation['quarantined'] == 2
+    assert validation['reasons'] == {'available_bikes: entier positif attendu': 1, 'latitude: coordonnée invalide': 1}
+    assert not collector.snapshot['id'].isin(['urn:ngsi-ld:station:003', 'lyon:12']).any()
+
+
+def test_unchanged_feeds_skip_the_tick(collector):
+    received = []
+    collector.subscribe(lambda changed, snapshot, timestamp: received.append(len(changed)))
+
+    collector.tick()
+    changed = collector.tick()
+
+    assert changed.empty
+    assert collector.skipped_ticks == 1
+    assert received == [4]
+
+
+def test_changed_and_removed_stations(collector, feed_dir):
+    collector.tick()
+
+    def update(stations):
+        stations[0]['num_bikes_available'] = 9
+        stations[0]['num_docks_available'] = 11
+        del stations[1]
+
+    rewrite_status(feed_dir, update)
+    changed = collector.tick()
+
+    assert changed['id'].tolist() == ['lyon:10']
+    snapshot = collector.snapshot.set_index('id')
+    assert 'lyon:11' not in snapshot.index
+    assert snapshot.loc['lyon:10', 'available_bikes'] == 9
+    assert len(snapshot) == 3
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Historique collecté de l'état du réseau, interrogeable à n'importe quel instant
+Index par images clés périodiques + deltas (stations modifiées à chaque tick)
+"""
+
+import bisect
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, List, Iterator, Tuple
+
+from registry import StationRegistry
+from schema import enforce_schema
+
+ABSENT = -1
+
+
+def to_epoch(timestamp) -> int:
+    """Convertit un instant (datetime, chaîne ISO, datetime64) en secondes epoch"""
+    if isinstance(timestamp, np.datetime64):
+        return int(timestamp.astype('datetime64[s]').astype(np.int64))
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tzinfo is None:
+        # Instant naïf (datetime.now() du collecteur) : heure locale de la machine
+        return int(timestamp.floor('s').to_pydatetime().astimezone().timestamp())
+    return int(timestamp.value // 10**9)
+
+
+class NetworkTimeline:
+    """Reconstruit l'état complet du réseau (format analyze_current_status) à un instant passé"""
+
+    def __init__(self, registry: StationRegistry, keyframe_interval: int = 60):
+        self.registry = registry
+        self.keyframe_interval = keyframe_interval
+        self.statuses: List[str] = []
+        self._status_codes: Dict[str, int] = {}
+
+        # Un tick = (instant, clés modifiées, vélos, places libres, statut)
+        self.times: List[int] = []
+        self.deltas: List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+        # Images clés : indice du tick -> état complet après ce tick
+        self.keyframe_ticks: List[int] = []
+        self.keyframes: List[Dict[str, np.ndarray]] = []
+
+        self._state = self._empty_state(0)
+
+    def _empty_state(self, size: int) -> Dict[str, np.ndarray]:
+        return {
+            'available_bikes': np.zeros(size, dtype=np.int16),
+            'free_slots': np.zeros(size, dtype=np.int16),
+            'status': np.full(size, ABSENT, dtype=np.int8),
+            'changed_at': np.zeros(size, dtype=np.int64)
+        }
+
+    def _resize(self, state: Dict[str, np.ndarray], size: int) -> Dict[str, np.ndarray]:
+        if size <= len(state['status']):
+            return state
+        grown = self._empty_state(size)
+        for name, values in state.items():
+            grown[name][:len(values)] = values
+        return grown
+
+    def _status_code(self, status: str) -> int:
+        code = self._status_codes.get(status)
+        if code is None:
+            code = len(self.statuses)
+            self._status_codes[status] = code
+            self.statuses.append(status)
+        return code
+
+    def _apply(self, state: Dict[str, np.ndarray], tick: int) -> Dict[str, np.ndarray]:
+        keys, available, free, status = self.deltas[tick]
+        state = self._resize(state, int(keys.max(initial=-1)) + 1)
+        state['available_bikes'][keys] = available
+        state['free_slots'][keys] = free
+        state['status'][keys] = status
+        state['changed_at'][keys] = self.times[tick]
+        return state
+
+    def record(self, changed: pd.DataFrame, snapshot: pd.DataFrame, timestamp: datetime):
+        """Enregistre un tick du collecteur (abonné StationCollector)"""
+        epoch = to_epoch(timestamp)
+        if self.times and epoch < self.times[-1]:
+            raise ValueError("Les ticks doivent être enregistrés dans l'ordre chronologique")
+
+        delta = (
+            changed['station_key'].to_numpy(dtype=np.int32),
+            changed['available_bikes'].to_numpy(dtype=np.int16),
+            changed['free_slots'].to_numpy(dtype=np.int16),
+            np.array([self._status_code(status) for status in changed['status']], dtype=np.int8)
+        )
+        # Delta ajouté avant l'instant : un lecteur concurrent ne voit jamais un tick incomplet
+        self.deltas.append(delta)
+        self.times.append(epoch)
+        tick = len(self.times) - 1
+        self._state = self._apply(self._state, tick)
+
+        if tick % self.keyframe_interval == 0:
+            # Image ajoutée avant son indice : un lecteur concurrent ne voit jamais d'indice sans image
+            self.keyframes.append({name: values.copy() for name, values in self._state.items()})
+            self.keyframe_ticks.append(tick)
+
+    def _tick_at(self, epoch: int) -> int:
+        """Indice du dernier tick antérieur ou égal à l'instant (-1 si aucun)"""
+        return bisect.bisect_right(self.times, epoch) - 1
+
+    def _state_at_tick(self, tick: int) -> Dict[str, np.ndarray]:
+        """Dernière image clé puis application des deltas jusqu'au tick demandé"""
+        position = bisect.bisect_right(self.keyframe_ticks, tick) - 1
+        base_tick = self.keyframe_ticks[position]
+        state = {name: values.copy() for name, values in self.keyframes[position].items()}
+        for next_tick in range(base_tick + 1, tick + 1):
+            state = self._apply(state, next_tick)
+        return state
+
+    def _to_frame(self, state: Dict[str, np.ndarray]) -> pd.DataFrame:
+        """Construit un DataFrame au format analyze_current_status"""
+        keys = np.flatnonzero(state['status'] != ABSENT).astype(np.int32)
+        df = self.registry.metadata_frame(keys)
+        df = df[['station_key', 'id', 'address', 'locality']].assign(
+            available_bikes=state['available_bikes'][keys],
+            free_slots=state['free_slots'][keys],
+            total_slots=self.registry.capacities[keys],
+            status=pd.Categorical.from_codes(state['status'][keys], categories=self.statuses),
+            latitude=self.registry.latitudes[keys],
+            longitude=self.registry.longitudes[keys],
+            last_update=state['changed_at'][keys].astype('datetime64[s]')
+        )
+        # Capacité nulle : taux à 0 plutôt qu'une division par zéro (comme build_status_frame)
+        total_slots = df['total_slots'].to_numpy(dtype=np.float64)
+        has_slots = total_slots > 0
+        df['occupancy_rate'] = np.divide(df['available_bikes'].to_numpy(dtype=np.float64), total_slots,
+                                         out=np.zeros(len(df)), where=has_slots)
+        df['utilization_rate'] = np.divide(total_slots - df['free_slots'].to_numpy(dtype=np.float64), total_slots,
+                                           out=np.zeros(len(df)), where=has_slots)
+        return enforce_schema(df)
+
+    def state_at(self, timestamp) -> pd.DataFrame:
+        """État complet du réseau tel qu'il était à l'instant demandé"""
+        tick = self._tick_at(to_epoch(timestamp))
+        if tick < 0:
+            return self._to_frame(self._empty_state(0))
+        return self._to_frame(self._state_at_tick(tick))
+
+    def iter_states(self, start, end, step_minutes: int = 60) -> Iterator[Tuple[pd.Timestamp, pd.DataFrame]]:
+        """Snapshots successifs entre deux instants, au pas choisi (parcours incrémental)"""
+        start_epoch, end_epoch = to_epoch(start), to_epoch(end)
+        step = step_minutes * 60
+
+        tick = self._tick_at(start_epoch)
+        state = self._state_at_tick(tick) if tick >= 0 else self._empty_state(0)
+
+        for epoch in range(start_epoch, end_epoch + 1, step):
+            target = self._tick_at(epoch)
+            # Au-delà d'une image clé, repartir de celle-ci plutôt que d'appliquer tous les deltas
+            next_keyframe = bisect.bisect_right(self.keyframe_ticks, target) - 1
+            if next_keyframe >= 0 and self.keyframe_ticks[next_keyframe] > tick:
+                state = self._state_at_tick(target)
+            else:
+                for next_tick in range(tick + 1, target + 1):
+                    state = self._apply(state, next_tick)
+            tick = target
+            yield pd.Timestamp(epoch, unit='s'), self._to_frame(state)
+
+    def save(self, path: str):
+        """Sauvegarde l'historique (deltas concaténés + images clés)"""
+        sizes = np.array([len(delta[0]) for delta in self.deltas], dtype=np.int64)
+        flat = [np.concatenate([delta[i] for delta in self.deltas]) if self.deltas else np.array([])
+                for i in range(4)]
+        keyframe_size = max((len(frame['status']) for frame in self.keyframes), default=0)
+        keyframes = [self._resize(frame, keyframe_size) for frame in self.keyframes]
+        np.savez_compressed(
+            path,
+            times=np.array(self.times, dtype=np.int64), sizes=sizes,
+            keys=flat[0], available=flat[1], free=flat[2], status=flat[3],
+            statuses=np.array(self.statuses), keyframe_ticks=np.array(self.keyframe_ticks, dtype=np.int64),
+            **{f'keyframe_{name}': np.stack([frame[name] for frame in keyframes])
+               if keyframes else np.array([]) for name in self._empty_state(0)}
+        )
+
+    @classmethod
+    def load(cls, path: str, registry: StationRegistry, keyframe_interval: int = 60) -> 'NetworkTimeline':
+        """Recharge un historique sauvegardé"""
+        timeline = cls(registry, keyframe_interval)
+        with np.load(path, allow_pickle=False) as data:
+            for status in data['statuses'].tolist():
+                timeline._status_code(status)
+            offsets = np.concatenate([[0], np.cumsum(data['sizes'])])
+            timeline.times = data['times'].tolist()
+            timeline.deltas = [
+                (data['keys'][a:b].astype(np.int32), data['available'][a:b].astype(np.int16),
+                 data['free'][a:b].astype(np.int16), data['status'][a:b].astype(np.int8))
+                for a, b in zip(offsets[:-1], offsets[1:])
+            ]
+            timeline.keyframe_ticks = data['keyframe_ticks'].tolist()
+            timeline.keyframes = [
+                {name: data[f'keyframe_{name}'][i].copy() for name in timeline._state}
+                for i in range(len(timeline.keyframe_ticks))
+            ]
+        if timeline.times:
+            timeline._state = timeline._state_at_tick(len(timeline.times) - 1)
+        return timeline
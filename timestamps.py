@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Décodage rapide des horodatages de l'API (2025-08-03T19:06:17.000Z)
+Conversion vectorisée en secondes epoch int64, représentation interne de l'historique
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Iterable
+
+# Format fixe de l'API : AAAA-MM-JJTHH:MM:SS.mmmZ (24 caractères, UTC)
+API_TIMESTAMP_LENGTH = 24
+SEPARATORS = {4: b'-', 7: b'-', 10: b'T', 13: b':', 16: b':', 19: b'.', 23: b'Z'}
+DIGITS = [position for position in range(API_TIMESTAMP_LENGTH) if position not in SEPARATORS]
+# Valeur de NaT en int64 (np.datetime64('NaT').astype(np.int64))
+MISSING_EPOCH = np.iinfo(np.int64).min
+SECONDS_PER_DAY = 86400
+
+
+def _days_from_civil(year: np.ndarray, month: np.ndarray, day: np.ndarray) -> np.ndarray:
+    """Nombre de jours depuis le 1970-01-01 (calendrier grégorien proleptique, vectorisé)"""
+    year = year - (month <= 2)
+    era = np.floor_divide(year, 400)
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def _decode_fixed(values: list) -> np.ndarray:
+    """Chemin rapide : lève ValueError si une valeur ne suit pas exactement le format de l'API"""
+    raw = np.array(values, dtype=f'S{API_TIMESTAMP_LENGTH + 1}')
+    chars = raw.view(np.uint8).reshape(len(raw), API_TIMESTAMP_LENGTH + 1)
+    if chars[:, API_TIMESTAMP_LENGTH].any():
+        raise ValueError("Horodatage plus long que le format de l'API")
+    for position, separator in SEPARATORS.items():
+        if (chars[:, position] != separator[0]).any():
+            raise ValueError("Horodatage hors du format de l'API")
+
+    digits = chars[:, DIGITS].astype(np.int64) - ord('0')
+    if ((digits < 0) | (digits > 9)).any():
+        raise ValueError("Horodatage hors du format de l'API")
+
+    def number(start: int, width: int) -> np.ndarray:
+        result = np.zeros(len(raw), dtype=np.int64)
+        for position in range(start, start + width):
+            result = result * 10 + digits[:, DIGITS.index(position)]
+        return result
+
+    year, month, day = number(0, 4), number(5, 2), number(8, 2)
+    if ((month < 1) | (month > 12) | (day < 1) | (day > 31)).any():
+        raise ValueError("Date invalide")
+    return (_days_from_civil(year, month, day) * SECONDS_PER_DAY
+            + number(11, 2) * 3600 + number(14, 2) * 60 + number(17, 2))
+
+
+def decode_timestamps(values: Iterable) -> np.ndarray:
+    """Horodatages ISO -> secondes epoch UTC (int64) ; MISSING_EPOCH pour les valeurs absentes
+
+    Le format fixe de l'API est décodé directement sur les octets ; toute autre écriture
+    (décalage horaire, précision différente, valeurs manquantes) passe par pandas, en UTC.
+    """
+    values = values if isinstance(values, list) else list(values)
+    if not values:
+        return np.empty(0, dtype=np.int64)
+    try:
+        return _decode_fixed(values)
+    except (ValueError, TypeError, UnicodeEncodeError):
+        parsed = pd.to_datetime(pd.Series(values, dtype=object), utc=True, errors='coerce', format='ISO8601')
+        return parsed.dt.tz_localize(None).to_numpy(dtype='datetime64[s]').astype(np.int64)
+
+
+def to_datetime64(epochs: np.ndarray) -> np.ndarray:
+    """Secondes epoch -> datetime64[s] UTC sans fuseau (MISSING_EPOCH devient NaT)"""
+    return np.asarray(epochs, dtype=np.int64).astype('datetime64[s]')
+
+
+def hour_of_day(epochs: np.ndarray) -> np.ndarray:
+    """Heure UTC (0-23) par arithmétique entière"""
+    return (np.asarray(epochs, dtype=np.int64) // 3600) % 24
+
+
+def day_of_week(epochs: np.ndarray) -> np.ndarray:
+    """Jour de la semaine UTC (0 = lundi, comme pandas) ; le 1970-01-01 était un jeudi"""
+    return (np.asarray(epochs, dtype=np.int64) // SECONDS_PER_DAY + 3) % 7
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Validation des stations renvoyées par l'API avant construction du DataFrame d'état
+Accès aux champs précompilés, mise en quarantaine des enregistrements invalides avec leurs motifs
+"""
+
+import math
+from collections import Counter
+from operator import itemgetter
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+# Colonne du DataFrame d'état -> chemin dans l'enregistrement NGSI (ordre des colonnes extraites)
+FIELD_PATHS = {
+    'id': ('id',),
+    'address': ('address', 'value', 'streetAddress'),
+    'locality': ('address', 'value', 'addressLocality'),
+    'available_bikes': ('availableBikeNumber', 'value'),
+    'free_slots': ('freeSlotNumber', 'value'),
+    'total_slots': ('totalSlotNumber', 'value'),
+    'status': ('status', 'value'),
+    'latitude': ('location', 'value', 'coordinates', 1),
+    'longitude': ('location', 'value', 'coordinates', 0)
+}
+# Champ facultatif : horodatage de la dernière mesure
+LAST_UPDATE_PATH = ('availableBikeNumber', 'metadata', 'timestamp', 'value')
+STRING_FIELDS = ('id', 'address', 'locality', 'status')
+COUNT_FIELDS = ('available_bikes', 'free_slots', 'total_slots')
+COORDINATE_BOUNDS = {'latitude': 90.0, 'longitude': 180.0}
+# Nombre d'enregistrements en quarantaine conservés pour inspection
+QUARANTINE_SAMPLE = 20
+# Colonnes dont la modification signale un changement d'état d'une station
+CHANGE_COLUMNS = ('available_bikes', 'free_slots', 'status')
+
+
+def compile_accessor(path: Tuple) -> Callable[[Any], Any]:
+    """Fonction d'accès à un chemin imbriqué (lève KeyError/IndexError/TypeError si absent)
+
+    Indexations déroulées pour les profondeurs courantes : pas de boucle par champ lu.
+    """
+    if len(path) == 1:
+        return itemgetter(path[0])
+    if len(path) == 2:
+        first, second = path
+        return lambda record: record[first][second]
+    if len(path) == 3:
+        first, second, third = path
+        return lambda record: record[first][second][third]
+    if len(path) == 4:
+        first, second, third, fourth = path
+        return lambda record: record[first][second][third][fourth]
+
+    def access(record, path=path):
+        for step in path:
+            record = record[step]
+        return record
+    return access
+
+
+def compile_extractor(paths: Dict[str, Tuple]) -> Callable[[Any], tuple]:
+    """Fonction unique lisant tous les champs d'un enregistrement (tuple dans l'ordre des chemins)
+
+    Les accesseurs sont compilés une fois : c'est le chemin rapide de la validation.
+    """
+    accessors = tuple(compile_accessor(path) for path in paths.values())
+
+    def extract(record):
+        return tuple([access(record) for access in accessors])
+    return extract
+
+
+class RecordLayout:
+    """Chemins des champs d'un format d'enregistrement (NGSI, GBFS normalisé...), compilés une fois"""
+
+    def __init__(self, field_paths: Dict[str, Tuple], last_update_path: Optional[Tuple] = None):
+        # Toujours dans l'ordre de FIELD_PATHS : le chemin rapide dépaquette les valeurs par position
+        self.field_paths = {column: tuple(field_paths[column]) for column in FIELD_PATHS}
+        self.accessors = {column: compile_accessor(path) for column, path in self.field_paths.items()}
+        self.extract = compile_extractor(self.field_paths)
+        self.last_update = compile_accessor(last_update_path) if last_update_path else None
+        self._signature = compile_extractor({column: self.field_paths[column] for column in CHANGE_COLUMNS})
+
+    def station_id(self, record: Any) -> Any:
+        try:
+            return self.accessors['id'](record)
+        except (KeyError, IndexError, TypeError):
+            return None
+
+    def signature(self, record: Any) -> Optional[tuple]:
+        """Valeurs suivies pour détecter un changement d'état (None si illisibles)"""
+        try:
+            return self._signature(record)
+        except (KeyError, IndexError, TypeError):
+            return None
+
+
+# Format de l'API de Montpellier Méditerranée Métropole
+NGSI_LAYOUT = RecordLayout(FIELD_PATHS, LAST_UPDATE_PATH)
+# Enregistrements déjà aplatis (clé = colonne), produits par les adaptateurs de flux
+FLAT_LAYOUT = RecordLayout({column: (column,) for column in FIELD_PATHS}, ('last_update',))
+
+
+def _is_count(value) -> bool:
+    # Entiers JSON uniquement (bool exclu : type exact)
+    return type(value) is int and value >= 0
+
+
+def _is_coordinate(value, bound: float) -> bool:
+    return type(value) in (int, float) and -bound <= value <= bound and math.isfinite(value)
+
+
+def record_errors(station: Any, layout: Optional[RecordLayout] = None) -> List[str]:
+    """Motifs de rejet d'un enregistrement (chemin lent, uniquement pour les stations invalides)"""
+    layout = NGSI_LAYOUT if layout is None else layout
+    if not isinstance(station, dict):
+        return [f"enregistrement de type {type(station).__name__}"]
+    errors = []
+    for column, access in layout.accessors.items():
+        try:
+            value = access(station)
+        except (KeyError, IndexError, TypeError):
+            errors.append(f"{column}: champ absent ({'.'.join(map(str, layout.field_paths[column]))})")
+            continue
+        if column in STRING_FIELDS and not (isinstance(value, str) and value):
+            errors.append(f"{column}: chaîne attendue")
+        elif column in COUNT_FIELDS and not _is_count(value):
+            errors.append(f"{column}: entier positif attendu ({value!r})")
+        elif column in COORDINATE_BOUNDS and not _is_coordinate(value, COORDINATE_BOUNDS[column]):
+            errors.append(f"{column}: coordonnée invalide ({value!r})")
+    return errors
+
+
+class ValidationReport:
+    """Résultat d'une validation : colonnes des stations valides, quarantaine et compteurs"""
+
+    def __init__(self):
+        self.columns: Dict[str, list] = {column: [] for column in (*FIELD_PATHS, 'last_update')}
+        self.checked = 0
+        self.quarantined = 0
+        self.reasons: Counter = Counter()
+        self.samples: List[Dict[str, Any]] = []
+        # Stations valides mais de capacité nulle (taux ramenés à 0 par build_status_frame)
+        self.zero_capacity = 0
+
+    @property
+    def valid(self) -> int:
+        return self.checked - self.quarantined
+
+    def quarantine(self, station: Any, errors: List[str]):
+        self.quarantined += 1
+        # Motif agrégé sans la valeur fautive, pour des compteurs stables
+        self.reasons.update(error.split(' (')[0] for error in errors)
+        if len(self.samples) < QUARANTINE_SAMPLE:
+            station_id = station.get('id') if isinstance(station, dict) else None
+            self.samples.append({'id': station_id, 'reasons': errors})
+
+
+class ValidationMetrics:
+    """Compteurs cumulés sur toutes les validations d'une exécution (exposés par le serveur)"""
+
+    def __init__(self):
+        self.checked = 0
+        self.quarantined = 0
+        self.zero_capacity = 0
+        self.reasons: Counter = Counter()
+        self.last_samples: List[Dict[str, Any]] = []
+
+    def record(self, report: ValidationReport):
+        self.checked += report.checked
+        self.quarantined += report.quarantined
+        self.zero_capacity += report.zero_capacity
+        self.reasons.update(report.reasons)
+        if report.samples:
+            self.last_samples = report.samples
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'checked': self.checked,
+            'quarantined': self.quarantined,
+            'zero_capacity': self.zero_capacity,
+            'reasons': dict(self.reasons.most_common()),
+            'last_quarantined': self.last_samples
+        }
+
+
+def validate_stations(stations: List[Any], layout: Optional[RecordLayout] = None) -> ValidationReport:
+    """Valide toutes les stations en un passage ; les colonnes ne contiennent que les stations valides
+
+    Chemin rapide : lecture directe des champs et contrôles de type en ligne ;
+    les motifs détaillés ne sont calculés que pour les enregistrements rejetés.
+    """
+    layout = NGSI_LAYOUT if layout is None else layout
+    extract = layout.extract
+    last_update = layout.last_update
+    report = ValidationReport()
+    report.checked = len(stations)
+    rows = []
+    last_updates = []
+
+    for station in stations:
+        try:
+            values = extract(station)
+        except (KeyError, IndexError, TypeError):
+            report.quarantine(station, record_errors(station, layout))
+            continue
+        station_id, address, locality, available, free, total, status, latitude, longitude = values
+        if not (type(station_id) is str and station_id and type(address) is str and address
+                and type(locality) is str and locality and type(status) is str and status
+                and type(available) is int and available >= 0 and type(free) is int and free >= 0
+                and type(total) is int and total >= 0
+                and _is_coordinate(latitude, 90.0) and _is_coordinate(longitude, 180.0)):
+            report.quarantine(station, record_errors(station, layout))
+            continue
+
+        try:
+            last_updates.append(last_update(station) if last_update else None)
+        except (KeyError, IndexError, TypeError):
+            last_updates.append(None)
+        rows.append(values)
+        report.zero_capacity += total == 0
+
+    # Lignes -> colonnes en une transposition
+    if rows:
+        report.columns = dict(zip(FIELD_PATHS, map(list, zip(*rows))))
+    report.columns['last_update'] = last_updates
+    return report
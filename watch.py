@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Surveillance continue des stations : alertes à l'entrée et à la sortie des états problématiques
+Évaluation incrémentale (stations modifiées uniquement), anti-rebond et hystérésis
+"""
+
+import argparse
+import contextlib
+import json
+import sys
+import time
+import numpy as np
+import pandas as pd
+import requests
+from datetime import datetime
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+from collector import StationCollector
+from profiling import run_cli
+from schema import json_default
+from snapshot import LOW_EFFICIENCY_THRESHOLD, StationSnapshot
+
+# Hystérésis : seuils de sortie plus exigeants que les seuils d'entrée
+EMPTY_EXIT_BIKES = 2
+FULL_EXIT_SLOTS = 2
+LOW_EFFICIENCY_EXIT = LOW_EFFICIENCY_THRESHOLD + 0.05
+# Durée pendant laquelle un changement d'état doit persister avant d'être signalé
+DEBOUNCE_SECONDS = 60.0
+EVENT_FIELDS = ['id', 'address', 'locality', 'available_bikes', 'free_slots', 'total_slots', 'status']
+
+# Règles de identify_problem_stations : (condition d'entrée, condition de sortie) sur les stations modifiées
+Rule = Callable[[StationSnapshot], np.ndarray]
+RULES: Dict[str, Tuple[Rule, Rule]] = {
+    'always_empty': (lambda s: (s.frame['available_bikes'] == 0).to_numpy(),
+                     lambda s: (s.frame['available_bikes'] >= EMPTY_EXIT_BIKES).to_numpy()),
+    'always_full': (lambda s: (s.frame['free_slots'] == 0).to_numpy(),
+                    lambda s: (s.frame['free_slots'] >= FULL_EXIT_SLOTS).to_numpy()),
+    'inactive': (lambda s: (s.frame['status'] != 'working').to_numpy(),
+                 lambda s: (s.frame['status'] == 'working').to_numpy()),
+    'low_efficiency': (lambda s: (s.efficiency_score < LOW_EFFICIENCY_THRESHOLD).to_numpy(),
+                       lambda s: (s.efficiency_score >= LOW_EFFICIENCY_EXIT).to_numpy())
+}
+
+
+class ProblemStateTracker:
+    """État problématique confirmé de chaque station (station × règle), mis à jour par différences"""
+
+    def __init__(self, debounce_seconds: float = DEBOUNCE_SECONDS,
+                 rules: Optional[Dict[str, Tuple[Rule, Rule]]] = None, report_initial: bool = False):
+        self.rules = RULES if rules is None else rules
+        self.rule_names = list(self.rules)
+        self.debounce_seconds = debounce_seconds
+        # Par défaut, les problèmes déjà présents au premier passage servent de référence, sans alerte
+        self.report_initial = report_initial
+        n_rules = len(self.rule_names)
+        self.known = np.zeros(0, dtype=bool)
+        self.confirmed = np.zeros((0, n_rules), dtype=bool)
+        self.candidate = np.zeros((0, n_rules), dtype=bool)
+        self.pending_since = np.zeros((0, n_rules), dtype=np.float64)
+        self.entered_at = np.zeros((0, n_rules), dtype=np.float64)
+        self.snapshot: Optional[pd.DataFrame] = None
+
+    def _grow(self, size: int):
+        extra = size - len(self.known)
+        if extra <= 0:
+            return
+        n_rules = len(self.rule_names)
+        self.known = np.concatenate([self.known, np.zeros(extra, dtype=bool)])
+        self.confirmed = np.vstack([self.confirmed, np.zeros((extra, n_rules), dtype=bool)])
+        self.candidate = np.vstack([self.candidate, np.zeros((extra, n_rules), dtype=bool)])
+        self.pending_since = np.vstack([self.pending_since, np.full((extra, n_rules), np.nan)])
+        self.entered_at = np.vstack([self.entered_at, np.full((extra, n_rules), np.nan)])
+
+    def update(self, changed: pd.DataFrame, snapshot: pd.DataFrame, timestamp: datetime) -> List[Dict[str, Any]]:
+        """Évalue les règles sur les seules stations modifiées, puis confirme les changements mûrs"""
+        now = timestamp.timestamp()
+        # Stations retirées en amont : leurs alertes se terminent (détails tirés du snapshot précédent)
+        removed = np.flatnonzero(self.known)
+        removed = removed[~np.isin(removed, snapshot['station_key'].to_numpy(dtype=np.int64))]
+        events = self._forget(removed, now) if len(removed) else []
+        self.snapshot = snapshot
+        if not changed.empty:
+            keys = changed['station_key'].to_numpy(dtype=np.int64)
+            self._grow(int(keys.max()) + 1)
+            stations = StationSnapshot(changed)
+            enter = np.column_stack([self.rules[name][0](stations) for name in self.rule_names])
+            leave = np.column_stack([self.rules[name][1](stations) for name in self.rule_names])
+
+            confirmed = self.confirmed[keys]
+            # Hystérésis : on reste en alerte tant que la condition de sortie n'est pas remplie
+            desired = np.where(confirmed, ~leave, enter)
+
+            new = ~self.known[keys]
+            if not self.report_initial and new.any():
+                self.confirmed[keys[new]] = desired[new]
+                self.entered_at[keys[new]] = np.where(desired[new], now, np.nan)
+                confirmed = self.confirmed[keys]
+            self.known[keys] = True
+
+            # Un changement en attente repart de zéro si l'état souhaité change encore
+            restarted = (desired != confirmed) & (desired != self.candidate[keys])
+            since = np.where(restarted, now, self.pending_since[keys])
+            self.pending_since[keys] = np.where(desired == confirmed, np.nan, since)
+            self.candidate[keys] = desired
+
+        return events + self.confirm(now)
+
+    def _forget(self, keys: np.ndarray, now: float) -> List[Dict[str, Any]]:
+        """Sort de leurs alertes les stations disparues du snapshot et efface leur état"""
+        stations, rules = np.nonzero(self.confirmed[keys])
+        stations = keys[stations]
+        events = []
+        if len(stations):
+            durations = now - self.entered_at[stations, rules]
+            events = self._events(stations, rules, np.zeros(len(stations), dtype=bool), durations, now)
+            for event in events:
+                event['removed'] = True
+        self.known[keys] = False
+        self.confirmed[keys] = False
+        self.candidate[keys] = False
+        self.pending_since[keys] = np.nan
+        self.entered_at[keys] = np.nan
+        return events
+
+    def confirm(self, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Valide les changements ayant persisté au moins debounce_seconds (à appeler à chaque interrogation)"""
+        now = time.time() if now is None else now
+        with np.errstate(invalid='ignore'):
+            ready = (self.candidate != self.confirmed) & (now - self.pending_since >= self.debounce_seconds)
+        if not ready.any():
+            return []
+
+        stations, rules = np.nonzero(ready)
+        entering = self.candidate[stations, rules]
+        durations = now - self.entered_at[stations, rules]
+        # Début du problème : premier passage où la condition a été observée
+        self.entered_at[stations, rules] = np.where(entering, self.pending_since[stations, rules], np.nan)
+        self.confirmed[stations, rules] = entering
+        self.pending_since[stations, rules] = np.nan
+        return self._events(stations, rules, entering, durations, now)
+
+    def _events(self, stations: np.ndarray, rules: np.ndarray, entering: np.ndarray,
+                durations: np.ndarray, now: float) -> List[Dict[str, Any]]:
+        positions = pd.Index(self.snapshot['station_key']).get_indexer(stations)
+        found = positions >= 0
+        details = iter(self.snapshot[EVENT_FIELDS].iloc[positions[found]].to_dict('records'))
+        at = datetime.fromtimestamp(now).isoformat(timespec='seconds')
+        events = []
+        for station_key, rule, is_entering, duration, position in zip(
+                stations.tolist(), rules.tolist(), entering.tolist(), durations.tolist(), positions.tolist()):
+            event = {
+                'event': 'enter' if is_entering else 'exit',
+                'problem': self.rule_names[rule],
+                'station_key': station_key,
+                'at': at
+            }
+            if position >= 0:
+                event.update(next(details))
+            if not is_entering and not np.isnan(duration):
+                event['duration_seconds'] = round(duration)
+            events.append(event)
+        return events
+
+    def active(self) -> Dict[str, int]:
+        """Nombre de stations actuellement en alerte, par règle"""
+        return {name: int(self.confirmed[:, rule].sum()) for rule, name in enumerate(self.rule_names)}
+
+
+class JsonLinesSink:
+    """Écrit un événement JSON par ligne (sortie standard ou fichier en ajout)"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        # Sortie standard retenue à la création : les messages du collecteur sont redirigés ailleurs
+        self.stream = sys.stdout
+
+    def __call__(self, events: List[Dict[str, Any]]):
+        lines = "".join(json.dumps(event, ensure_ascii=False, default=json_default) + "\n" for event in events)
+        if self.path is None:
+            self.stream.write(lines)
+            self.stream.flush()
+            return
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+
+class WebhookSink:
+    """Envoie les événements d'une interrogation en un seul POST JSON ({"events": [...]})"""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+        self.failures = 0
+
+    def __call__(self, events: List[Dict[str, Any]]):
+        body = json.dumps({'events': events}, ensure_ascii=False, default=json_default).encode('utf-8')
+        try:
+            response = requests.post(self.url, data=body, timeout=self.timeout,
+                                     headers={'Content-Type': 'application/json'})
+            response.raise_for_status()
+        except requests.RequestException as e:
+            # Une alerte perdue ne doit pas interrompre la surveillance
+            self.failures += 1
+            print(f"⚠️ Webhook {self.url} indisponible: {e}", file=sys.stderr)
+
+
+class StationWatcher:
+    """Branche le suivi des états sur le collecteur et diffuse les événements aux sorties"""
+
+    def __init__(self, collector: StationCollector, tracker: Optional[ProblemStateTracker] = None,
+                 sinks: Optional[List[Callable[[List[Dict[str, Any]]], None]]] = None):
+        self.collector = collector
+        self.tracker = tracker or ProblemStateTracker()
+        self.sinks = sinks if sinks is not None else [JsonLinesSink()]
+        self.events_sent = 0
+        collector.subscribe(self.on_change)
+
+    def emit(self, events: List[Dict[str, Any]]):
+        if not events:
+            return
+        self.events_sent += len(events)
+        for sink in self.sinks:
+            sink(events)
+
+    def on_change(self, changed: pd.DataFrame, snapshot: pd.DataFrame, timestamp: datetime):
+        self.emit(self.tracker.update(changed, snapshot, timestamp))
+
+    def poll(self):
+        """Une interrogation ; les changements en attente sont confirmés même sans nouvelle donnée"""
+        # Les messages de l'API ne se mêlent pas au flux JSON de la sortie standard
+        with contextlib.redirect_stdout(sys.stderr):
+            changed = self.collector.tick()
+        if changed.empty and self.tracker.snapshot is not None:
+            self.emit(self.tracker.confirm())
+
+    def run(self, max_ticks: Optional[int] = None):
+        """Boucle de surveillance (Ctrl+C pour arrêter) ; les messages vont sur stderr"""
+        interval = self.collector.interval
+        print(f"👀 Surveillance toutes les {interval:.0f}s (anti-rebond {self.tracker.debounce_seconds:.0f}s)",
+              file=sys.stderr)
+        try:
+            while max_ticks is None or self.collector.ticks < max_ticks:
+                started = time.monotonic()
+                self.poll()
+                if max_ticks is not None and self.collector.ticks >= max_ticks:
+                    break
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            print("\n⏹️ Surveillance interrompue", file=sys.stderr)
+        print(f"✅ {self.collector.ticks} interrogations, {self.events_sent} événement(s), "
+              f"alertes actives: {self.tracker.active()}", file=sys.stderr)
+
+
+def main_watch():
+    """Fonction principale du mode surveillance"""
+    from main import VelomaggAnalyzer
+
+    parser = argparse.ArgumentParser(description="Alertes sur les changements d'état des stations Vélomagg")
+    parser.add_argument('--interval', type=float, default=30, help="Intervalle d'interrogation (secondes)")
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE_SECONDS,
+                        help="Durée minimale d'un changement d'état avant alerte (secondes)")
+    parser.add_argument('--output', help="Fichier JSON-lines (défaut: sortie standard)")
+    parser.add_argument('--webhook', help="URL recevant les événements en POST")
+    parser.add_argument('--report-initial', action='store_true',
+                        help="Signaler aussi les problèmes déjà présents au démarrage")
+    args = parser.parse_args()
+
+    sinks = [JsonLinesSink(args.output)]
+    if args.webhook:
+        sinks.append(WebhookSink(args.webhook))
+    collector = StationCollector(VelomaggAnalyzer(), interval=args.interval)
+    watcher = StationWatcher(collector, ProblemStateTracker(args.debounce, report_initial=args.report_initial),
+                             sinks)
+    watcher.run()
+
+
+if __name__ == "__main__":
+    run_cli(main_watch)